@@ -0,0 +1,102 @@
+"""file_table filter indexes
+
+Revision ID: c4d7e2a9f153
+Revises: 8b2e4d6a1c07
+Create Date: 2026-10-18 14:02:51.208317
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c4d7e2a9f153"
+down_revision: Union[str, None] = "8b2e4d6a1c07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Names of the indexes built on the live table, with their columns
+INDEXES = [
+    ("ix_file_table_tag", ["tag"], {}),
+    ("ix_file_table_mime_type", ["mime_type"], {}),
+    # text_pattern_ops lets the index serve "name LIKE 'x.%'" under any collation
+    (
+        "ix_file_table_name_pattern",
+        ["name"],
+        {"postgresql_ops": {"name": "text_pattern_ops"}},
+    ),
+]
+
+
+def check_no_duplicate_names() -> None:
+    """Stops the upgrade before any index is built if rows already share a
+    name and MIME type, which the new unique constraint forbids."""
+    duplicates = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT name, mime_type, count(*) FROM file_table "
+                "GROUP BY name, mime_type HAVING count(*) > 1 "
+                "ORDER BY name, mime_type LIMIT 10"
+            )
+        )
+        .all()
+    )
+    if duplicates:
+        listed = ", ".join(
+            f"'{name}' ({mime_type}): {count} rows"
+            for name, mime_type, count in duplicates
+        )
+        raise RuntimeError(
+            f"Cannot add uq_name_mimetype, file_table has rows sharing a name "
+            f"and MIME type: {listed}. Rename or delete the duplicates and run "
+            f"the upgrade again."
+        )
+
+
+def upgrade() -> None:
+    check_no_duplicate_names()
+
+    # The indexes are built concurrently so that writes to file_table are not
+    # blocked, which cannot run inside a transaction. An interrupted build
+    # leaves an invalid index behind, so any index left by an earlier attempt
+    # is dropped first.
+    with op.get_context().autocommit_block():
+        for name, columns, kwargs in [
+            ("uq_name_mimetype", ["name", "mime_type"], {"unique": True}),
+            *INDEXES,
+        ]:
+            op.drop_index(
+                name,
+                table_name="file_table",
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
+            op.create_index(
+                name,
+                "file_table",
+                columns,
+                postgresql_concurrently=True,
+                **kwargs,
+            )
+
+    # Only takes a short lock, the unique index is already built
+    op.execute(
+        "ALTER TABLE file_table "
+        "ADD CONSTRAINT uq_name_mimetype UNIQUE USING INDEX uq_name_mimetype"
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_name_mimetype", "file_table", type_="unique")
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name="file_table",
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
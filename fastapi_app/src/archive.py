@@ -0,0 +1,212 @@
+import tarfile
+import time
+import zipfile
+from typing import AsyncIterator, Dict, NamedTuple, Tuple
+
+TAR_BLOCK_SIZE = tarfile.BLOCKSIZE
+TAR_READ_CHUNK_SIZE = 64 * 1024
+
+ARCHIVE_FORMAT_TAR = "tar"
+ARCHIVE_FORMAT_ZIP = "zip"
+
+ARCHIVE_MEDIA_TYPES = {
+    ARCHIVE_FORMAT_TAR: "application/x-tar",
+    ARCHIVE_FORMAT_ZIP: "application/zip",
+}
+
+# The earliest date a zip entry can carry
+_ZIP_MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class ArchiveEntry(NamedTuple):
+    name: str
+    size: int
+    mtime: float
+    content: AsyncIterator[bytes]
+
+
+class _StreamReader:
+    def __init__(self, stream: AsyncIterator[bytes]):
+        self._stream = stream
+        self._buffer = bytearray()
+        self._exhausted = False
+
+    async def read(self, size: int) -> bytes:
+        """Returns up to size bytes, fewer only at the end of the stream."""
+        while len(self._buffer) < size and not self._exhausted:
+            try:
+                self._buffer += await self._stream.__anext__()
+            except StopAsyncIteration:
+                self._exhausted = True
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    async def read_exactly(self, size: int) -> bytes:
+        data = await self.read(size)
+        if len(data) < size:
+            raise ArchiveError("Unexpected end of the tar stream")
+        return data
+
+
+def _padded(size: int) -> int:
+    return -(-size // TAR_BLOCK_SIZE) * TAR_BLOCK_SIZE
+
+
+def _parse_pax_headers(data: bytes) -> Dict[str, str]:
+    headers = {}
+    while data:
+        length, _, rest = data.partition(b" ")
+        try:
+            record_length = int(length)
+        except ValueError:
+            raise ArchiveError("Malformed pax header in the tar stream")
+        record = rest[: record_length - len(length) - 2]
+        key, _, value = record.partition(b"=")
+        headers[key.decode("utf-8")] = value.decode("utf-8", "surrogateescape")
+        data = data[record_length:]
+    return headers
+
+
+async def iter_tar_members(
+    stream: AsyncIterator[bytes],
+) -> AsyncIterator[Tuple[str, int, AsyncIterator[bytes]]]:
+    """Yields the name, size and content of each regular file of a tar stream.
+
+    The archive is parsed as it arrives, so only one chunk is held in memory.
+    The content of a member must be consumed before the next one is read,
+    whatever is left of it is skipped.
+    """
+    reader = _StreamReader(stream)
+    long_name = None
+    pax_headers: Dict[str, str] = {}
+
+    while True:
+        header = await reader.read(TAR_BLOCK_SIZE)
+        if len(header) < TAR_BLOCK_SIZE or header == tarfile.NUL * TAR_BLOCK_SIZE:
+            return
+
+        try:
+            tar_info = tarfile.TarInfo.frombuf(header, "utf-8", "surrogateescape")
+        except tarfile.HeaderError as e:
+            raise ArchiveError(f"Malformed header in the tar stream: {e}")
+
+        if tar_info.type == tarfile.GNUTYPE_LONGNAME:
+            data = await reader.read_exactly(_padded(tar_info.size))
+            long_name = tarfile.nts(data[: tar_info.size], "utf-8", "surrogateescape")
+            continue
+        if tar_info.type in (tarfile.XHDTYPE, tarfile.SOLARIS_XHDTYPE):
+            data = await reader.read_exactly(_padded(tar_info.size))
+            pax_headers = _parse_pax_headers(data[: tar_info.size])
+            continue
+        if tar_info.type == tarfile.XGLTYPE:
+            await reader.read_exactly(_padded(tar_info.size))
+            continue
+
+        name = pax_headers.get("path") or long_name or tar_info.name
+        size = int(pax_headers.get("size", tar_info.size))
+        long_name, pax_headers = None, {}
+
+        if not tar_info.isreg():
+            await reader.read_exactly(_padded(size))
+            continue
+
+        remaining = size
+
+        async def iter_content() -> AsyncIterator[bytes]:
+            nonlocal remaining
+            while remaining > 0:
+                chunk = await reader.read_exactly(min(TAR_READ_CHUNK_SIZE, remaining))
+                remaining -= len(chunk)
+                yield chunk
+
+        yield name, size, iter_content()
+
+        await reader.read_exactly(remaining + _padded(size) - size)
+
+
+async def _iter_entry_content(entry: ArchiveEntry) -> AsyncIterator[bytes]:
+    """Yields the content of the entry, checking it has the announced size."""
+    written = 0
+    async for chunk in entry.content:
+        written += len(chunk)
+        if written > entry.size:
+            break
+        yield chunk
+
+    if written != entry.size:
+        raise ArchiveError(
+            f"Entry '{entry.name}' has {written} bytes instead of {entry.size}"
+        )
+
+
+async def stream_tar(entries: AsyncIterator[ArchiveEntry]) -> AsyncIterator[bytes]:
+    """Builds a tar archive of the entries as a stream of chunks.
+
+    The header of an entry is written before its content, so the size of
+    each entry must be known in advance.
+    """
+    async for entry in entries:
+        tar_info = tarfile.TarInfo(entry.name)
+        tar_info.size = entry.size
+        tar_info.mtime = entry.mtime
+        tar_info.mode = 0o644
+        yield tar_info.tobuf(format=tarfile.PAX_FORMAT)
+
+        async for chunk in _iter_entry_content(entry):
+            yield chunk
+
+        if entry.size % TAR_BLOCK_SIZE:
+            yield tarfile.NUL * (TAR_BLOCK_SIZE - entry.size % TAR_BLOCK_SIZE)
+
+    yield tarfile.NUL * (2 * TAR_BLOCK_SIZE)
+
+
+class _ZipSink:
+    """Unseekable file object which collects what zipfile writes to it."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+async def stream_zip(entries: AsyncIterator[ArchiveEntry]) -> AsyncIterator[bytes]:
+    """Builds an uncompressed zip archive of the entries as a stream of chunks.
+
+    Since the output cannot be seeked back, zipfile writes the CRC of each
+    entry in a data descriptor after its content, and ZIP64 records are used
+    for entries announced larger than 4 GiB.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as zip_file:
+        async for entry in entries:
+            zip_info = zipfile.ZipInfo(
+                entry.name,
+                date_time=max(time.gmtime(entry.mtime)[:6], _ZIP_MIN_DATE_TIME),
+            )
+            zip_info.file_size = entry.size
+            zip_info.external_attr = 0o644 << 16
+
+            with zip_file.open(zip_info, mode="w") as out_file:
+                async for chunk in _iter_entry_content(entry):
+                    out_file.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+
+    yield sink.drain()
@@ -0,0 +1,725 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import math
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends import Backend
+from fastapi_cache.backends.redis import RedisBackend
+from starlette.requests import Request
+from starlette.responses import Response
+
+from fastapi_app.src.schemas import FileMetadata
+
+logger = logging.getLogger("app.cache")
+
+T = TypeVar("T")
+
+FILES_CACHE_NAMESPACE = "files"
+METADATA_CACHE_NAMESPACE = "metadata"
+
+DEFAULT_METADATA_CACHE_EXPIRE = 5 * 60
+DEFAULT_METADATA_CACHE_NEGATIVE_EXPIRE = 30
+
+DEFAULT_LOCAL_CACHE_MAX_ENTRIES = 1024
+DEFAULT_LOCAL_CACHE_TTL = 5.0
+INVALIDATION_CHANNEL = "cache-invalidation"
+INVALIDATION_RETRY_DELAY = 1.0
+LOCK_POLL_INTERVAL = 0.05
+
+# Deletes the lock only if it is still held with the token of the caller
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class CacheTierMetrics:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def as_dict(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class _LocalEntry(NamedTuple):
+    value: str
+    expires_at: float
+    # When the entry expires in Redis, None if it does not
+    remote_expires_at: Optional[float]
+
+
+class LocalCache:
+    """Size-bounded LRU map whose entries expire after a short TTL."""
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_LOCAL_CACHE_MAX_ENTRIES,
+        ttl: float = DEFAULT_LOCAL_CACHE_TTL,
+    ):
+        if max_entries <= 0:
+            raise ValueError("Number of entries must be greater than 0")
+        if ttl <= 0:
+            raise ValueError("TTL must be greater than 0")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries: "OrderedDict[str, _LocalEntry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[_LocalEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, value: str, remote_ttl: Optional[float] = None) -> None:
+        now = time.monotonic()
+        remote_expires_at = now + remote_ttl if remote_ttl is not None else None
+        expires_at = now + self.ttl
+        if remote_expires_at is not None:
+            expires_at = min(expires_at, remote_expires_at)
+
+        self._entries[key] = _LocalEntry(value, expires_at, remote_expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class TieredBackend(Backend):
+    """fastapi_cache backend with an in-process LRU in front of Redis.
+
+    Hits on the local tier cost neither a round-trip nor a Redis call.
+    Invalidations are broadcast over Redis pub/sub, and each worker drops
+    the matching local entries. The short local TTL bounds staleness when
+    a message is missed, e.g. while the subscription reconnects.
+    """
+
+    def __init__(
+        self,
+        redis,
+        max_entries: int = DEFAULT_LOCAL_CACHE_MAX_ENTRIES,
+        ttl: float = DEFAULT_LOCAL_CACHE_TTL,
+        channel: str = INVALIDATION_CHANNEL,
+    ):
+        self.redis = redis
+        self._remote = RedisBackend(redis)
+        self._local = LocalCache(max_entries=max_entries, ttl=ttl)
+        self._channel = channel
+        self._listener: Optional[asyncio.Task] = None
+        self.local_metrics = CacheTierMetrics()
+        self.remote_metrics = CacheTierMetrics()
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[str]]:
+        entry = self._local.get(key)
+        if entry is not None:
+            self.local_metrics.hits += 1
+            if entry.remote_expires_at is None:
+                return -1, entry.value
+            remaining = math.ceil(entry.remote_expires_at - time.monotonic())
+            return max(remaining, 0), entry.value
+        self.local_metrics.misses += 1
+
+        ttl, value = await self._remote.get_with_ttl(key)
+        if value is None:
+            self.remote_metrics.misses += 1
+            return ttl, value
+
+        self.remote_metrics.hits += 1
+        self._local.set(key, value, remote_ttl=ttl if ttl >= 0 else None)
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[str]:
+        _, value = await self.get_with_ttl(key)
+        return value
+
+    async def set(
+        self,
+        key: str,
+        value: str,
+        expire: Optional[int] = None,
+        only_if_absent: bool = False,
+    ) -> None:
+        if only_if_absent:
+            if not await self.redis.set(key, value, ex=expire, nx=True):
+                return
+        else:
+            await self._remote.set(key, value, expire=expire)
+        self._local.set(key, value, remote_ttl=expire)
+
+    async def clear(
+        self, namespace: Optional[str] = None, key: Optional[str] = None
+    ) -> int:
+        num_deleted = await self._remote.clear(namespace=namespace, key=key)
+        if namespace:
+            await self.invalidate(f"{namespace}:")
+        elif key:
+            await self.invalidate(key)
+        return num_deleted
+
+    async def invalidate(self, prefix: str) -> None:
+        """Drops the local entries whose keys start with the prefix, in this
+        worker at once and in the others when they receive the message."""
+        self._local.delete_prefix(prefix)
+        await self.redis.publish(self._channel, prefix)
+
+    def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self.__listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def __listen(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self._channel)
+                # Messages published while unsubscribed are lost
+                self._local.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        prefix = message["data"]
+                        if isinstance(prefix, bytes):
+                            prefix = prefix.decode()
+                        self._local.delete_prefix(prefix)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation subscription lost: {e}")
+                await asyncio.sleep(INVALIDATION_RETRY_DELAY)
+            finally:
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+
+    def get_metrics(self) -> Dict:
+        return {
+            "local": {
+                **self.local_metrics.as_dict(),
+                "entries": len(self._local),
+                "max_entries": self._local.max_entries,
+                "evictions": self._local.evictions,
+            },
+            "redis": self.remote_metrics.as_dict(),
+        }
+
+
+def _canonical(value: Any) -> Any:
+    """Drops the None entries of dicts and turns lists into sorted sets."""
+    if isinstance(value, dict):
+        return {
+            str(name): _canonical(item)
+            for name, item in value.items()
+            if item is not None
+        }
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sorted(
+            {
+                json.dumps(_canonical(item), sort_keys=True, default=str)
+                for item in value
+                if item is not None
+            }
+        )
+    return value
+
+
+def canonical_key_builder(
+    func: Callable,
+    namespace: Optional[str] = "",
+    request: Optional[Request] = None,
+    response: Optional[Response] = None,
+    args: Optional[tuple] = None,
+    kwargs: Optional[dict] = None,
+) -> str:
+    """Builds the same key for the requests which select the same rows.
+
+    List values are filters matching any of their items, so their order and
+    duplicates do not matter, and a parameter set to None is the same as a
+    missing one. Unlike the default key builder of fastapi_cache, the raw
+    request is not part of the key.
+    """
+    payload = json.dumps(
+        {
+            "args": [_canonical(arg) for arg in args or ()],
+            "kwargs": _canonical(kwargs or {}),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    digest = hashlib.sha256(
+        f"{func.__module__}:{func.__qualname__}:{payload}".encode()
+    ).hexdigest()
+    return f"{FastAPICache.get_prefix()}:{namespace}:{digest}"
+
+
+class CacheNamespace:
+    """Namespace of cached responses which is invalidated as a whole.
+
+    The keys of the namespace embed a generation counter kept in Redis, so
+    bumping the counter makes every entry cached so far unreachable in O(1),
+    without scanning or deleting keys; they are left to expire. The key
+    builder reads the generation before the handler runs, so a result
+    computed while a write commits is stored under the old generation and
+    is never served.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @property
+    def key_prefix(self) -> str:
+        return f"{FastAPICache.get_prefix()}:{self.name}:"
+
+    @property
+    def generation_key(self) -> str:
+        return f"{self.key_prefix}generation"
+
+    async def get_generation(self) -> int:
+        # Read through the backend, so a tiered one keeps it locally
+        generation = await FastAPICache.get_backend().get(self.generation_key)
+        return int(generation) if generation else 0
+
+    async def invalidate(self) -> None:
+        try:
+            backend = FastAPICache.get_backend()
+            await backend.redis.incr(self.generation_key)
+            if isinstance(backend, TieredBackend):
+                await backend.invalidate(self.key_prefix)
+        except Exception as e:
+            logger.error(f"Failed to invalidate cache namespace '{self.name}': {e}")
+
+    async def key_builder(
+        self,
+        func: Callable,
+        namespace: Optional[str] = "",
+        request: Optional[Request] = None,
+        response: Optional[Response] = None,
+        args: Optional[tuple] = None,
+        kwargs: Optional[dict] = None,
+    ) -> str:
+        try:
+            generation = str(await self.get_generation())
+        except Exception as e:
+            # A key no one will look up again, the result is not served stale
+            logger.warning(f"Failed to read generation of '{self.name}': {e}")
+            generation = uuid.uuid4().hex
+
+        return canonical_key_builder(
+            func,
+            f"{namespace}:{generation}",
+            request=request,
+            response=response,
+            args=args,
+            kwargs=kwargs,
+        )
+
+
+files_cache = CacheNamespace(FILES_CACHE_NAMESPACE)
+
+
+class FileMetadataCache:
+    """Read-through, write-through cache of the metadata of files by id.
+
+    Ids without a file are cached too, for a shorter time. Reads fill the
+    cache only where it has no entry, while writes overwrite it, so a read
+    that raced a write cannot put back the older row. The local tier is
+    bounded by its LRU and the Redis entries expire. A failure of the cache
+    is logged and the database is used instead.
+    """
+
+    def __init__(
+        self,
+        namespace: str = METADATA_CACHE_NAMESPACE,
+        expire: int = DEFAULT_METADATA_CACHE_EXPIRE,
+        negative_expire: int = DEFAULT_METADATA_CACHE_NEGATIVE_EXPIRE,
+    ):
+        self.namespace = namespace
+        self.expire = expire
+        self.negative_expire = negative_expire
+
+    def __get_key(self, file_id: int) -> str:
+        # Invalidations are key prefixes, the trailing colon keeps the
+        # one of id 1 from matching id 12
+        return f"{FastAPICache.get_prefix()}:{self.namespace}:{file_id}:"
+
+    def __encode(self, metadata: Optional[FileMetadata]) -> Tuple[str, int]:
+        if metadata is None:
+            return "null", self.negative_expire
+        return metadata.model_dump_json(exclude_none=True), self.expire
+
+    async def get(self, file_id: int) -> Tuple[bool, Optional[FileMetadata]]:
+        """Returns whether the id is cached, and its metadata if it has a file."""
+        try:
+            value = await FastAPICache.get_backend().get(self.__get_key(file_id))
+            if value is None:
+                return False, None
+            if value in ("null", b"null"):
+                return True, None
+            return True, FileMetadata.model_validate_json(value)
+        except Exception as e:
+            logger.warning(f"Failed to read cached metadata with id={file_id}: {e}")
+            return False, None
+
+    async def fill(self, file_id: int, metadata: Optional[FileMetadata]) -> None:
+        """Caches what a read found, unless a write has cached it meanwhile."""
+        value, expire = self.__encode(metadata)
+        try:
+            backend = FastAPICache.get_backend()
+            if isinstance(backend, TieredBackend):
+                await backend.set(
+                    self.__get_key(file_id), value, expire=expire, only_if_absent=True
+                )
+            else:
+                await backend.redis.set(
+                    self.__get_key(file_id), value, ex=expire, nx=True
+                )
+        except Exception as e:
+            logger.warning(f"Failed to cache metadata with id={file_id}: {e}")
+
+    async def put(self, written: Dict[int, Optional[FileMetadata]]) -> None:
+        """Caches the committed metadata, None for the ids of deleted files."""
+        for file_id, metadata in written.items():
+            value, expire = self.__encode(metadata)
+            key = self.__get_key(file_id)
+            try:
+                backend = FastAPICache.get_backend()
+                await backend.set(key, value, expire=expire)
+                if isinstance(backend, TieredBackend):
+                    await backend.invalidate(key)
+            except Exception as e:
+                logger.error(f"Failed to cache metadata with id={file_id}: {e}")
+                await self.evict([file_id])
+
+    async def clear(self) -> None:
+        await FastAPICache.clear(namespace=self.namespace)
+
+    async def evict(self, file_ids: Iterable[int]) -> None:
+        for file_id in file_ids:
+            try:
+                await FastAPICache.get_backend().clear(key=self.__get_key(file_id))
+            except Exception as e:
+                logger.error(f"Failed to evict cached metadata with id={file_id}: {e}")
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time in this worker.
+
+    Concurrent callers of a key await the computation already running. It
+    runs in its own task, so a caller which is cancelled, e.g. because its
+    client went away, does not cancel it for the others.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.computations = 0
+        self.coalesced = 0
+
+    def start(self, key: str, compute: Callable[[], Awaitable[T]]) -> asyncio.Task:
+        task = self._tasks.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+
+        task = asyncio.ensure_future(compute())
+        self.computations += 1
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self.__forget(key, task))
+        return task
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[T]]) -> T:
+        return await asyncio.shield(self.start(key, compute))
+
+    def __forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Retrieved here, so an error without any caller left is not logged
+        # as never retrieved
+        if not task.cancelled():
+            task.exception()
+
+
+class _CachedValue(NamedTuple):
+    value: Any
+    fresh_until: float
+
+
+class _CoalescingMetrics:
+    def __init__(self) -> None:
+        self.stale_served = 0
+        self.lock_waits = 0
+
+
+_single_flight = SingleFlight()
+_coalescing_metrics = _CoalescingMetrics()
+
+
+def _encode_cached_value(value: Any, fresh_until: float) -> str:
+    return json.dumps(
+        {"value": jsonable_encoder(value), "fresh_until": fresh_until},
+        separators=(",", ":"),
+    )
+
+
+def _decode_cached_value(data: Any) -> Optional[_CachedValue]:
+    try:
+        payload = json.loads(data)
+        return _CachedValue(payload["value"], payload["fresh_until"])
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+async def _get_cached_value(key: str) -> Optional[_CachedValue]:
+    try:
+        data = await FastAPICache.get_backend().get(key)
+    except Exception as e:
+        logger.warning(f"Failed to read cache key '{key}': {e}")
+        return None
+    return _decode_cached_value(data) if data is not None else None
+
+
+async def _set_cached_value(key: str, value: Any, expire: int, stale: int) -> None:
+    try:
+        await FastAPICache.get_backend().set(
+            key, _encode_cached_value(value, time.time() + expire), expire + stale
+        )
+    except Exception as e:
+        logger.warning(f"Failed to set cache key '{key}': {e}")
+
+
+async def _acquire_lock(key: str, timeout: float) -> Optional[str]:
+    """Returns the token of the lock of the key, None if another holds it."""
+    token = uuid.uuid4().hex
+    try:
+        redis = FastAPICache.get_backend().redis
+        if await redis.set(f"{key}:lock", token, px=int(timeout * 1000), nx=True):
+            return token
+        return None
+    except Exception as e:
+        # Without the lock the worker computes like when it holds it
+        logger.warning(f"Failed to lock cache key '{key}': {e}")
+        return token
+
+
+async def _release_lock(key: str, token: str) -> None:
+    try:
+        redis = FastAPICache.get_backend().redis
+        await redis.eval(_RELEASE_LOCK_SCRIPT, 1, f"{key}:lock", token)
+    except Exception as e:
+        logger.warning(f"Failed to unlock cache key '{key}': {e}")
+
+
+async def _wait_for_fresh_value(key: str, timeout: float) -> Optional[_CachedValue]:
+    deadline = time.monotonic() + timeout
+    redis = FastAPICache.get_backend().redis
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        try:
+            data = await redis.get(key)
+        except Exception:
+            return None
+        cached_value = _decode_cached_value(data) if data is not None else None
+        if cached_value is not None and cached_value.fresh_until > time.time():
+            return cached_value
+    return None
+
+
+def cached(
+    namespace: CacheNamespace,
+    expire: Optional[int] = None,
+    stale_while_revalidate: int = 0,
+    lock_timeout: Optional[float] = None,
+    ignored_params: Iterable[str] = (),
+) -> Callable[[Callable[..., Awaitable]], Callable[..., Awaitable]]:
+    """Caches the result of a GET handler, like the decorator of fastapi_cache.
+
+    The ignored params, such as injected services, are left out of the key.
+
+    A missing key is computed once per worker, the concurrent requests for
+    it await the same computation. With lock_timeout it is also computed
+    once across workers: a worker which finds the Redis lock of the key
+    taken polls for the value instead, for at most lock_timeout seconds.
+    With stale_while_revalidate an expired value is still served for that
+    many seconds, while a single refresh runs in the background.
+
+    Workers only share keys, and so locks and stale values, when the key is
+    built from the same arguments in all of them. A param whose value is
+    local to the process, such as a dependency marker whose repr holds its
+    address, has to be ignored, or each worker caches under its own keys.
+    """
+
+    def wrapper(func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        signature = inspect.signature(func)
+        has_request = any(
+            param.annotation is Request for param in signature.parameters.values()
+        )
+        has_response = any(
+            param.annotation is Response for param in signature.parameters.values()
+        )
+
+        parameters = [
+            param
+            for param in signature.parameters.values()
+            if param.kind <= inspect.Parameter.KEYWORD_ONLY
+        ]
+        if not has_request:
+            parameters.append(
+                inspect.Parameter(
+                    name="request",
+                    annotation=Request,
+                    kind=inspect.Parameter.KEYWORD_ONLY,
+                )
+            )
+        if not has_response:
+            parameters.append(
+                inspect.Parameter(
+                    name="response",
+                    annotation=Response,
+                    kind=inspect.Parameter.KEYWORD_ONLY,
+                )
+            )
+        parameters.extend(
+            param
+            for param in signature.parameters.values()
+            if param.kind > inspect.Parameter.KEYWORD_ONLY
+        )
+        func.__signature__ = signature.replace(parameters=parameters)
+        key_excluded_params = {"request", "response", *ignored_params}
+
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            request: Optional[Request] = kwargs.get("request")
+            response: Optional[Response] = kwargs.get("response")
+            call_kwargs = dict(kwargs)
+            if not has_request:
+                call_kwargs.pop("request", None)
+            if not has_response:
+                call_kwargs.pop("response", None)
+
+            async def call():
+                return await func(*args, **call_kwargs)
+
+            if (
+                request is None
+                or request.method != "GET"
+                or request.headers.get("Cache-Control") in ("no-store", "no-cache")
+                or not FastAPICache.get_enable()
+            ):
+                return await call()
+
+            key = await namespace.key_builder(
+                func,
+                namespace.name,
+                request=request,
+                response=response,
+                args=args,
+                kwargs={
+                    name: value
+                    for name, value in kwargs.items()
+                    if name not in key_excluded_params
+                },
+            )
+            ttl = expire or FastAPICache.get_expire()
+
+            async def compute():
+                token = None
+                if lock_timeout:
+                    token = await _acquire_lock(key, lock_timeout)
+                    if token is None:
+                        _coalescing_metrics.lock_waits += 1
+                        cached_value = await _wait_for_fresh_value(key, lock_timeout)
+                        if cached_value is not None:
+                            return cached_value.value
+
+                try:
+                    value = await call()
+                    await _set_cached_value(key, value, ttl, stale_while_revalidate)
+                    return value
+                finally:
+                    if token is not None:
+                        await _release_lock(key, token)
+
+            cached_value = await _get_cached_value(key)
+            if cached_value is None:
+                value = await _single_flight.run(key, compute)
+                max_age = ttl
+            elif cached_value.fresh_until > time.time():
+                value = cached_value.value
+                max_age = math.ceil(cached_value.fresh_until - time.time())
+            else:
+                _single_flight.start(key, compute)
+                _coalescing_metrics.stale_served += 1
+                value = cached_value.value
+                max_age = 0
+
+            if response is not None:
+                response.headers["Cache-Control"] = f"max-age={max_age}"
+            return value
+
+        return inner
+
+    return wrapper
+
+
+def get_cache_metrics() -> Dict:
+    backend = FastAPICache.get_backend()
+    metrics = backend.get_metrics() if isinstance(backend, TieredBackend) else {}
+    metrics["coalescing"] = {
+        "computations": _single_flight.computations,
+        "coalesced": _single_flight.coalesced,
+        "stale_served": _coalescing_metrics.stale_served,
+        "lock_waits": _coalescing_metrics.lock_waits,
+    }
+    return metrics
@@ -0,0 +1,102 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import wraps
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from starlette.datastructures import Headers
+
+from fastapi_app.src.schemas import FileMetadata
+
+
+def _as_utc(dt: datetime) -> datetime:
+    if not dt.tzinfo:
+        return dt.replace(tzinfo=timezone.utc)
+
+    return dt.astimezone(timezone.utc)
+
+
+def file_validators(metadata: FileMetadata) -> Dict[str, str]:
+    """Builds the ETag and Last-Modified headers of a stored file.
+
+    The ETag is the content hash when it is known, otherwise the id and the
+    modification time, which change on every update of the file.
+    """
+    headers = {}
+    if metadata.sha256:
+        headers["etag"] = f'"{metadata.sha256}"'
+    elif metadata.modificationTime:
+        modification_time = _as_utc(metadata.modificationTime)
+        headers["etag"] = f'"{metadata.id}-{modification_time.timestamp():.6f}"'
+
+    if metadata.modificationTime:
+        headers["last-modified"] = format_datetime(
+            _as_utc(metadata.modificationTime).replace(microsecond=0), usegmt=True
+        )
+
+    return headers
+
+
+def is_not_modified(request_headers: Headers, response_headers: Dict[str, str]) -> bool:
+    """Evaluates If-None-Match, or If-Modified-Since if the former is absent."""
+    if_none_match = request_headers.get("if-none-match")
+    etag = response_headers.get("etag")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request_headers.get("if-modified-since")
+    last_modified = response_headers.get("last-modified")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(
+            if_modified_since
+        )
+    except (TypeError, ValueError):
+        return False
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+def conditional_json(func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    """Adds a strong ETag, the SHA-256 of the JSON body, to a cached GET handler.
+
+    Placed above the cache decorator, whose signature already receives the
+    request and response, it answers 304 when the client holds the same
+    result set, whether it was computed or taken from the cache.
+    """
+
+    @wraps(func)
+    async def inner(*args, **kwargs):
+        result = await func(*args, **kwargs)
+        if isinstance(result, Response):
+            return result
+
+        content = jsonable_encoder(result)
+        body = json.dumps(
+            content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+        headers = {}
+        response: Optional[Response] = kwargs.get("response")
+        if response is not None:
+            headers.update(
+                (key, value)
+                for key, value in response.headers.items()
+                if key not in ("etag", "content-length")
+            )
+        headers["etag"] = f'"{hashlib.sha256(body).hexdigest()}"'
+
+        if is_not_modified(kwargs["request"].headers, headers):
+            return not_modified_response(headers)
+
+        return JSONResponse(content=content, headers=headers)
+
+    return inner
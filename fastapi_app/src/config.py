@@ -20,6 +20,11 @@ class DatabaseSettings(BaseSettings):
     db_user: str
     db_pass: str
     db_name: str
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -43,6 +48,11 @@ class RedisSettings(BaseSettings):
     redis_host: str
     redis_port: str
     redis_db: str
+    redis_cache_expire: int = 60 * 60
+    redis_local_cache_max_entries: int = 1024
+    redis_local_cache_ttl: float = 5
+    redis_metadata_cache_expire: int = 5 * 60
+    redis_metadata_cache_negative_expire: int = 30
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -53,6 +63,24 @@ class RedisSettings(BaseSettings):
         return f"redis://{self.redis_host}:{self.redis_port}/{self.redis_db}"
 
 
+class StorageSettings(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file=os.path.join(_root_dir, ".env.storage"), extra="allow"
+    )
+
+    storage_dir: str = os.path.join(_root_dir, "storage")
+    storage_layout: str = "flat"
+    storage_chunk_size: int = 1024 * 1024
+    storage_fsync_policy: str = "none"
+    storage_backend: str = "disk"
+    storage_download_mode: str = "app"
+    storage_accel_location: str = "/protected-storage/"
+    storage_bulk_concurrency: int = 8
+    storage_upload_session_ttl: int = 24 * 60 * 60
+    storage_fs_workers: int = 8
+    storage_fs_max_queue: int = 256
+
+
 def merge_dicts(*dicts: Dict) -> Dict:
     merged = {}
     for d in dicts:
@@ -70,9 +98,12 @@ def merge_dicts(*dicts: Dict) -> Dict:
 
 if __name__ == "__main__":
     db_settings = DatabaseSettings()
+    storage_settings = StorageSettings()
     log_settings_dict = LOGGING_CONFIG
     settings_dict = merge_dicts(
-        {"database": db_settings.model_dump()}, {"logging": log_settings_dict}
+        {"database": db_settings.model_dump()},
+        {"storage": storage_settings.model_dump()},
+        {"logging": log_settings_dict},
     )
 
     redis_settings = RedisSettings()
@@ -1,18 +1,72 @@
+import time
 from contextlib import AbstractContextManager, asynccontextmanager
+from typing import Dict
 
-from sqlalchemy import NullPool
+from sqlalchemy import AsyncAdaptedQueuePool, NullPool
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from fastapi_app.src.db_service.entities import Base
 
 
+class PoolMetrics:
+    """Counts connection checkouts and the time spent waiting for them."""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.checkout_time_total = 0.0
+        self.checkout_time_max = 0.0
+
+    def record_checkout(self, checkout_time: float) -> None:
+        self.checkouts += 1
+        self.checkout_time_total += checkout_time
+        self.checkout_time_max = max(self.checkout_time_max, checkout_time)
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Connection pool which records how long every checkout takes, including
+    waiting for a free connection and opening a new one."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        connection = super()._do_get()
+        self.metrics.record_checkout(time.perf_counter() - started_at)
+        return connection
+
+
 class Database:
     """Database class for managing asynchronous database operations using
     SQLAlchemy."""
 
-    def __init__(self, db_url: str) -> None:
-        """Initializes the Database instance with the provided database URL."""
-        self._async_engine = create_async_engine(db_url, poolclass=NullPool)
+    def __init__(
+        self,
+        db_url: str,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        pool_timeout: float = 30,
+        pool_recycle: int = 1800,
+        pool_pre_ping: bool = True,
+    ) -> None:
+        """Initializes the Database instance with the provided database URL.
+
+        A pool size of 0 disables pooling, so every session opens its own
+        connection.
+        """
+        if pool_size > 0:
+            self._async_engine = create_async_engine(
+                db_url,
+                poolclass=InstrumentedAsyncPool,
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_timeout=pool_timeout,
+                pool_recycle=pool_recycle,
+                pool_pre_ping=pool_pre_ping,
+            )
+        else:
+            self._async_engine = create_async_engine(db_url, poolclass=NullPool)
         self._async_session_factory = async_sessionmaker(
             bind=self._async_engine, autoflush=False, expire_on_commit=False
         )
@@ -30,6 +84,28 @@ class Database:
                 await session.execute(table.delete())
             await session.commit()
 
+    async def dispose(self) -> None:
+        """Closes all connections held by the pool."""
+        await self._async_engine.dispose()
+
+    def get_pool_metrics(self) -> Dict:
+        """Returns the pool state together with its checkout statistics."""
+        pool = self._async_engine.pool
+        if not isinstance(pool, InstrumentedAsyncPool):
+            return {"pool": pool.status()}
+
+        metrics = pool.metrics
+        return {
+            "pool": pool.status(),
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checkouts": metrics.checkouts,
+            "checkout_time_total": metrics.checkout_time_total,
+            "checkout_time_max": metrics.checkout_time_max,
+        }
+
     @property
     def get_session_factory(self):
         """Getter for the asynchronous session factory."""
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Generic, List
+from typing import Dict, Generic, List, Optional, Tuple
 
 from fastapi_app.src.app_types import D
 
@@ -13,18 +13,38 @@ class AbstractDatabaseRepository(ABC, Generic[D]):
     async def update_one(self, id: int, new_data: D) -> D:
         pass
 
+    @abstractmethod
+    async def upsert_one(self, data: D) -> Tuple[D, Optional[D]]:
+        pass
+
+    @abstractmethod
+    async def insert_many(self, data: List[D]) -> List[D]:
+        pass
+
+    @abstractmethod
+    async def upsert_many(self, data: List[D]) -> List[D]:
+        pass
+
     @abstractmethod
     async def select_one_by_id(self, id: int) -> D:
         pass
 
+    @abstractmethod
+    async def select_by_ids(self, ids: List[int], for_update: bool = False) -> List[D]:
+        pass
+
     @abstractmethod
     async def select_some_by_params(
-        self, limit: int, offset: int, params: Dict[str, List]
+        self,
+        limit: int,
+        offset: int,
+        params: Dict[str, List],
+        after_id: Optional[int] = None,
     ) -> List[D]:
         pass
 
     @abstractmethod
     async def delete_some_by_params(
         self, limit: int, offset: int, params: Dict[str, List]
-    ) -> List[int]:
+    ) -> List[D]:
         pass
@@ -1,7 +1,7 @@
 import datetime
 from typing import Optional
 
-from sqlalchemy import BigInteger, UniqueConstraint, text
+from sqlalchemy import BigInteger, Index, String, UniqueConstraint, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 # from fastapi_app.src.database import Base
@@ -22,8 +22,19 @@ class FileOrm(Base):
     modification_time: Mapped[datetime.datetime] = mapped_column(
         server_default=text("TIMEZONE('utc', now())"), onupdate=datetime.datetime.utcnow
     )
-
-    _table_args__ = (UniqueConstraint("name", "mime_type", name="uq_name_mimetype"),)
+    sha256: Mapped[Optional[str]] = mapped_column(String(64), index=True)
+    crc32: Mapped[Optional[int]] = mapped_column(BigInteger)
+
+    __table_args__ = (
+        UniqueConstraint("name", "mime_type", name="uq_name_mimetype"),
+        Index("ix_file_table_tag", "tag"),
+        Index("ix_file_table_mime_type", "mime_type"),
+        Index(
+            "ix_file_table_name_pattern",
+            "name",
+            postgresql_ops={"name": "text_pattern_ops"},
+        ),
+    )
 
     def __str__(self):
         return (
@@ -37,3 +48,14 @@ class FileOrm(Base):
             for key, value in self.__dict__.items()
             if key != "_sa_instance_state"
         }
+
+
+class BlobOrm(Base):
+    __tablename__ = "blob_table"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger)
+    ref_count: Mapped[int]
+
+    def __str__(self):
+        return f"{self.__class__.__name__}({self.sha256}, {self.ref_count})"
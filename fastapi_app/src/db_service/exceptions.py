@@ -11,6 +11,10 @@ class DatabaseError(RepositoryError):
     pass
 
 
+class ConcurrentModificationError(DatabaseError):
+    """Exception raised when a row was written by a concurrent transaction."""
+
+
 class InvalidAttributeError(RepositoryError):
     pass
 
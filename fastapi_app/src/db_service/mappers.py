@@ -17,6 +17,8 @@ class FileMetadataMapper(AbstractDomainEntityMapper[FileMetadata, FileOrm]):
                 "tag": domain_obj.tag,
                 "size": domain_obj.size,
                 "mime_type": domain_obj.mimeType,
+                "sha256": domain_obj.sha256,
+                "crc32": domain_obj.crc32,
             }
             return FileOrm(**payload)
         except Exception as e:
@@ -35,6 +37,8 @@ class FileMetadataMapper(AbstractDomainEntityMapper[FileMetadata, FileOrm]):
                 "size": entity_obj.size,
                 "mimeType": entity_obj.mime_type,
                 "modificationTime": entity_obj.modification_time,
+                "sha256": entity_obj.sha256,
+                "crc32": entity_obj.crc32,
             }
             return FileMetadata(**payload)
         except Exception as e:
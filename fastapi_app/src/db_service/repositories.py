@@ -1,14 +1,30 @@
 import logging
-from typing import Dict, Generic, List, Optional, Type
-
-from sqlalchemy import BinaryExpression, and_, delete, insert, or_, select, update
+from typing import Dict, Generic, Iterator, List, Optional, Tuple, Type
+
+from sqlalchemy import (
+    BinaryExpression,
+    and_,
+    any_,
+    bindparam,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+    text,
+    true,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from fastapi_app.src.app_types import D, E
 from fastapi_app.src.db_service.abstract_mappers import AbstractDomainEntityMapper
 from fastapi_app.src.db_service.abstract_repositories import AbstractDatabaseRepository
-from fastapi_app.src.db_service.entities import FileOrm
+from fastapi_app.src.db_service.entities import BlobOrm, FileOrm
 from fastapi_app.src.db_service.exceptions import (
+    ConcurrentModificationError,
     DatabaseError,
     InvalidAttributeError,
     NoConditionsError,
@@ -18,13 +34,16 @@ from fastapi_app.src.schemas import FileMetadata
 
 logger = logging.getLogger("app.db_service.repositories")
 
+# asyncpg can bind at most 32767 parameters to one statement
+MAX_BIND_PARAMS = 32767
 
-class OrmAlchemyRepository(AbstractDatabaseRepository, Generic[E, D]):
-    model: Optional[Type[E]] = None
 
-    def __init__(self, mapper: AbstractDomainEntityMapper):
+class AlchemySessionRepository:
+    """Base of the repositories whose statements run in a session set by the
+    service, which owns the transaction."""
+
+    def __init__(self):
         self._session: Optional[AsyncSession] = None
-        self._mapper = mapper
 
     def set_session(self, session: AsyncSession):
         if type(session) is not AsyncSession:
@@ -39,7 +58,7 @@ class OrmAlchemyRepository(AbstractDatabaseRepository, Generic[E, D]):
     def clear_session(self):
         self._session = None
 
-    def __validate_session_is_set(self):
+    def _validate_session_is_set(self):
         if self._session is None:
             error_message = (
                 "Session not set. Call set_session() before using the repository."
@@ -47,8 +66,18 @@ class OrmAlchemyRepository(AbstractDatabaseRepository, Generic[E, D]):
             logger.error(error_message)
             raise SessionNotSetError(error_message)
 
+
+class OrmAlchemyRepository(
+    AlchemySessionRepository, AbstractDatabaseRepository, Generic[E, D]
+):
+    model: Optional[Type[E]] = None
+
+    def __init__(self, mapper: AbstractDomainEntityMapper):
+        super().__init__()
+        self._mapper = mapper
+
     async def insert_one(self, data: D) -> D:
-        self.__validate_session_is_set()
+        self._validate_session_is_set()
 
         entity = self._mapper.to_entity(domain_obj=data)
 
@@ -69,7 +98,7 @@ class OrmAlchemyRepository(AbstractDatabaseRepository, Generic[E, D]):
         return domain
 
     async def update_one(self, id: int, new_data: D) -> D:
-        self.__validate_session_is_set()
+        self._validate_session_is_set()
 
         new_entity = self._mapper.to_entity(domain_obj=new_data)
 
@@ -94,8 +123,139 @@ class OrmAlchemyRepository(AbstractDatabaseRepository, Generic[E, D]):
 
         return domain
 
+    async def upsert_one(self, data: D) -> Tuple[D, Optional[D]]:
+        """Inserts the row or updates the one with the same id in a single
+        statement, and returns it together with the row it replaced."""
+        self._validate_session_is_set()
+
+        new_entity = self._mapper.to_entity(domain_obj=data)
+        values = new_entity.to_dict()
+        table = self.model.__table__
+
+        # The conflicting row is only updated if it is still the one read
+        # into "previous", otherwise a concurrent upsert of the same id won
+        # the row lock and this statement returns nothing.
+        previous = select(table).filter_by(id=values["id"]).cte("previous")
+        insert_stmt = pg_insert(table).values(**values)
+        upserted = (
+            insert_stmt.on_conflict_do_update(
+                index_elements=[table.c.id],
+                set_={
+                    **{key: insert_stmt.excluded[key] for key in values if key != "id"},
+                    "modification_time": text("TIMEZONE('utc', now())"),
+                },
+                where=table.c.modification_time.is_not_distinct_from(
+                    select(previous.c.modification_time).scalar_subquery()
+                ),
+            )
+            .returning(*table.c)
+            .cte("upserted")
+        )
+        query = select(
+            *upserted.c,
+            *[column.label(f"previous_{column.key}") for column in previous.c],
+        ).select_from(upserted.outerjoin(previous, true()))
+
+        try:
+            result = await self._session.execute(query)
+            row = result.mappings().one_or_none()
+        except Exception as e:
+            error_message = (
+                f"An error occurred while upserting one file-metadata "
+                f"and executing statement: {str(e)}"
+            )
+            logger.error(error_message)
+            raise DatabaseError(error_message)
+
+        if row is None:
+            error_message = (
+                f"File-metadata with id={values['id']} was modified concurrently"
+            )
+            logger.warning(error_message)
+            raise ConcurrentModificationError(error_message)
+
+        entity_db = self.model(**{column.key: row[column.key] for column in table.c})
+        previous_entity_db = (
+            self.model(
+                **{column.key: row[f"previous_{column.key}"] for column in table.c}
+            )
+            if row["previous_id"] is not None
+            else None
+        )
+
+        return (
+            self._mapper.to_domain(entity_obj=entity_db),
+            (
+                self._mapper.to_domain(entity_obj=previous_entity_db)
+                if previous_entity_db
+                else None
+            ),
+        )
+
+    async def insert_many(self, data: List[D]) -> List[D]:
+        """Inserts the rows with multi-row INSERT ... VALUES statements, each
+        of them as large as the bind parameter limit allows."""
+        self._validate_session_is_set()
+
+        values_lst = self.__to_values_list(data)
+
+        inserted = []
+        try:
+            for values_chunk in self.__chunk_values(values_lst):
+                stmt = insert(self.model).values(values_chunk).returning(self.model)
+                result = await self._session.execute(stmt)
+                inserted.extend(result.scalars().all())
+        except Exception as e:
+            error_message = (
+                f"An error occurred while insert many file-metadata "
+                f"to session and executing statement: {str(e)}"
+            )
+            logger.error(error_message)
+            raise DatabaseError(error_message)
+
+        return self.__to_domains_in_order(inserted, values_lst)
+
+    async def upsert_many(self, data: List[D]) -> List[D]:
+        """Inserts the rows or updates those with the same ids, in as few
+        statements as insert_many."""
+        self._validate_session_is_set()
+
+        values_lst = self.__to_values_list(data)
+        table = self.model.__table__
+
+        upserted = []
+        try:
+            for values_chunk in self.__chunk_values(values_lst):
+                insert_stmt = pg_insert(self.model).values(values_chunk)
+                stmt = (
+                    insert_stmt.on_conflict_do_update(
+                        index_elements=[table.c.id],
+                        set_={
+                            **{
+                                key: insert_stmt.excluded[key]
+                                for key in values_chunk[0]
+                                if key != "id"
+                            },
+                            "modification_time": text("TIMEZONE('utc', now())"),
+                        },
+                    )
+                    .returning(self.model)
+                    .execution_options(populate_existing=True)
+                )
+                result = await self._session.execute(stmt)
+                upserted.extend(result.scalars().all())
+        except Exception as e:
+            error_message = (
+                f"An error occurred while upserting many file-metadata "
+                f"and executing statement: {str(e)}"
+            )
+            logger.error(error_message)
+            raise DatabaseError(error_message)
+
+        return self.__to_domains_in_order(upserted, values_lst)
+
     async def select_one_by_id(self, id: int) -> Optional[D]:
-        self.__validate_session_is_set()
+        self._validate_session_is_set()
 
         query = select(self.model).filter_by(id=id)
         try:
@@ -111,20 +271,54 @@ class OrmAlchemyRepository(AbstractDatabaseRepository, Generic[E, D]):
 
         return self._mapper.to_domain(entity_obj=entity_db) if entity_db else None
 
+    async def select_by_ids(self, ids: List[int], for_update: bool = False) -> List[D]:
+        """Selects the rows with the given ids, ordered by id. The ids are
+        bound as one array, so the statement is the same for any count.
+        With for_update the rows stay locked until the end of the transaction.
+        """
+        self._validate_session_is_set()
+
+        if not ids:
+            return []
+
+        query = (
+            select(self.model)
+            .filter(
+                self.model.id
+                == any_(bindparam("ids", ids, type_=ARRAY(self.model.id.type)))
+            )
+            .order_by(self.model.id)
+        )
+        if for_update:
+            query = query.with_for_update()
+        try:
+            result = await self._session.execute(query)
+            entity_list = result.scalars().all()
+        except Exception as e:
+            error_message = (
+                f"An error occurred while selecting file-metadata "
+                f"by their ids and executing query: {str(e)}"
+            )
+            logger.error(error_message)
+            raise DatabaseError(error_message)
+
+        return [self._mapper.to_domain(entity_obj=entity) for entity in entity_list]
+
     async def select_some_by_params(
         self,
         params: Dict[str, List],
         limit: Optional[int] = None,
         offset: Optional[int] = None,
+        after_id: Optional[int] = None,
     ) -> List[D]:
-        self.__validate_session_is_set()
-
-        query = (
-            select(self.model)
-            .filter(self.get_filter_expression(params=params))
-            .limit(limit)
-            .offset(offset)
-        )
+        """Selects rows ordered by id. With after_id only the rows following
+        it are selected, so a page costs the same however deep it is."""
+        self._validate_session_is_set()
+
+        query = select(self.model).filter(self.get_filter_expression(params=params))
+        if after_id is not None:
+            query = query.filter(self.model.id > after_id)
+        query = query.order_by(self.model.id).limit(limit).offset(offset)
         try:
             result = await self._session.execute(query)
             entity_list = result.scalars().all()
@@ -143,8 +337,8 @@ class OrmAlchemyRepository(AbstractDatabaseRepository, Generic[E, D]):
         params: Dict[str, List],
         limit: Optional[int] = None,
         offset: Optional[int] = None,
-    ) -> List[int]:
-        self.__validate_session_is_set()
+    ) -> List[D]:
+        self._validate_session_is_set()
 
         if not params:
             error_message = (
@@ -159,13 +353,12 @@ class OrmAlchemyRepository(AbstractDatabaseRepository, Generic[E, D]):
             delete(self.model).filter(self.get_filter_expression(params=params))
             # .limit(limit)
             # .offset(offset)
-            .returning(self.model.id)
+            .returning(self.model)
         )
 
         try:
             result = await self._session.execute(stmt)
-            ids_list = result.scalars().all()
-            return ids_list
+            entity_list = result.scalars().all()
         except Exception as e:
             error_message = (
                 f"An error occurred while selecting one file-metadata "
@@ -174,6 +367,31 @@ class OrmAlchemyRepository(AbstractDatabaseRepository, Generic[E, D]):
             logger.error(error_message)
             raise DatabaseError(error_message)
 
+        return [self._mapper.to_domain(entity_obj=entity) for entity in entity_list]
+
+    def __to_values_list(self, data: List[D]) -> List[Dict]:
+        return [
+            self._mapper.to_entity(domain_obj=domain_obj).to_dict()
+            for domain_obj in data
+        ]
+
+    @staticmethod
+    def __chunk_values(values_lst: List[Dict]) -> Iterator[List[Dict]]:
+        if not values_lst:
+            return
+        chunk_size = MAX_BIND_PARAMS // len(values_lst[0])
+        for i in range(0, len(values_lst), chunk_size):
+            yield values_lst[i : i + chunk_size]
+
+    def __to_domains_in_order(
+        self, entity_list: List[E], values_lst: List[Dict]
+    ) -> List[D]:
+        entities_by_id = {entity.id: entity for entity in entity_list}
+        return [
+            self._mapper.to_domain(entity_obj=entities_by_id[values["id"]])
+            for values in values_lst
+        ]
+
     def get_filter_expression(self, params: Dict[str, List]) -> BinaryExpression:
         and_items = []
 
@@ -202,3 +420,92 @@ class OrmAlchemyRepository(AbstractDatabaseRepository, Generic[E, D]):
 
 class FileMetadataRepository(OrmAlchemyRepository[FileOrm, FileMetadata]):
     model = FileOrm
+
+
+class BlobReferenceRepository(AlchemySessionRepository):
+    model = BlobOrm
+
+    @staticmethod
+    def __get_lock_key(sha256: str) -> int:
+        # 60 bits of the digest fit the signed bigint key of advisory locks
+        return int(sha256[:15], 16)
+
+    async def lock(self, sha256: str) -> None:
+        """Locks the blob until the end of the transaction, so that it is not
+        removed from the storage while a new reference to it is written."""
+        self._validate_session_is_set()
+
+        query = select(func.pg_advisory_xact_lock(self.__get_lock_key(sha256)))
+        try:
+            await self._session.execute(query)
+        except Exception as e:
+            error_message = (
+                f"An error occurred while locking blob '{sha256}' "
+                f"and executing query: {str(e)}"
+            )
+            logger.error(error_message)
+            raise DatabaseError(error_message)
+
+    async def select_ref_count(self, sha256: str) -> int:
+        self._validate_session_is_set()
+
+        query = select(self.model.ref_count).filter_by(sha256=sha256)
+        try:
+            result = await self._session.execute(query)
+            ref_count = result.scalars().one_or_none()
+        except Exception as e:
+            error_message = (
+                f"An error occurred while selecting the reference count "
+                f"of blob '{sha256}' and executing query: {str(e)}"
+            )
+            logger.error(error_message)
+            raise DatabaseError(error_message)
+
+        return ref_count or 0
+
+    async def increment(self, sha256: str, size: int, count: int = 1) -> int:
+        self._validate_session_is_set()
+
+        stmt = (
+            pg_insert(self.model)
+            .values(sha256=sha256, size=size, ref_count=count)
+            .on_conflict_do_update(
+                index_elements=[self.model.sha256],
+                set_={"ref_count": self.model.ref_count + count},
+            )
+            .returning(self.model.ref_count)
+        )
+        try:
+            result = await self._session.execute(stmt)
+            return result.scalars().one()
+        except Exception as e:
+            error_message = (
+                f"An error occurred while incrementing the reference count "
+                f"of blob '{sha256}' and executing statement: {str(e)}"
+            )
+            logger.error(error_message)
+            raise DatabaseError(error_message)
+
+    async def decrement(self, sha256: str, count: int = 1) -> int:
+        self._validate_session_is_set()
+
+        stmt = (
+            update(self.model)
+            .values(ref_count=self.model.ref_count - count)
+            .filter_by(sha256=sha256)
+            .returning(self.model.ref_count)
+        )
+        try:
+            result = await self._session.execute(stmt)
+            ref_count = result.scalars().one_or_none()
+            if ref_count is not None and ref_count <= 0:
+                await self._session.execute(delete(self.model).filter_by(sha256=sha256))
+        except Exception as e:
+            error_message = (
+                f"An error occurred while decrementing the reference count "
+                f"of blob '{sha256}' and executing statement: {str(e)}"
+            )
+            logger.error(error_message)
+            raise DatabaseError(error_message)
+
+        return max(ref_count or 0, 0)
@@ -1,7 +1,8 @@
 import logging
-from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from fastapi_app.src.db_service.exceptions import (
     DatabaseError,
@@ -11,7 +12,10 @@ from fastapi_app.src.db_service.exceptions import (
     NoConditionsError,
     SessionNotSetError,
 )
-from fastapi_app.src.db_service.repositories import OrmAlchemyRepository
+from fastapi_app.src.db_service.repositories import (
+    BlobReferenceRepository,
+    OrmAlchemyRepository,
+)
 from fastapi_app.src.schemas import FileMetadata
 
 logger = logging.getLogger("app.db_service.services")
@@ -22,15 +26,73 @@ class DatabaseService:
         self,
         repository: OrmAlchemyRepository,
         async_session_factory: async_sessionmaker,
+        blob_repository: Optional[BlobReferenceRepository] = None,
     ):
+        """With a blob repository the references of the metadata rows to the
+        content-addressed blobs are counted in the transaction writing them."""
         self._repository = repository
         self._async_session_factory = async_session_factory
+        self._blob_repository = blob_repository
+
+    async def __select_previous(
+        self, session: AsyncSession, file_ids: List[int]
+    ) -> List[FileMetadata]:
+        """Locks and returns the rows about to be overwritten, whose blob
+        references are released. Without a blob repository nothing is read."""
+        if self._blob_repository is None:
+            return []
+
+        return await self._repository.select_by_ids(ids=file_ids, for_update=True)
+
+    async def __count_blob_references(
+        self,
+        session: AsyncSession,
+        added: List[FileMetadata],
+        removed: List[FileMetadata],
+    ) -> None:
+        """Applies the reference changes of the written and the removed rows.
+
+        The blobs of the written rows are locked until commit, so a blob
+        whose last reference was just released is not removed from the
+        storage while the file referencing it again is being published.
+        The blobs are handled in hash order, so that concurrent transactions
+        do not deadlock.
+        """
+        if self._blob_repository is None:
+            return
+
+        deltas: Dict[str, int] = {}
+        sizes: Dict[str, int] = {}
+        for metadata in added:
+            if metadata.sha256:
+                deltas[metadata.sha256] = deltas.get(metadata.sha256, 0) + 1
+                sizes[metadata.sha256] = metadata.size
+        for metadata in removed:
+            if metadata.sha256:
+                deltas[metadata.sha256] = deltas.get(metadata.sha256, 0) - 1
+
+        self._blob_repository.set_session(session)
+        try:
+            for sha256, delta in sorted(deltas.items()):
+                if sha256 in sizes:
+                    await self._blob_repository.lock(sha256=sha256)
+                if delta > 0:
+                    await self._blob_repository.increment(
+                        sha256=sha256, size=sizes[sha256], count=delta
+                    )
+                elif delta < 0:
+                    await self._blob_repository.decrement(sha256=sha256, count=-delta)
+        finally:
+            self._blob_repository.clear_session()
 
     async def add_file_metadata(self, metadata: FileMetadata) -> FileMetadata:
         try:
             async with self._async_session_factory() as session:
                 self._repository.set_session(session)
                 file_metadata_output = await self._repository.insert_one(data=metadata)
+                await self.__count_blob_references(
+                    session, added=[file_metadata_output], removed=[]
+                )
                 await session.commit()
 
             return file_metadata_output
@@ -48,15 +110,80 @@ class DatabaseService:
         finally:
             self._repository.clear_session()
 
+    async def add_files_metadata(
+        self, metadata_lst: List[FileMetadata]
+    ) -> List[FileMetadata]:
+        try:
+            async with self._async_session_factory() as session:
+                self._repository.set_session(session)
+                file_metadata_output_lst = await self._repository.insert_many(
+                    data=metadata_lst
+                )
+                await self.__count_blob_references(
+                    session, added=file_metadata_output_lst, removed=[]
+                )
+                await session.commit()
+
+            return file_metadata_output_lst
+
+        except (SessionNotSetError, MappingError, DatabaseError, AttributeError) as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"adding many metadata to database "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise DatabaseServiceError(error_message)
+        finally:
+            self._repository.clear_session()
+
+    async def upsert_files_metadata(
+        self, metadata_lst: List[FileMetadata]
+    ) -> List[FileMetadata]:
+        try:
+            async with self._async_session_factory() as session:
+                self._repository.set_session(session)
+                previous_lst = await self.__select_previous(
+                    session, file_ids=[metadata.id for metadata in metadata_lst]
+                )
+                file_metadata_output_lst = await self._repository.upsert_many(
+                    data=metadata_lst
+                )
+                await self.__count_blob_references(
+                    session, added=file_metadata_output_lst, removed=previous_lst
+                )
+                await session.commit()
+
+            return file_metadata_output_lst
+
+        except (SessionNotSetError, MappingError, DatabaseError, AttributeError) as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"upserting many metadata in database "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise DatabaseServiceError(error_message)
+        finally:
+            self._repository.clear_session()
+
     async def update_file_metadata(self, new_metadata: FileMetadata) -> FileMetadata:
         file_id = new_metadata.id
 
         try:
             async with self._async_session_factory() as session:
                 self._repository.set_session(session)
+                previous_lst = await self.__select_previous(session, file_ids=[file_id])
                 file_metadata_output = await self._repository.update_one(
                     id=file_id, new_data=new_metadata
                 )
+                await self.__count_blob_references(
+                    session, added=[file_metadata_output], removed=previous_lst
+                )
                 await session.commit()
 
             return file_metadata_output
@@ -74,6 +201,66 @@ class DatabaseService:
         finally:
             self._repository.clear_session()
 
+    async def _upsert_file_metadata(
+        self, session: AsyncSession, metadata: FileMetadata
+    ) -> Tuple[FileMetadata, Optional[FileMetadata]]:
+        try:
+            self._repository.set_session(session)
+            result, previous = await self._repository.upsert_one(data=metadata)
+            await self.__count_blob_references(
+                session, added=[result], removed=[previous] if previous else []
+            )
+
+            return result, previous
+
+        except (
+            SessionNotSetError,
+            MappingError,
+            DatabaseError,
+            AttributeError,
+        ) as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"upserting the metadata with id={metadata.id} in database "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise DatabaseServiceError(error_message)
+        finally:
+            self._repository.clear_session()
+
+    @asynccontextmanager
+    async def upsert_file_metadata(
+        self, metadata: FileMetadata
+    ) -> AsyncIterator[Tuple[FileMetadata, Optional[FileMetadata]]]:
+        """Upserts the metadata and yields the new and the replaced rows.
+
+        The transaction is committed when the block exits, so that work done
+        inside it, such as publishing the file, is rolled back on failure.
+        """
+        async with self.begin_metadata_transaction() as transaction:
+            yield await self._upsert_file_metadata(
+                session=transaction.session, metadata=metadata
+            )
+
+    @asynccontextmanager
+    async def begin_metadata_transaction(self) -> AsyncIterator["MetadataTransaction"]:
+        """Opens a transaction for many upserts, committed when the block exits."""
+        async with self._async_session_factory() as session:
+            yield MetadataTransaction(database_service=self, session=session)
+
+            try:
+                await session.commit()
+            except Exception as e:
+                error_message = (
+                    f"An error occurred while "
+                    f"committing the metadata to database: {e}"
+                )
+                logger.error(error_message)
+                raise DatabaseServiceError(error_message)
+
     async def get_file_metadata_by_id(self, file_id: int) -> Optional[FileMetadata]:
         try:
             async with self._async_session_factory() as session:
@@ -97,17 +284,43 @@ class DatabaseService:
         finally:
             self._repository.clear_session()
 
+    async def get_files_metadata_by_ids(
+        self, file_ids: List[int]
+    ) -> List[FileMetadata]:
+        try:
+            async with self._async_session_factory() as session:
+                self._repository.set_session(session)
+                file_metadata_output_lst = await self._repository.select_by_ids(
+                    ids=file_ids
+                )
+
+            return file_metadata_output_lst
+
+        except (SessionNotSetError, MappingError, DatabaseError, AttributeError) as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"getting the metadata with ids={file_ids} from database "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise DatabaseServiceError(error_message)
+        finally:
+            self._repository.clear_session()
+
     async def get_file_metadata_by_params(
         self,
         params: Dict[str, List],
         limit: Optional[int] = None,
         offset: Optional[int] = None,
+        after_id: Optional[int] = None,
     ) -> List[FileMetadata]:
         try:
             async with self._async_session_factory() as session:
                 self._repository.set_session(session)
                 file_metadata_output_lst = await self._repository.select_some_by_params(
-                    params=params, limit=limit, offset=offset
+                    params=params, limit=limit, offset=offset, after_id=after_id
                 )
 
             return file_metadata_output_lst
@@ -125,17 +338,22 @@ class DatabaseService:
         finally:
             self._repository.clear_session()
 
-    async def remove_file_metadata(self, params: Dict[str, List]) -> int:
+    async def remove_file_metadata(self, params: Dict[str, List]) -> List[FileMetadata]:
         if not any(params.values()):
             raise DataLossError("Removing all file metadata would result in data loss")
 
         try:
             async with self._async_session_factory() as session:
                 self._repository.set_session(session)
-                ids_list = await self._repository.delete_some_by_params(params=params)
+                file_metadata_output_lst = await self._repository.delete_some_by_params(
+                    params=params
+                )
+                await self.__count_blob_references(
+                    session, added=[], removed=file_metadata_output_lst
+                )
                 await session.commit()
 
-            return len(ids_list)
+            return file_metadata_output_lst
 
         except (
             SessionNotSetError,
@@ -155,3 +373,62 @@ class DatabaseService:
             raise DatabaseServiceError(error_message)
         finally:
             self._repository.clear_session()
+
+
+class MetadataTransaction:
+    """Upserts committed together when the transaction block exits. Each of
+    them runs in a savepoint, so an upsert which fails is rolled back alone
+    and the others are still committed."""
+
+    def __init__(self, database_service: DatabaseService, session: AsyncSession):
+        self._database_service = database_service
+        self.session = session
+
+    @asynccontextmanager
+    async def upsert_file_metadata(
+        self, metadata: FileMetadata
+    ) -> AsyncIterator[Tuple[FileMetadata, Optional[FileMetadata]]]:
+        """Like DatabaseService.upsert_file_metadata, work done inside the
+        block is rolled back with the savepoint when it fails."""
+        async with self.session.begin_nested():
+            yield await self._database_service._upsert_file_metadata(
+                session=self.session, metadata=metadata
+            )
+
+
+class BlobReferenceService:
+    def __init__(
+        self,
+        repository: BlobReferenceRepository,
+        async_session_factory: async_sessionmaker,
+    ):
+        self._repository = repository
+        self._async_session_factory = async_session_factory
+
+    @asynccontextmanager
+    async def lock_blob(self, sha256: str) -> AsyncIterator[int]:
+        """Locks the blob and yields its reference count, so that it can be
+        removed from the storage once unreferenced without a new reference
+        being written in the meantime. The lock is held until the block exits.
+        """
+        async with self._async_session_factory() as session:
+            try:
+                self._repository.set_session(session)
+                await self._repository.lock(sha256=sha256)
+                ref_count = await self._repository.select_ref_count(sha256=sha256)
+            except (SessionNotSetError, DatabaseError) as e:
+                raise e
+            except Exception as e:
+                error_message = (
+                    f"An error occurred while "
+                    f"locking blob '{sha256}' "
+                    f"on service or repository layer: {e}"
+                )
+                logger.error(error_message)
+                raise DatabaseServiceError(error_message)
+            finally:
+                self._repository.clear_session()
+
+            yield ref_count
+
+            await session.commit()
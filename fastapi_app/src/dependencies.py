@@ -1,11 +1,23 @@
 import os
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
-from fastapi import File, Query, UploadFile
+from fastapi import File, Form, Header, HTTPException, Query, UploadFile, status
+from pydantic import ValidationError
 
+from fastapi_app.src.file_storage.repositories import is_valid_file_name
+from fastapi_app.src.pagination import InvalidCursorError, decode_cursor
 from fastapi_app.src.schemas import FileMetadata
 
 
+def valid_file_name(name: str) -> str:
+    if not is_valid_file_name(name):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Invalid file name '{name}'",
+        )
+    return name
+
+
 def valid_file_metadata(
     file_id: int,
     name: Optional[str] = None,
@@ -15,7 +27,7 @@ def valid_file_metadata(
     _, ext = os.path.splitext(file.filename)
     payload = {
         "id": file_id,
-        "name": (name if name else str(file_id)) + ext,
+        "name": valid_file_name((name if name else str(file_id)) + ext),
         "tag": tag,
         "size": file.size,
         "mimeType": file.content_type,
@@ -23,6 +35,56 @@ def valid_file_metadata(
     return FileMetadata(**payload)
 
 
+def valid_stream_metadata(
+    file_id: int,
+    name: Optional[str] = None,
+    tag: Optional[str] = None,
+    filename: Optional[str] = Header(None, alias="X-File-Name"),
+    content_type: str = Header("application/octet-stream"),
+) -> FileMetadata:
+    # The size is taken from the bytes written, a chunked body has no
+    # Content-Length and a declared one may not match the body
+    _, ext = os.path.splitext(filename) if filename else ("", "")
+    payload = {
+        "id": file_id,
+        "name": valid_file_name((name if name else str(file_id)) + ext),
+        "tag": tag,
+        "mimeType": content_type,
+    }
+    return FileMetadata(**payload)
+
+
+def valid_bulk_metadata(
+    file_id: List[int] = Form(...),
+    tag: Optional[str] = None,
+    files: List[UploadFile] = File(...),
+) -> List[Tuple[FileMetadata, UploadFile]]:
+    if len(file_id) != len(files):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Each of the files needs exactly one file_id",
+        )
+
+    try:
+        return [
+            (
+                FileMetadata(
+                    id=id_,
+                    name=str(id_) + os.path.splitext(file.filename or "")[1],
+                    tag=tag,
+                    size=file.size,
+                    mimeType=file.content_type,
+                ),
+                file,
+            )
+            for id_, file in zip(file_id, files)
+        ]
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
+
+
 def get_query_params(
     file_id: List[int] = Query(None),
     name: List[str] = Query(None),
@@ -31,6 +93,18 @@ def get_query_params(
     return {"id": file_id, "name": name, "tag": tag}
 
 
+def get_cursor(cursor: Optional[str] = None) -> Optional[int]:
+    if cursor is None:
+        return None
+
+    try:
+        return decode_cursor(cursor)
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
 if __name__ == "__main__":
     d = get_query_params()
     print(d)
@@ -1,15 +1,27 @@
 import logging.config
-import os
 
 from dependency_injector import containers, providers
 
 from fastapi_app.logging_config import LOGGING_CONFIG
-from fastapi_app.src.config import DatabaseSettings, merge_dicts
+from fastapi_app.src.cache import FileMetadataCache, files_cache
+from fastapi_app.src.config import (
+    DatabaseSettings,
+    RedisSettings,
+    StorageSettings,
+    merge_dicts,
+)
 from fastapi_app.src.database import Database
 from fastapi_app.src.db_service.mappers import FileMetadataMapper
-from fastapi_app.src.db_service.repositories import FileMetadataRepository
-from fastapi_app.src.db_service.services import DatabaseService
-from fastapi_app.src.file_storage.repositories import DiskRepository
+from fastapi_app.src.db_service.repositories import (
+    BlobReferenceRepository,
+    FileMetadataRepository,
+)
+from fastapi_app.src.db_service.services import BlobReferenceService, DatabaseService
+from fastapi_app.src.file_storage.executor import FilesystemExecutor
+from fastapi_app.src.file_storage.repositories import (
+    ContentAddressedRepository,
+    DiskRepository,
+)
 from fastapi_app.src.file_storage.services import FileStorageService
 from fastapi_app.src.manager import ServiceManager
 
@@ -26,45 +38,114 @@ class CoreContainer(containers.DeclarativeContainer):
 class DatabaseContainer(containers.DeclarativeContainer):
     config = providers.Configuration()
 
-    database_provider = providers.Singleton(Database, db_url=config.dsn)
+    database_provider = providers.Singleton(
+        Database,
+        db_url=config.dsn,
+        pool_size=config.db_pool_size,
+        max_overflow=config.db_max_overflow,
+        pool_timeout=config.db_pool_timeout,
+        pool_recycle=config.db_pool_recycle,
+        pool_pre_ping=config.db_pool_pre_ping,
+    )
 
 
 class MapperContainer(containers.DeclarativeContainer):
     file_metadata_mapper_provider = providers.Factory(FileMetadataMapper)
 
 
+class CacheContainer(containers.DeclarativeContainer):
+    config = providers.Configuration()
+
+    files_cache_provider = providers.Object(files_cache)
+
+    metadata_cache_provider = providers.Singleton(
+        FileMetadataCache,
+        expire=config.redis_metadata_cache_expire,
+        negative_expire=config.redis_metadata_cache_negative_expire,
+    )
+
+
 class RepositoryContainer(containers.DeclarativeContainer):
+    config = providers.Configuration()
+
     mappers = providers.DependenciesContainer()
 
     file_metadata_repository_provider = providers.Factory(
         FileMetadataRepository, mapper=mappers.file_metadata_mapper_provider
     )
 
+    blob_reference_repository_provider = providers.Factory(BlobReferenceRepository)
+
+    filesystem_executor_provider = providers.Singleton(
+        FilesystemExecutor,
+        max_workers=config.storage_fs_workers,
+        max_queue=config.storage_fs_max_queue,
+    )
+
     disk_repository_provider = providers.Factory(
         DiskRepository,
-        storage_dir=os.path.join(os.path.dirname(__file__), os.path.pardir, "storage"),
+        storage_dir=config.storage_dir,
+        layout=config.storage_layout,
+        chunk_size=config.storage_chunk_size,
+        fsync_policy=config.storage_fsync_policy,
+        upload_session_ttl=config.storage_upload_session_ttl,
+        executor=filesystem_executor_provider,
     )
 
 
 class ServicesContainer(containers.DeclarativeContainer):
+    config = providers.Configuration()
+
     repositories = providers.DependenciesContainer()
 
     database = providers.DependenciesContainer()
 
+    caches = providers.DependenciesContainer()
+
     database_service_provider = providers.Factory(
         DatabaseService,
         repository=repositories.file_metadata_repository_provider,
         async_session_factory=database.database_provider.provided.get_session_factory,
+        blob_repository=providers.Selector(
+            config.storage_backend,
+            disk=providers.Object(None),
+            content_addressed=repositories.blob_reference_repository_provider,
+        ),
+    )
+
+    blob_reference_service_provider = providers.Factory(
+        BlobReferenceService,
+        repository=repositories.blob_reference_repository_provider,
+        async_session_factory=database.database_provider.provided.get_session_factory,
+    )
+
+    content_addressed_repository_provider = providers.Factory(
+        ContentAddressedRepository,
+        storage_dir=config.storage_dir,
+        blob_reference_service=blob_reference_service_provider,
+        chunk_size=config.storage_chunk_size,
+        fsync_policy=config.storage_fsync_policy,
+        upload_session_ttl=config.storage_upload_session_ttl,
+        executor=repositories.filesystem_executor_provider,
+    )
+
+    file_repository_provider = providers.Selector(
+        config.storage_backend,
+        disk=repositories.disk_repository_provider,
+        content_addressed=content_addressed_repository_provider,
     )
 
     file_storage_service_provider = providers.Factory(
-        FileStorageService, file_repository=repositories.disk_repository_provider
+        FileStorageService, file_repository=file_repository_provider
     )
 
     service_manager_provider = providers.Factory(
         ServiceManager,
         file_storage_service=file_storage_service_provider,
         database_service=database_service_provider,
+        bulk_concurrency=config.storage_bulk_concurrency,
+        files_cache=caches.files_cache_provider,
+        metadata_cache=caches.metadata_cache_provider,
     )
 
 
@@ -77,18 +158,31 @@ class AppContainer(containers.DeclarativeContainer):
 
     mappers = providers.Container(MapperContainer)
 
-    repositories = providers.Container(RepositoryContainer, mappers=mappers)
+    caches = providers.Container(CacheContainer, config=config.redis)
+
+    repositories = providers.Container(
+        RepositoryContainer, config=config.storage, mappers=mappers
+    )
 
     services = providers.Container(
-        ServicesContainer, repositories=repositories, database=database
+        ServicesContainer,
+        config=config.storage,
+        repositories=repositories,
+        database=database,
+        caches=caches,
     )
 
 
 if __name__ == "__main__":
     db_settings = DatabaseSettings()
+    storage_settings = StorageSettings()
+    redis_settings = RedisSettings()
     log_settings_dict = LOGGING_CONFIG
     settings_dict = merge_dicts(
-        {"database": db_settings.model_dump()}, {"logging": log_settings_dict}
+        {"database": db_settings.model_dump()},
+        {"storage": storage_settings.model_dump()},
+        {"redis": redis_settings.model_dump()},
+        {"logging": log_settings_dict},
     )
 
     container = AppContainer()
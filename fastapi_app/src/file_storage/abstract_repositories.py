@@ -1,20 +1,104 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Generic
+from typing import AsyncIterator, Dict, Generic, List, NamedTuple, Optional, Tuple
 
 from fastapi import UploadFile
 
 from fastapi_app.src.app_types import D
+from fastapi_app.src.schemas import UploadPart
+
+
+class TempFile(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+    crc32: int
+
+    def checksums(self) -> Dict:
+        return {"size": self.size, "sha256": self.sha256, "crc32": self.crc32}
 
 
 class AbstractFileRepository(ABC, Generic[D]):
     @abstractmethod
-    async def write_file(self, file: UploadFile, domain_obj: D) -> D:
+    async def write_file(
+        self, file: UploadFile, domain_obj: D, replaces: Optional[D] = None
+    ) -> D:
+        pass
+
+    @abstractmethod
+    async def write_stream(
+        self, stream: AsyncIterator[bytes], domain_obj: D, replaces: Optional[D] = None
+    ) -> D:
+        pass
+
+    @abstractmethod
+    async def stage_file(self, file: UploadFile, domain_obj: D) -> TempFile:
+        pass
+
+    @abstractmethod
+    async def stage_stream(
+        self, stream: AsyncIterator[bytes], domain_obj: D
+    ) -> TempFile:
+        pass
+
+    @abstractmethod
+    async def publish_file(
+        self, temp_file: TempFile, domain_obj: D, replaces: Optional[D] = None
+    ) -> D:
+        pass
+
+    @abstractmethod
+    async def delete_replaced_file(self, domain_obj: D, replaces: Optional[D]) -> None:
+        pass
+
+    @abstractmethod
+    async def unpublish_file(
+        self, temp_file: TempFile, domain_obj: D, replaces: Optional[D] = None
+    ) -> None:
+        pass
+
+    @abstractmethod
+    async def discard_file(self, temp_file: TempFile) -> None:
+        pass
+
+    @abstractmethod
+    async def delete_file(self, domain_obj: D) -> None:
+        pass
+
+    @abstractmethod
+    async def read_file(self, domain_obj: D) -> Dict:
+        pass
+
+    @abstractmethod
+    def read_chunks(self, domain_obj: D) -> AsyncIterator[bytes]:
+        pass
+
+    @abstractmethod
+    async def create_upload_session(self, domain_obj: D) -> str:
+        pass
+
+    @abstractmethod
+    async def get_upload_session(self, upload_id: str) -> D:
+        pass
+
+    @abstractmethod
+    async def write_upload_part(
+        self, upload_id: str, part_number: int, stream: AsyncIterator[bytes]
+    ) -> UploadPart:
+        pass
+
+    @abstractmethod
+    async def list_upload_parts(self, upload_id: str) -> List[UploadPart]:
         pass
 
     @abstractmethod
-    def delete_file(self, domain_obj: D) -> None:
+    async def assemble_upload(
+        self,
+        upload_id: str,
+        domain_obj: D,
+        parts: Optional[List[Tuple[int, str]]] = None,
+    ) -> TempFile:
         pass
 
     @abstractmethod
-    def read_file(self, domain_obj: D) -> Dict:
+    async def delete_upload_session(self, upload_id: str) -> None:
         pass
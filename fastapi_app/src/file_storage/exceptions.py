@@ -24,3 +24,11 @@ class FileReadError(FileStorageError):
 
 class FileAlreadyExistsError(FileStorageError):
     pass
+
+
+class UploadSessionNotFoundError(FileStorageError):
+    pass
+
+
+class InvalidUploadPartError(FileStorageError):
+    pass
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_QUEUE = 256
+
+
+class ExecutorMetrics:
+    """Counts the calls waiting for a worker and the time they waited."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.queued_max = 0
+        self.running = 0
+        self.completed = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_queued(self) -> None:
+        with self._lock:
+            self.queued += 1
+            self.queued_max = max(self.queued_max, self.queued)
+
+    def record_started(self, wait_time: float) -> None:
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def record_completed(self) -> None:
+        with self._lock:
+            self.running -= 1
+            self.completed += 1
+
+    def record_cancelled(self) -> None:
+        with self._lock:
+            self.queued -= 1
+
+
+class FilesystemExecutor:
+    """Bounded thread pool for the blocking filesystem calls of the storage.
+
+    At most max_workers calls run at once and max_queue more wait for a
+    worker, further callers are suspended until a place frees up, so a slow
+    volume delays storage requests without ever blocking the event loop.
+    """
+
+    def __init__(
+        self, max_workers: int = DEFAULT_MAX_WORKERS, max_queue: int = DEFAULT_MAX_QUEUE
+    ) -> None:
+        if max_workers <= 0:
+            raise ValueError("Number of workers must be greater than 0")
+        if max_queue < 0:
+            raise ValueError("Queue size cannot be negative")
+
+        self._max_workers = max_workers
+        self._max_queue = max_queue
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="filesystem"
+        )
+        self._slots = asyncio.Semaphore(max_workers + max_queue)
+        self.metrics = ExecutorMetrics()
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Runs func in the pool, waiting for a place in the queue if it is full."""
+        queued_at = time.perf_counter()
+        self.metrics.record_queued()
+
+        def call() -> T:
+            self.metrics.record_started(time.perf_counter() - queued_at)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.metrics.record_completed()
+
+        try:
+            await self._slots.acquire()
+        except asyncio.CancelledError:
+            self.metrics.record_cancelled()
+            raise
+
+        loop = asyncio.get_running_loop()
+
+        def release(future: Future) -> None:
+            # The slot is held until the call has finished in its thread, or
+            # was cancelled before a worker picked it up and never started
+            if future.cancelled():
+                self.metrics.record_cancelled()
+            try:
+                loop.call_soon_threadsafe(self._slots.release)
+            except RuntimeError:
+                # The event loop is closed along with its semaphore
+                pass
+
+        try:
+            future = self._pool.submit(call)
+        except BaseException:
+            self._slots.release()
+            self.metrics.record_cancelled()
+            raise
+
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def get_metrics(self) -> Dict:
+        metrics = self.metrics
+        return {
+            "max_workers": self._max_workers,
+            "max_queue": self._max_queue,
+            "queued": metrics.queued,
+            "queued_max": metrics.queued_max,
+            "running": metrics.running,
+            "completed": metrics.completed,
+            "wait_time_total": metrics.wait_time_total,
+            "wait_time_max": metrics.wait_time_max,
+        }
+
+
+_default_executor: Optional[FilesystemExecutor] = None
+
+
+def get_default_executor() -> FilesystemExecutor:
+    """Returns the executor shared by repositories created without one."""
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = FilesystemExecutor()
+    return _default_executor
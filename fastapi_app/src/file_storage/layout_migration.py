@@ -0,0 +1,83 @@
+"""Moves the files of a flat storage directory into the sharded layout.
+
+Switch the service to STORAGE_LAYOUT=sharded before running the migration:
+the sharded DiskRepository still finds files that have not been moved yet, so
+reads keep working while the migration is in progress. Every file is first
+hard-linked to its sharded path and only then unlinked from the flat one, so it
+is reachable at any moment. The migration can be interrupted and started again
+at any time; files that are already sharded are skipped.
+
+Usage:
+    python -m fastapi_app.src.file_storage.layout_migration [--storage-dir DIR]
+"""
+
+import argparse
+import logging
+import logging.config
+import os
+
+from fastapi_app.logging_config import LOGGING_CONFIG
+from fastapi_app.src.config import StorageSettings
+from fastapi_app.src.file_storage.exceptions import DirectoryError
+from fastapi_app.src.file_storage.repositories import (
+    BLOBS_DIR,
+    UPLOADS_DIR,
+    get_sharded_file_path,
+)
+
+logger = logging.getLogger("app.file_storage.layout_migration")
+
+
+def migrate_file_to_sharded_layout(storage_dir: str, filename: str) -> bool:
+    flat_file_path = os.path.join(storage_dir, filename)
+    sharded_file_path = get_sharded_file_path(storage_dir, filename)
+
+    os.makedirs(os.path.dirname(sharded_file_path), exist_ok=True)
+    try:
+        os.link(flat_file_path, sharded_file_path)
+    except FileExistsError:
+        if not os.path.samefile(flat_file_path, sharded_file_path):
+            logger.warning(
+                f"File '{filename}' exists in both layouts with different "
+                f"content, leaving '{flat_file_path}' in place"
+            )
+            return False
+
+    os.remove(flat_file_path)
+    return True
+
+
+def migrate_to_sharded_layout(storage_dir: str) -> int:
+    if not os.path.isdir(storage_dir):
+        raise DirectoryError(f"Storage directory '{storage_dir}' does not exist")
+
+    num_moved_files = 0
+    with os.scandir(storage_dir) as entries:
+        for entry in entries:
+            # Hidden files such as .gitkeep and the temporary files of
+            # uploads in progress stay where they are
+            if (
+                entry.name.startswith(".")
+                or entry.name in (UPLOADS_DIR, BLOBS_DIR)
+                or not entry.is_file(follow_symlinks=False)
+            ):
+                continue
+
+            if migrate_file_to_sharded_layout(storage_dir, entry.name):
+                num_moved_files += 1
+                if num_moved_files % 10000 == 0:
+                    logger.info(f"{num_moved_files} files moved so far")
+
+    logger.info(f"{num_moved_files} files moved to the sharded layout")
+    return num_moved_files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move a flat storage directory into the sharded layout."
+    )
+    parser.add_argument("--storage-dir", default=StorageSettings().storage_dir)
+    args = parser.parse_args()
+
+    logging.config.dictConfig(LOGGING_CONFIG)
+    migrate_to_sharded_layout(storage_dir=args.storage_dir)
@@ -1,26 +1,195 @@
+import errno
+import hashlib
 import logging
 import os
-from typing import Dict, Optional
+import re
+import shutil
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import (
+    AsyncIterator,
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 import aiofiles
 from fastapi import UploadFile
 
-from fastapi_app.src.file_storage.abstract_repositories import AbstractFileRepository
+from fastapi_app.src.db_service.services import BlobReferenceService
+from fastapi_app.src.file_storage.abstract_repositories import (
+    AbstractFileRepository,
+    TempFile,
+)
 from fastapi_app.src.file_storage.exceptions import (
     DirectoryError,
     FileAlreadyExistsError,
     FileDeletionError,
     FileReadError,
     FileWriteError,
+    InvalidUploadPartError,
+    UploadSessionNotFoundError,
 )
-from fastapi_app.src.schemas import FileMetadata
+from fastapi_app.src.file_storage.executor import (
+    FilesystemExecutor,
+    get_default_executor,
+)
+from fastapi_app.src.schemas import FileMetadata, UploadPart
 
 logger = logging.getLogger("app.file_storage.repositories")
 
+T = TypeVar("T")
+
+LAYOUT_FLAT = "flat"
+LAYOUT_SHARDED = "sharded"
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+FSYNC_NONE = "none"
+FSYNC_FILE = "file"
+FSYNC_FILE_AND_DIR = "file+dir"
+
+TEMP_FILE_PREFIX = ".upload-"
+
+BLOBS_DIR = "blobs"
+
+UPLOADS_DIR = ".uploads"
+UPLOAD_SESSION_FILE = "session.json"
+DEFAULT_UPLOAD_SESSION_TTL = 24 * 60 * 60
+MAX_UPLOAD_PARTS = 10000
+
+_UPLOAD_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+_UPLOAD_PART_PATTERN = re.compile(r"(\d{5})\.([0-9a-f]{64})")
+
+# Errors on which copy_file_range is not usable between the two files
+_COPY_FILE_RANGE_UNSUPPORTED = (
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+)
+
+
+def get_sharded_file_path(storage_dir: str, filename: str) -> str:
+    """Builds the path of a file in the sharded layout: two levels of hex
+    fan-out taken from the hash of the file name, e.g. storage/3f/a2/name."""
+    digest = hashlib.md5(filename.encode()).hexdigest()
+    return os.path.join(storage_dir, digest[:2], digest[2:4], filename)
+
+
+def is_valid_file_name(name: str) -> bool:
+    """Checks that the name is a plain file name which stays in the storage
+    directory and is not hidden, hidden names are reserved for the entries
+    of the repository itself, such as the staged files and upload sessions."""
+    return bool(name) and os.path.basename(name) == name and not name.startswith(".")
+
+
+def _remove_if_exists(file_path: str) -> None:
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+def _link_if_exists(file_path: str, link_path: str) -> None:
+    try:
+        os.link(file_path, link_path)
+    except FileNotFoundError:
+        pass
+
+
+def _restore_replaced_file(replaced_copy_path: str, file_path: str) -> None:
+    """Puts the copy of an overwritten file back in place, or removes the new
+    file if nothing was overwritten."""
+    try:
+        os.replace(replaced_copy_path, file_path)
+    except FileNotFoundError:
+        _remove_if_exists(file_path)
+
+
+def _copy_file(in_file: BinaryIO, out_file: BinaryIO) -> None:
+    """Appends the rest of in_file to out_file. copy_file_range keeps the
+    data in the kernel, or shares the extents on filesystems with reflinks."""
+    if hasattr(os, "copy_file_range"):
+        try:
+            while os.copy_file_range(in_file.fileno(), out_file.fileno(), 1 << 30):
+                pass
+            return
+        except OSError as e:
+            if e.errno not in _COPY_FILE_RANGE_UNSUPPORTED:
+                raise
+
+    # Both offsets were advanced by what copy_file_range did copy
+    shutil.copyfileobj(in_file, out_file)
+
+
+def _concatenate_files(
+    file_paths: List[str], out_file_path: str, chunk_size: int, fsync: bool
+) -> Tuple[int, str, int]:
+    """Concatenates the files into a new one and returns its size, SHA-256
+    and CRC32, which are computed from the page cache after each copy."""
+    sha256 = hashlib.sha256()
+    crc32 = 0
+    size = 0
+
+    with open(out_file_path, "xb", buffering=0) as out_file:
+        for file_path in file_paths:
+            with open(file_path, "rb", buffering=0) as in_file:
+                _copy_file(in_file, out_file)
+                in_file.seek(0)
+                while chunk := in_file.read(chunk_size):
+                    sha256.update(chunk)
+                    crc32 = zlib.crc32(chunk, crc32)
+                    size += len(chunk)
+        if fsync:
+            os.fsync(out_file.fileno())
+
+    return size, sha256.hexdigest(), crc32
+
+
+def _fsync_directory(directory: str) -> None:
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _read_text_file(file_path: str) -> str:
+    with open(file_path) as in_file:
+        return in_file.read()
+
 
 class DiskRepository(AbstractFileRepository[FileMetadata]):
-    def __init__(self, storage_dir: str):
+    def __init__(
+        self,
+        storage_dir: str,
+        layout: str = LAYOUT_FLAT,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        fsync_policy: str = FSYNC_NONE,
+        upload_session_ttl: int = DEFAULT_UPLOAD_SESSION_TTL,
+        executor: Optional[FilesystemExecutor] = None,
+    ):
+        if layout not in (LAYOUT_FLAT, LAYOUT_SHARDED):
+            raise ValueError(f"Unknown storage layout '{layout}'")
+        if chunk_size <= 0:
+            raise ValueError("Chunk size must be greater than 0")
+        if fsync_policy not in (FSYNC_NONE, FSYNC_FILE, FSYNC_FILE_AND_DIR):
+            raise ValueError(f"Unknown fsync policy '{fsync_policy}'")
+
         self._storage_dir = storage_dir
+        self._layout = layout
+        self._chunk_size = chunk_size
+        self._fsync_policy = fsync_policy
+        self._uploads_dir = os.path.join(storage_dir, UPLOADS_DIR)
+        self._upload_session_ttl = upload_session_ttl
+        self._executor = executor or get_default_executor()
         self.__check_storage_directory_exists()
 
     def __check_storage_directory_exists(self):
@@ -32,39 +201,285 @@ class DiskRepository(AbstractFileRepository[FileMetadata]):
                 f"Failed to check storage directory existence: {str(e)}"
             )
 
-    def __get_file_path(self, domain_obj: FileMetadata) -> Optional[str]:
+    async def _run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Runs a blocking filesystem call in the executor of the storage."""
+        return await self._executor.run(func, *args, **kwargs)
+
+    def __build_file_path(self, filename: str) -> str:
+        if self._layout == LAYOUT_SHARDED:
+            return get_sharded_file_path(self._storage_dir, filename)
+
+        return os.path.join(self._storage_dir, filename)
+
+    def __get_flat_copy_path(self, filename: str) -> Optional[str]:
+        """Returns the flat path a file not yet moved by the layout migration
+        is still at, in the sharded layout only."""
+        if self._layout != LAYOUT_SHARDED:
+            return None
+
+        return os.path.join(self._storage_dir, filename)
+
+    async def __get_file_path(self, domain_obj: FileMetadata) -> Optional[str]:
+        return await self._run(self.__find_file_path, domain_obj)
+
+    def __find_file_path(self, domain_obj: FileMetadata) -> Optional[str]:
         target_filename = domain_obj.name
-        for filename in os.listdir(self._storage_dir):
-            if filename == target_filename:
-                return os.path.join(self._storage_dir, filename)
+        if not is_valid_file_name(target_filename):
+            return None
+
+        file_path = self.__build_file_path(target_filename)
+        if os.path.isfile(file_path):
+            return file_path
+
+        if self._layout == LAYOUT_SHARDED:
+            # Files not yet moved by the layout migration are still flat.
+            # The migration links the sharded path before unlinking the flat
+            # one, so a file missed on both checks has just been moved.
+            flat_file_path = self.__get_flat_copy_path(target_filename)
+            if os.path.isfile(flat_file_path):
+                return flat_file_path
+            if os.path.isfile(file_path):
+                return file_path
 
         return None
 
-    def __validate_file_does_not_exist(self, domain_obj: FileMetadata):
-        file_path = self.__get_file_path(domain_obj=domain_obj)
+    async def __validate_file_does_not_exist(self, domain_obj: FileMetadata):
+        file_path = await self.__get_file_path(domain_obj=domain_obj)
 
         if file_path:
             raise FileAlreadyExistsError(f"File '{domain_obj.name}' already exists.")
 
-    async def write_file(self, file: UploadFile, domain_obj: FileMetadata) -> None:
-        self.__validate_file_does_not_exist(domain_obj=domain_obj)
+    async def __read_chunks(self, file: UploadFile) -> AsyncIterator[bytes]:
+        while chunk := await file.read(self._chunk_size):
+            yield chunk
+
+    async def write_file(
+        self,
+        file: UploadFile,
+        domain_obj: FileMetadata,
+        replaces: Optional[FileMetadata] = None,
+    ) -> FileMetadata:
+        return await self.write_stream(
+            stream=self.__read_chunks(file), domain_obj=domain_obj, replaces=replaces
+        )
 
-        file_path = os.path.join(self._storage_dir, domain_obj.name)
+    async def write_stream(
+        self,
+        stream: AsyncIterator[bytes],
+        domain_obj: FileMetadata,
+        replaces: Optional[FileMetadata] = None,
+    ) -> FileMetadata:
+        if replaces is None or replaces.name != domain_obj.name:
+            await self.__validate_file_does_not_exist(domain_obj=domain_obj)
 
+        return await self._stage_and_publish(
+            stream=stream, domain_obj=domain_obj, replaces=replaces
+        )
+
+    async def _stage_and_publish(
+        self,
+        stream: AsyncIterator[bytes],
+        domain_obj: FileMetadata,
+        replaces: Optional[FileMetadata],
+    ) -> FileMetadata:
+        temp_file = await self.stage_stream(stream=stream, domain_obj=domain_obj)
         try:
-            async with aiofiles.open(file_path, "wb") as out_file:
-                content = await file.read()
-                await out_file.write(content)
+            result = await self.publish_file(
+                temp_file=temp_file, domain_obj=domain_obj, replaces=replaces
+            )
+        finally:
+            await self.discard_file(temp_file=temp_file)
+
+        await self.delete_replaced_file(domain_obj=result, replaces=replaces)
+
+        return result
+
+    async def stage_file(self, file: UploadFile, domain_obj: FileMetadata) -> TempFile:
+        return await self.stage_stream(
+            stream=self.__read_chunks(file), domain_obj=domain_obj
+        )
+
+    async def stage_stream(
+        self, stream: AsyncIterator[bytes], domain_obj: FileMetadata
+    ) -> TempFile:
+        self.__validate_file_name(domain_obj=domain_obj)
+
+        try:
+            return await self._write_temp_file(
+                stream=stream, directory=self._get_staging_directory(domain_obj)
+            )
+        except Exception as e:
+            error_message = f"Failed to write file '{domain_obj.name}'"
+            logger.error(f"{error_message}: {e}")
+            raise FileWriteError(f"{error_message}: {e}")
+
+    @staticmethod
+    def __validate_file_name(domain_obj: FileMetadata) -> None:
+        if not is_valid_file_name(domain_obj.name):
+            raise FileWriteError(f"Invalid file name '{domain_obj.name}'")
+
+    def _get_staging_directory(self, domain_obj: FileMetadata) -> str:
+        return os.path.dirname(self.__build_file_path(domain_obj.name))
+
+    @staticmethod
+    def __get_replaced_copy_path(temp_file: TempFile) -> str:
+        return f"{temp_file.path}.replaced"
+
+    async def publish_file(
+        self,
+        temp_file: TempFile,
+        domain_obj: FileMetadata,
+        replaces: Optional[FileMetadata] = None,
+    ) -> FileMetadata:
+        """Moves the staged file into place. An overwritten file is kept as a
+        hidden link next to it until the staged file is discarded, so that
+        unpublish_file can put it back."""
+        self.__validate_file_name(domain_obj=domain_obj)
+        overwrite = replaces is not None and replaces.name == domain_obj.name
+        file_path = self.__build_file_path(domain_obj.name)
+        flat_copy_path = self.__get_flat_copy_path(domain_obj.name)
+
+        try:
+            # A new file must not shadow a flat one of the same name, which
+            # would come back once the new file is deleted
+            if (
+                not overwrite
+                and flat_copy_path
+                and await self._run(os.path.isfile, flat_copy_path)
+            ):
+                raise FileExistsError(flat_copy_path)
+            if overwrite:
+                await self._run(
+                    _link_if_exists,
+                    file_path,
+                    self.__get_replaced_copy_path(temp_file),
+                )
+            await self._publish_temp_file(
+                temp_file_path=temp_file.path, file_path=file_path, overwrite=overwrite
+            )
             logger.info(
                 f"File '{domain_obj.name}' successfully written to '{file_path}'"
             )
+        except FileExistsError:
+            raise FileAlreadyExistsError(f"File '{domain_obj.name}' already exists.")
         except Exception as e:
             error_message = f"Failed to write file '{domain_obj.name}'"
             logger.error(f"{error_message}: {e}")
             raise FileWriteError(f"{error_message}: {e}")
 
-    def read_file(self, domain_obj: FileMetadata) -> Dict:
-        file_path = self.__get_file_path(domain_obj)
+        return domain_obj.model_copy(update=temp_file.checksums())
+
+    async def delete_replaced_file(
+        self, domain_obj: FileMetadata, replaces: Optional[FileMetadata]
+    ) -> None:
+        if replaces is None:
+            return
+
+        if replaces.name != domain_obj.name:
+            await self.delete_file(domain_obj=replaces)
+        else:
+            # The overwritten file may still be at its flat path, shadowed by
+            # the new sharded one until now
+            await self.__delete_flat_copy(domain_obj=domain_obj)
+
+    async def __delete_flat_copy(self, domain_obj: FileMetadata) -> None:
+        flat_copy_path = self.__get_flat_copy_path(domain_obj.name)
+        if flat_copy_path is None:
+            return
+
+        try:
+            await self._run(_remove_if_exists, flat_copy_path)
+        except Exception as e:
+            error_message = (
+                f"Failed to delete the flat copy of file '{domain_obj.name}': {e}"
+            )
+            logger.error(error_message)
+            raise FileDeletionError(error_message)
+
+    async def unpublish_file(
+        self,
+        temp_file: TempFile,
+        domain_obj: FileMetadata,
+        replaces: Optional[FileMetadata] = None,
+    ) -> None:
+        """Undoes publish_file when the metadata of the file was not committed.
+        The overwritten file, which the surviving row still refers to, is put
+        back in place, a new file is removed."""
+        overwrite = replaces is not None and replaces.name == domain_obj.name
+        file_path = self.__build_file_path(domain_obj.name)
+
+        try:
+            if overwrite:
+                await self._run(
+                    _restore_replaced_file,
+                    self.__get_replaced_copy_path(temp_file),
+                    file_path,
+                )
+            else:
+                await self._run(_remove_if_exists, file_path)
+            logger.info(f"File '{domain_obj.name}' successfully unpublished")
+        except Exception as e:
+            error_message = f"Failed to unpublish file '{domain_obj.name}': {e}"
+            logger.error(error_message)
+            raise FileDeletionError(error_message)
+
+    async def discard_file(self, temp_file: TempFile) -> None:
+        await self._run(_remove_if_exists, temp_file.path)
+        await self._run(_remove_if_exists, self.__get_replaced_copy_path(temp_file))
+
+    async def _write_temp_file(
+        self, stream: AsyncIterator[bytes], directory: str
+    ) -> TempFile:
+        """Writes the stream to a hidden temporary file in the given directory,
+        so that it can be renamed into place on the same filesystem.
+
+        The size, SHA-256 and CRC32 of the content are computed on the fly,
+        so the data is never read a second time.
+        """
+        await self._run(os.makedirs, directory, exist_ok=True)
+        temp_file_path = os.path.join(
+            directory, f"{TEMP_FILE_PREFIX}{uuid.uuid4().hex}.part"
+        )
+        sha256 = hashlib.sha256()
+        crc32 = 0
+        size = 0
+
+        try:
+            async with aiofiles.open(temp_file_path, "xb") as out_file:
+                async for chunk in stream:
+                    sha256.update(chunk)
+                    crc32 = zlib.crc32(chunk, crc32)
+                    size += len(chunk)
+                    await out_file.write(chunk)
+                if self._fsync_policy != FSYNC_NONE:
+                    await out_file.flush()
+                    await self._run(os.fsync, out_file.fileno())
+        except BaseException:
+            await self._run(_remove_if_exists, temp_file_path)
+            raise
+
+        return TempFile(
+            path=temp_file_path, size=size, sha256=sha256.hexdigest(), crc32=crc32
+        )
+
+    async def _publish_temp_file(
+        self, temp_file_path: str, file_path: str, overwrite: bool
+    ) -> None:
+        """Atomically moves a temporary file to its final path. Without
+        overwrite the file is hard-linked, which fails if the path is taken."""
+        try:
+            if overwrite:
+                await self._run(os.replace, temp_file_path, file_path)
+            else:
+                await self._run(os.link, temp_file_path, file_path)
+        finally:
+            await self._run(_remove_if_exists, temp_file_path)
+
+        if self._fsync_policy == FSYNC_FILE_AND_DIR:
+            await self._run(_fsync_directory, os.path.dirname(file_path))
+
+    async def read_file(self, domain_obj: FileMetadata) -> Dict:
+        file_path = await self.__get_file_path(domain_obj)
 
         if not file_path:
             error_message = (
@@ -90,11 +505,27 @@ class DiskRepository(AbstractFileRepository[FileMetadata]):
             logger.error(f"{error_message}: {e}")
             raise FileReadError(f"{error_message}: {e}")
 
-    def delete_file(self, domain_obj: FileMetadata) -> None:
-        file_path = self.__get_file_path(domain_obj=domain_obj)
+    async def read_chunks(self, domain_obj: FileMetadata) -> AsyncIterator[bytes]:
+        file_path = (await self.read_file(domain_obj=domain_obj))["path"]
+
+        try:
+            async with aiofiles.open(file_path, "rb") as in_file:
+                while chunk := await in_file.read(self._chunk_size):
+                    yield chunk
+        except Exception as e:
+            error_message = f"Failed to read file '{domain_obj.name}'"
+            logger.error(f"{error_message}: {e}")
+            raise FileReadError(f"{error_message}: {e}")
+
+    async def delete_file(self, domain_obj: FileMetadata) -> None:
+        file_path = await self.__get_file_path(domain_obj=domain_obj)
+        flat_copy_path = self.__get_flat_copy_path(domain_obj.name)
         try:
             if file_path:
-                os.remove(file_path)
+                await self._run(os.remove, file_path)
+                # A stale flat copy would otherwise reappear under the name
+                if flat_copy_path and flat_copy_path != file_path:
+                    await self._run(_remove_if_exists, flat_copy_path)
                 logger.info(f"File '{domain_obj.name}' successfully deleted")
             else:
                 logger.warning(
@@ -106,3 +537,380 @@ class DiskRepository(AbstractFileRepository[FileMetadata]):
             error_message = f"Failed to delete file '{domain_obj.name}': {e}"
             logger.error(error_message)
             raise FileDeletionError(error_message)
+
+    async def create_upload_session(self, domain_obj: FileMetadata) -> str:
+        await self.expire_upload_sessions()
+
+        upload_id = uuid.uuid4().hex
+        session_dir = os.path.join(self._uploads_dir, upload_id)
+        try:
+            await self._run(os.makedirs, session_dir)
+            async with aiofiles.open(
+                os.path.join(session_dir, UPLOAD_SESSION_FILE), "x"
+            ) as session_file:
+                await session_file.write(domain_obj.model_dump_json(exclude_none=True))
+        except Exception as e:
+            await self._run(shutil.rmtree, session_dir, ignore_errors=True)
+            error_message = f"Failed to create upload session of '{domain_obj.name}'"
+            logger.error(f"{error_message}: {e}")
+            raise FileWriteError(f"{error_message}: {e}")
+
+        logger.info(f"Upload session '{upload_id}' of '{domain_obj.name}' created")
+        return upload_id
+
+    async def get_upload_session(self, upload_id: str) -> FileMetadata:
+        session_dir = await self.__get_upload_session_dir(upload_id)
+
+        try:
+            return FileMetadata.model_validate_json(
+                await self._run(
+                    _read_text_file, os.path.join(session_dir, UPLOAD_SESSION_FILE)
+                )
+            )
+        except FileNotFoundError:
+            raise UploadSessionNotFoundError(f"Upload '{upload_id}' does not exist")
+        except Exception as e:
+            error_message = f"Failed to read upload session '{upload_id}'"
+            logger.error(f"{error_message}: {e}")
+            raise FileReadError(f"{error_message}: {e}")
+
+    async def write_upload_part(
+        self, upload_id: str, part_number: int, stream: AsyncIterator[bytes]
+    ) -> UploadPart:
+        """Writes a part of an upload. A part uploaded again replaces the
+        earlier one, so a failed part can simply be retried."""
+        if not 1 <= part_number <= MAX_UPLOAD_PARTS:
+            raise InvalidUploadPartError(
+                f"Part number must be between 1 and {MAX_UPLOAD_PARTS}"
+            )
+        session_dir = await self.__get_upload_session_dir(upload_id)
+
+        try:
+            temp_file = await self._write_temp_file(
+                stream=stream, directory=session_dir
+            )
+            part_path = os.path.join(
+                session_dir, f"{part_number:05d}.{temp_file.sha256}"
+            )
+            await self._run(os.replace, temp_file.path, part_path)
+        except Exception as e:
+            error_message = (
+                f"Failed to write part {part_number} of upload '{upload_id}'"
+            )
+            logger.error(f"{error_message}: {e}")
+            raise FileWriteError(f"{error_message}: {e}")
+
+        return await self._run(
+            self.__remove_older_uploads_of_part, session_dir, part_number, part_path
+        )
+
+    def __remove_older_uploads_of_part(
+        self, session_dir: str, part_number: int, part_path: str
+    ) -> UploadPart:
+        part = self.__read_upload_part(part_path)
+        for other_part_path in self.__scan_upload_parts(session_dir).get(
+            part_number, []
+        ):
+            if other_part_path != part_path:
+                other_part = self.__read_upload_part(other_part_path)
+                if other_part and other_part.lastModified <= part.lastModified:
+                    _remove_if_exists(other_part_path)
+
+        return part
+
+    async def list_upload_parts(self, upload_id: str) -> List[UploadPart]:
+        return list((await self.__get_upload_parts(upload_id)).values())
+
+    async def assemble_upload(
+        self,
+        upload_id: str,
+        domain_obj: FileMetadata,
+        parts: Optional[List[Tuple[int, str]]] = None,
+    ) -> TempFile:
+        """Concatenates the parts of an upload into a temporary file ready to
+        be published. Without a list of (part number, SHA-256) pairs all the
+        uploaded parts are used, in ascending order."""
+        available_parts = await self.__get_upload_parts(upload_id)
+
+        if parts is None:
+            parts = [
+                (part.partNumber, part.sha256) for part in available_parts.values()
+            ]
+        if not parts:
+            raise InvalidUploadPartError(f"Upload '{upload_id}' has no parts")
+
+        part_numbers = [part_number for part_number, _ in parts]
+        if part_numbers != sorted(set(part_numbers)):
+            raise InvalidUploadPartError("Parts must be listed in ascending order")
+        for part_number, sha256 in parts:
+            part = available_parts.get(part_number)
+            if part is None or part.sha256 != sha256:
+                raise InvalidUploadPartError(
+                    f"Part {part_number} with SHA-256 '{sha256}' "
+                    f"was not uploaded to '{upload_id}'"
+                )
+
+        session_dir = await self.__get_upload_session_dir(upload_id)
+        part_paths = [
+            os.path.join(session_dir, f"{part_number:05d}.{sha256}")
+            for part_number, sha256 in parts
+        ]
+        directory = self._get_staging_directory(domain_obj)
+        temp_file_path = os.path.join(
+            directory, f"{TEMP_FILE_PREFIX}{uuid.uuid4().hex}.part"
+        )
+
+        try:
+            await self._run(os.makedirs, directory, exist_ok=True)
+            size, sha256, crc32 = await self._run(
+                _concatenate_files,
+                part_paths,
+                temp_file_path,
+                self._chunk_size,
+                self._fsync_policy != FSYNC_NONE,
+            )
+        except BaseException as e:
+            await self._run(_remove_if_exists, temp_file_path)
+            if not isinstance(e, Exception):
+                raise
+            error_message = f"Failed to assemble upload '{upload_id}'"
+            logger.error(f"{error_message}: {e}")
+            raise FileWriteError(f"{error_message}: {e}")
+
+        return TempFile(path=temp_file_path, size=size, sha256=sha256, crc32=crc32)
+
+    async def delete_upload_session(self, upload_id: str) -> None:
+        session_dir = await self.__get_upload_session_dir(upload_id)
+
+        try:
+            await self._run(shutil.rmtree, session_dir)
+            logger.info(f"Upload session '{upload_id}' deleted")
+        except FileNotFoundError:
+            raise UploadSessionNotFoundError(f"Upload '{upload_id}' does not exist")
+        except Exception as e:
+            error_message = f"Failed to delete upload session '{upload_id}': {e}"
+            logger.error(error_message)
+            raise FileDeletionError(error_message)
+
+    async def expire_upload_sessions(self) -> int:
+        """Deletes the sessions without any activity for longer than the TTL."""
+        num_expired = await self._run(self.__delete_expired_upload_sessions)
+        if num_expired:
+            logger.info(f"{num_expired} abandoned upload sessions deleted")
+        return num_expired
+
+    def __delete_expired_upload_sessions(self) -> int:
+        if not os.path.isdir(self._uploads_dir):
+            return 0
+
+        num_expired = 0
+        with os.scandir(self._uploads_dir) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and self.__is_expired(
+                    entry.path
+                ):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    num_expired += 1
+
+        return num_expired
+
+    def __is_expired(self, session_dir: str) -> bool:
+        # Writing a part creates and renames files in the session directory,
+        # so its mtime is the time of the last activity
+        try:
+            last_activity = os.stat(session_dir).st_mtime
+        except FileNotFoundError:
+            return True
+        return time.time() - last_activity > self._upload_session_ttl
+
+    async def __get_upload_session_dir(self, upload_id: str) -> str:
+        session_dir = os.path.join(self._uploads_dir, upload_id)
+        if not _UPLOAD_ID_PATTERN.fullmatch(upload_id) or not await self._run(
+            self.__is_active_upload_session, session_dir
+        ):
+            raise UploadSessionNotFoundError(f"Upload '{upload_id}' does not exist")
+
+        return session_dir
+
+    def __is_active_upload_session(self, session_dir: str) -> bool:
+        return os.path.isfile(
+            os.path.join(session_dir, UPLOAD_SESSION_FILE)
+        ) and not self.__is_expired(session_dir)
+
+    @staticmethod
+    def __scan_upload_parts(session_dir: str) -> Dict[int, List[str]]:
+        part_paths = {}
+        with os.scandir(session_dir) as entries:
+            for entry in entries:
+                match = _UPLOAD_PART_PATTERN.fullmatch(entry.name)
+                if match:
+                    part_paths.setdefault(int(match.group(1)), []).append(entry.path)
+        return part_paths
+
+    @staticmethod
+    def __read_upload_part(part_path: str) -> Optional[UploadPart]:
+        part_number, _, sha256 = os.path.basename(part_path).partition(".")
+        try:
+            stat_result = os.stat(part_path)
+        except FileNotFoundError:
+            return None
+
+        return UploadPart(
+            partNumber=int(part_number),
+            size=stat_result.st_size,
+            sha256=sha256,
+            lastModified=datetime.fromtimestamp(stat_result.st_mtime, timezone.utc),
+        )
+
+    async def __get_upload_parts(self, upload_id: str) -> Dict[int, UploadPart]:
+        """Maps the part numbers to their latest upload, in ascending order."""
+        session_dir = await self.__get_upload_session_dir(upload_id)
+        return await self._run(self.__read_latest_upload_parts, session_dir)
+
+    def __read_latest_upload_parts(self, session_dir: str) -> Dict[int, UploadPart]:
+        parts = {}
+        for part_number, part_paths in sorted(
+            self.__scan_upload_parts(session_dir).items()
+        ):
+            uploads = [self.__read_upload_part(path) for path in part_paths]
+            uploads = [upload for upload in uploads if upload is not None]
+            if uploads:
+                parts[part_number] = max(uploads, key=lambda part: part.lastModified)
+
+        return parts
+
+
+class ContentAddressedRepository(DiskRepository):
+    """Stores every distinct content once, under its SHA-256.
+
+    The reference count of each blob is kept in the metadata database and
+    changed in the transaction writing the metadata, so identical uploads
+    share a single file, which is removed once its last reference is gone.
+    """
+
+    def __init__(
+        self,
+        storage_dir: str,
+        blob_reference_service: BlobReferenceService,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        fsync_policy: str = FSYNC_NONE,
+        upload_session_ttl: int = DEFAULT_UPLOAD_SESSION_TTL,
+        executor: Optional[FilesystemExecutor] = None,
+    ):
+        super().__init__(
+            storage_dir=storage_dir,
+            chunk_size=chunk_size,
+            fsync_policy=fsync_policy,
+            upload_session_ttl=upload_session_ttl,
+            executor=executor,
+        )
+        self._blobs_dir = os.path.join(storage_dir, BLOBS_DIR)
+        self._blob_reference_service = blob_reference_service
+
+    def __get_blob_path(self, sha256: str) -> str:
+        return os.path.join(self._blobs_dir, sha256[:2], sha256[2:4], sha256)
+
+    async def write_stream(
+        self,
+        stream: AsyncIterator[bytes],
+        domain_obj: FileMetadata,
+        replaces: Optional[FileMetadata] = None,
+    ) -> FileMetadata:
+        return await self._stage_and_publish(
+            stream=stream, domain_obj=domain_obj, replaces=replaces
+        )
+
+    def _get_staging_directory(self, domain_obj: FileMetadata) -> str:
+        return self._blobs_dir
+
+    async def publish_file(
+        self,
+        temp_file: TempFile,
+        domain_obj: FileMetadata,
+        replaces: Optional[FileMetadata] = None,
+    ) -> FileMetadata:
+        """Publishes the blob unless it is already stored. Runs inside the
+        transaction writing the metadata, which counts the reference and
+        locks the blob, so the blob checked here is not removed before commit.
+        """
+        blob_path = self.__get_blob_path(temp_file.sha256)
+
+        try:
+            # The blob is linked again whenever it is missing, even if it is
+            # still counted
+            if await self._run(os.path.isfile, blob_path):
+                logger.info(
+                    f"File '{domain_obj.name}' is a duplicate "
+                    f"of blob '{temp_file.sha256}'"
+                )
+            else:
+                await self._run(os.makedirs, os.path.dirname(blob_path), exist_ok=True)
+                await self._publish_temp_file(
+                    temp_file_path=temp_file.path, file_path=blob_path, overwrite=True
+                )
+                logger.info(
+                    f"File '{domain_obj.name}' successfully written to '{blob_path}'"
+                )
+        except Exception as e:
+            error_message = f"Failed to write file '{domain_obj.name}'"
+            logger.error(f"{error_message}: {e}")
+            raise FileWriteError(f"{error_message}: {e}")
+
+        return domain_obj.model_copy(update=temp_file.checksums())
+
+    async def delete_replaced_file(
+        self, domain_obj: FileMetadata, replaces: Optional[FileMetadata]
+    ) -> None:
+        if replaces is not None and replaces.sha256 != domain_obj.sha256:
+            await self.delete_file(domain_obj=replaces)
+
+    async def unpublish_file(
+        self,
+        temp_file: TempFile,
+        domain_obj: FileMetadata,
+        replaces: Optional[FileMetadata] = None,
+    ) -> None:
+        # The reference was rolled back with the metadata, so a blob published
+        # for it alone is unreferenced again
+        await self.delete_file(domain_obj=domain_obj)
+
+    async def read_file(self, domain_obj: FileMetadata) -> Dict:
+        blob_path = (
+            self.__get_blob_path(domain_obj.sha256) if domain_obj.sha256 else None
+        )
+
+        if not blob_path or not await self._run(os.path.isfile, blob_path):
+            error_message = (
+                f"Blob '{domain_obj.sha256}' of file '{domain_obj.name}' "
+                f"not found in the storage directory."
+            )
+            logger.error(error_message)
+            raise FileNotFoundError(error_message)
+
+        return {
+            "path": blob_path,
+            "media_type": domain_obj.mimeType,
+            "filename": domain_obj.name,
+        }
+
+    async def delete_file(self, domain_obj: FileMetadata) -> None:
+        """Removes the blob of a file whose metadata is gone, unless another
+        file still references it. The reference itself was released in the
+        transaction removing the metadata."""
+        if not domain_obj.sha256:
+            logger.warning(f"File '{domain_obj.name}' does not reference any blob")
+            return
+
+        try:
+            async with self._blob_reference_service.lock_blob(
+                sha256=domain_obj.sha256
+            ) as ref_count:
+                if ref_count == 0:
+                    await self._run(
+                        _remove_if_exists, self.__get_blob_path(domain_obj.sha256)
+                    )
+                    logger.info(f"Blob '{domain_obj.sha256}' successfully deleted")
+        except Exception as e:
+            error_message = f"Failed to delete file '{domain_obj.name}': {e}"
+            logger.error(error_message)
+            raise FileDeletionError(error_message)
@@ -1,17 +1,22 @@
 import logging
-from typing import Dict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 from fastapi import UploadFile
 
-from fastapi_app.src.file_storage.abstract_repositories import AbstractFileRepository
+from fastapi_app.src.file_storage.abstract_repositories import (
+    AbstractFileRepository,
+    TempFile,
+)
 from fastapi_app.src.file_storage.exceptions import (
     FileAlreadyExistsError,
     FileDeletionError,
     FileReadError,
     FileStorageError,
     FileWriteError,
+    InvalidUploadPartError,
+    UploadSessionNotFoundError,
 )
-from fastapi_app.src.schemas import FileMetadata
+from fastapi_app.src.schemas import FileMetadata, UploadPart
 
 logger = logging.getLogger("app.file_storage.file_storage_service")
 
@@ -20,9 +25,9 @@ class FileStorageService:
     def __init__(self, file_repository: AbstractFileRepository):
         self._file_repository = file_repository
 
-    def get_file(self, domain_obj: FileMetadata) -> Dict:
+    async def get_file(self, domain_obj: FileMetadata) -> Dict:
         try:
-            return self._file_repository.read_file(domain_obj=domain_obj)
+            return await self._file_repository.read_file(domain_obj=domain_obj)
         except (FileNotFoundError, FileReadError) as e:
             raise e
         except Exception as e:
@@ -34,9 +39,28 @@ class FileStorageService:
             logger.error(error_message)
             raise FileStorageError(error_message)
 
-    async def save_file(self, file: UploadFile, domain_obj: FileMetadata) -> None:
+    async def get_file_chunks(self, domain_obj: FileMetadata) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._file_repository.read_chunks(domain_obj=domain_obj):
+                yield chunk
+        except (FileNotFoundError, FileReadError) as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"reading the file content "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def save_file(
+        self, file: UploadFile, domain_obj: FileMetadata
+    ) -> FileMetadata:
         try:
-            await self._file_repository.write_file(file=file, domain_obj=domain_obj)
+            return await self._file_repository.write_file(
+                file=file, domain_obj=domain_obj
+            )
         except (FileAlreadyExistsError, FileWriteError) as e:
             raise e
         except Exception as e:
@@ -53,10 +77,11 @@ class FileStorageService:
         file: UploadFile,
         domain_obj_new: FileMetadata,
         domain_obj_old: FileMetadata,
-    ) -> None:
+    ) -> FileMetadata:
         try:
-            self._file_repository.delete_file(domain_obj=domain_obj_old)
-            await self._file_repository.write_file(file=file, domain_obj=domain_obj_new)
+            return await self._file_repository.write_file(
+                file=file, domain_obj=domain_obj_new, replaces=domain_obj_old
+            )
         except (
             FileAlreadyExistsError,
             FileWriteError,
@@ -72,9 +97,149 @@ class FileStorageService:
             logger.error(error_message)
             raise FileStorageError(error_message)
 
-    def remove_file(self, domain_obj: FileMetadata) -> None:
+    async def save_stream(
+        self, stream: AsyncIterator[bytes], domain_obj: FileMetadata
+    ) -> FileMetadata:
+        try:
+            return await self._file_repository.write_stream(
+                stream=stream, domain_obj=domain_obj
+            )
+        except (FileAlreadyExistsError, FileWriteError) as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"saving the stream to storage "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def update_stream(
+        self,
+        stream: AsyncIterator[bytes],
+        domain_obj_new: FileMetadata,
+        domain_obj_old: FileMetadata,
+    ) -> FileMetadata:
+        try:
+            return await self._file_repository.write_stream(
+                stream=stream, domain_obj=domain_obj_new, replaces=domain_obj_old
+            )
+        except (
+            FileAlreadyExistsError,
+            FileWriteError,
+            FileDeletionError,
+        ) as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"updating the file in storage from stream "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def stage_file(self, file: UploadFile, domain_obj: FileMetadata) -> TempFile:
+        try:
+            return await self._file_repository.stage_file(
+                file=file, domain_obj=domain_obj
+            )
+        except FileWriteError as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"staging the file in storage "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def stage_stream(
+        self, stream: AsyncIterator[bytes], domain_obj: FileMetadata
+    ) -> TempFile:
         try:
-            self._file_repository.delete_file(domain_obj=domain_obj)
+            return await self._file_repository.stage_stream(
+                stream=stream, domain_obj=domain_obj
+            )
+        except FileWriteError as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"staging the stream in storage "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def publish_file(
+        self,
+        temp_file: TempFile,
+        domain_obj: FileMetadata,
+        replaces: Optional[FileMetadata] = None,
+    ) -> FileMetadata:
+        try:
+            return await self._file_repository.publish_file(
+                temp_file=temp_file, domain_obj=domain_obj, replaces=replaces
+            )
+        except (FileAlreadyExistsError, FileWriteError) as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"publishing the staged file in storage "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def remove_replaced_file(
+        self, domain_obj: FileMetadata, replaces: Optional[FileMetadata]
+    ) -> None:
+        try:
+            await self._file_repository.delete_replaced_file(
+                domain_obj=domain_obj, replaces=replaces
+            )
+        except FileDeletionError as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"deleting the replaced file from storage "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def unpublish_file(
+        self,
+        temp_file: TempFile,
+        domain_obj: FileMetadata,
+        replaces: Optional[FileMetadata] = None,
+    ) -> None:
+        try:
+            await self._file_repository.unpublish_file(
+                temp_file=temp_file, domain_obj=domain_obj, replaces=replaces
+            )
+        except FileDeletionError as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"unpublishing the file in storage "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def discard_file(self, temp_file: TempFile) -> None:
+        await self._file_repository.discard_file(temp_file=temp_file)
+
+    async def remove_file(self, domain_obj: FileMetadata) -> None:
+        try:
+            await self._file_repository.delete_file(domain_obj=domain_obj)
         except FileDeletionError as e:
             raise e
         except Exception as e:
@@ -85,3 +250,108 @@ class FileStorageService:
             )
             logger.error(error_message)
             raise FileStorageError(error_message)
+
+    async def create_upload_session(self, domain_obj: FileMetadata) -> str:
+        try:
+            return await self._file_repository.create_upload_session(
+                domain_obj=domain_obj
+            )
+        except FileWriteError as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"creating the upload session in storage "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def get_upload_session(self, upload_id: str) -> FileMetadata:
+        try:
+            return await self._file_repository.get_upload_session(upload_id=upload_id)
+        except (UploadSessionNotFoundError, FileReadError) as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"reading the upload session from storage "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def save_upload_part(
+        self, upload_id: str, part_number: int, stream: AsyncIterator[bytes]
+    ) -> UploadPart:
+        try:
+            return await self._file_repository.write_upload_part(
+                upload_id=upload_id, part_number=part_number, stream=stream
+            )
+        except (
+            UploadSessionNotFoundError,
+            InvalidUploadPartError,
+            FileWriteError,
+        ) as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"saving the upload part to storage "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def get_upload_parts(self, upload_id: str) -> List[UploadPart]:
+        try:
+            return await self._file_repository.list_upload_parts(upload_id=upload_id)
+        except UploadSessionNotFoundError as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"listing the upload parts in storage "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def assemble_upload(
+        self,
+        upload_id: str,
+        domain_obj: FileMetadata,
+        parts: Optional[List[Tuple[int, str]]] = None,
+    ) -> TempFile:
+        try:
+            return await self._file_repository.assemble_upload(
+                upload_id=upload_id, domain_obj=domain_obj, parts=parts
+            )
+        except (
+            UploadSessionNotFoundError,
+            InvalidUploadPartError,
+            FileWriteError,
+        ) as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"assembling the upload parts in storage "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
+
+    async def remove_upload_session(self, upload_id: str) -> None:
+        try:
+            await self._file_repository.delete_upload_session(upload_id=upload_id)
+        except (UploadSessionNotFoundError, FileDeletionError) as e:
+            raise e
+        except Exception as e:
+            error_message = (
+                f"An error occurred while "
+                f"deleting the upload session from storage "
+                f"on service or repository layer: {e}"
+            )
+            logger.error(error_message)
+            raise FileStorageError(error_message)
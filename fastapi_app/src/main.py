@@ -2,10 +2,15 @@ import aioredis as aioredis
 import uvicorn
 from fastapi import FastAPI
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
 
 from fastapi_app.logging_config import LOGGING_CONFIG
-from fastapi_app.src.config import DatabaseSettings, RedisSettings, merge_dicts
+from fastapi_app.src.cache import TieredBackend
+from fastapi_app.src.config import (
+    DatabaseSettings,
+    RedisSettings,
+    StorageSettings,
+    merge_dicts,
+)
 from fastapi_app.src.di_containers import AppContainer
 from fastapi_app.src.router import router
 
@@ -13,9 +18,13 @@ from fastapi_app.src.router import router
 def create_app() -> FastAPI:
     redis_settings = RedisSettings()
     db_settings = DatabaseSettings()
+    storage_settings = StorageSettings()
     log_settings_dict = LOGGING_CONFIG
     settings_dict = merge_dicts(
-        {"database": db_settings.model_dump()}, {"logging": log_settings_dict}
+        {"database": db_settings.model_dump()},
+        {"storage": storage_settings.model_dump()},
+        {"redis": redis_settings.model_dump()},
+        {"logging": log_settings_dict},
     )
 
     container = AppContainer()
@@ -24,10 +33,25 @@ def create_app() -> FastAPI:
     container.wire(modules=["fastapi_app.src.router", "fastapi_app.src.dependencies"])
 
     redis = aioredis.from_url(url=redis_settings.url)
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    cache_backend = TieredBackend(
+        redis,
+        max_entries=redis_settings.redis_local_cache_max_entries,
+        ttl=redis_settings.redis_local_cache_ttl,
+    )
+    FastAPICache.init(
+        cache_backend,
+        prefix="fastapi-cache",
+        expire=redis_settings.redis_cache_expire,
+    )
 
     app = FastAPI()
     app.container = container
+    app.add_event_handler("startup", cache_backend.start)
+    app.add_event_handler("shutdown", cache_backend.stop)
+    app.add_event_handler("shutdown", container.database.database_provider().dispose)
+    app.add_event_handler(
+        "shutdown", container.repositories.filesystem_executor_provider().shutdown
+    )
     app.include_router(router)
     return app
 
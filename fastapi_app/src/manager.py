@@ -1,10 +1,74 @@
-from typing import Dict, List, Mapping
+import asyncio
+import logging
+import mimetypes
+import posixpath
+from datetime import timezone
+from typing import AsyncIterator, Dict, List, Mapping, Optional, Tuple, Union
 
 from fastapi import UploadFile
 
+from fastapi_app.src.archive import (
+    ARCHIVE_FORMAT_TAR,
+    ArchiveEntry,
+    iter_tar_members,
+    stream_tar,
+    stream_zip,
+)
+from fastapi_app.src.cache import CacheNamespace, FileMetadataCache
+from fastapi_app.src.db_service.exceptions import (
+    ConcurrentModificationError,
+    DatabaseServiceError,
+    MappingError,
+    RepositoryError,
+)
 from fastapi_app.src.db_service.services import DatabaseService
+from fastapi_app.src.file_storage.abstract_repositories import TempFile
+from fastapi_app.src.file_storage.exceptions import FileStorageError
 from fastapi_app.src.file_storage.services import FileStorageService
-from fastapi_app.src.schemas import FileMetadata
+from fastapi_app.src.schemas import (
+    CompletedPart,
+    FileMetadata,
+    FileUploadStatus,
+    UploadPart,
+    UploadSession,
+)
+
+logger = logging.getLogger("app.manager")
+
+ARCHIVE_PAGE_SIZE = 1000
+
+
+def tar_member_metadata(
+    member_name: str, size: int, tag: Optional[str]
+) -> FileMetadata:
+    """Builds the metadata of a tar member named '<file_id>/<file name>'."""
+    file_id, _, name = member_name.strip("/").partition("/")
+    name = posixpath.basename(name)
+    if not file_id.isdigit() or not name:
+        raise ValueError(
+            f"Tar member '{member_name}' is not named '<file_id>/<file name>'"
+        )
+
+    mime_type, _ = mimetypes.guess_type(name)
+    return FileMetadata(
+        id=int(file_id),
+        name=name,
+        tag=tag,
+        size=size,
+        mimeType=mime_type or "application/octet-stream",
+    )
+
+
+def _error_detail(error: Exception) -> str:
+    if isinstance(error, FileStorageError):
+        return "Error is on the file storage layer"
+    if isinstance(error, ConcurrentModificationError):
+        return "File was modified concurrently"
+    if isinstance(error, (RepositoryError, MappingError, DatabaseServiceError)):
+        return "Error is on the database layer"
+    if isinstance(error, ValueError):
+        return str(error)
+    return "Unexpected error"
 
 
 class ServiceManager:
@@ -12,70 +76,432 @@ class ServiceManager:
         self,
         file_storage_service: FileStorageService,
         database_service: DatabaseService,
+        bulk_concurrency: int = 8,
+        files_cache: Optional[CacheNamespace] = None,
+        metadata_cache: Optional[FileMetadataCache] = None,
     ):
         self._file_storage_service = file_storage_service
         self._database_service = database_service
+        self._bulk_concurrency = bulk_concurrency
+        self._files_cache = files_cache
+        self._metadata_cache = metadata_cache
+
+    async def __on_metadata_committed(
+        self, written: Dict[int, Optional[FileMetadata]]
+    ) -> None:
+        """Drops the cached listings and caches the committed rows, None for
+        the ids of deleted rows."""
+        if self._files_cache is not None:
+            await self._files_cache.invalidate()
+        if self._metadata_cache is not None:
+            await self._metadata_cache.put(written)
+
+    async def __on_metadata_write_failed(self, file_ids: List[int]) -> None:
+        # A failed commit may still have been applied, the cached rows are
+        # dropped to be read again
+        if self._metadata_cache is not None:
+            await self._metadata_cache.evict(file_ids)
 
     async def create_or_update_file(
         self, file: UploadFile, metadata: FileMetadata
     ) -> FileMetadata:
-        file_metadata = await self._database_service.get_file_metadata_by_id(
-            file_id=metadata.id
+        temp_file = await self._file_storage_service.stage_file(
+            file=file, domain_obj=metadata
+        )
+        return await self.__upsert_staged_file(temp_file=temp_file, metadata=metadata)
+
+    async def create_or_update_file_from_stream(
+        self, stream: AsyncIterator[bytes], metadata: FileMetadata
+    ) -> FileMetadata:
+        temp_file = await self._file_storage_service.stage_stream(
+            stream=stream, domain_obj=metadata
+        )
+        return await self.__upsert_staged_file(temp_file=temp_file, metadata=metadata)
+
+    async def initiate_upload(self, metadata: FileMetadata) -> UploadSession:
+        upload_id = await self._file_storage_service.create_upload_session(
+            domain_obj=metadata
+        )
+        return UploadSession(uploadId=upload_id, file=metadata)
+
+    async def upload_part(
+        self, upload_id: str, part_number: int, stream: AsyncIterator[bytes]
+    ) -> UploadPart:
+        return await self._file_storage_service.save_upload_part(
+            upload_id=upload_id, part_number=part_number, stream=stream
+        )
+
+    async def list_upload_parts(self, upload_id: str) -> List[UploadPart]:
+        return await self._file_storage_service.get_upload_parts(upload_id=upload_id)
+
+    async def complete_upload(
+        self, upload_id: str, parts: Optional[List[CompletedPart]] = None
+    ) -> FileMetadata:
+        """Assembles the parts into a staged file, which is then upserted like
+        an upload in a single request, and deletes the session."""
+        metadata = await self._file_storage_service.get_upload_session(
+            upload_id=upload_id
         )
+        temp_file = await self._file_storage_service.assemble_upload(
+            upload_id=upload_id,
+            domain_obj=metadata,
+            parts=(
+                [(part.partNumber, part.sha256) for part in parts]
+                if parts is not None
+                else None
+            ),
+        )
+        result = await self.__upsert_staged_file(temp_file=temp_file, metadata=metadata)
+
+        try:
+            await self._file_storage_service.remove_upload_session(upload_id=upload_id)
+        except FileStorageError as e:
+            # The file is stored, the session is left to expire
+            logger.warning(f"Upload session '{upload_id}' was not deleted: {e}")
+
+        return result
+
+    async def abort_upload(self, upload_id: str) -> None:
+        await self._file_storage_service.remove_upload_session(upload_id=upload_id)
 
-        if not file_metadata:
-            """Create scenario"""
-            await self._file_storage_service.save_file(file=file, domain_obj=metadata)
+    async def __upsert_staged_file(
+        self, temp_file: TempFile, metadata: FileMetadata
+    ) -> FileMetadata:
+        """Upserts the metadata and publishes the staged file, then removes the
+        file of the replaced row. An upload which lost the race for the row to
+        a concurrent one of the same id is written again over it, so the last
+        writer wins."""
+        metadata = metadata.model_copy(update=temp_file.checksums())
+
+        try:
             try:
-                result = await self._database_service.add_file_metadata(
-                    metadata=metadata
+                result, previous = await self.__publish_staged_file(
+                    temp_file=temp_file, metadata=metadata
+                )
+            except ConcurrentModificationError as e:
+                logger.warning(f"Retrying the upsert of id={metadata.id}: {e}")
+                result, previous = await self.__publish_staged_file(
+                    temp_file=temp_file, metadata=metadata
+                )
+        finally:
+            await self._file_storage_service.discard_file(temp_file=temp_file)
+
+        await self.__on_metadata_committed({result.id: result})
+        await self._file_storage_service.remove_replaced_file(
+            domain_obj=result, replaces=previous
+        )
+
+        return result
+
+    async def __publish_staged_file(
+        self, temp_file: TempFile, metadata: FileMetadata
+    ) -> Tuple[FileMetadata, Optional[FileMetadata]]:
+        """Upserts the metadata and publishes the staged file in one database
+        transaction. The published file is put back if the transaction fails,
+        the staged one is kept for another attempt."""
+        published = None
+        previous = None
+
+        try:
+            async with self._database_service.upsert_file_metadata(
+                metadata=metadata
+            ) as (result, previous):
+                published = await self._file_storage_service.publish_file(
+                    temp_file=temp_file, domain_obj=metadata, replaces=previous
+                )
+        except BaseException as e:
+            await self.__on_metadata_write_failed([metadata.id])
+            if published is not None:
+                await self._file_storage_service.unpublish_file(
+                    temp_file=temp_file, domain_obj=published, replaces=previous
+                )
+            raise e
+
+        return result, previous
+
+    async def create_or_update_files(
+        self, files: List[Tuple[FileMetadata, UploadFile]]
+    ) -> List[FileUploadStatus]:
+        semaphore = asyncio.Semaphore(self._bulk_concurrency)
+
+        async def stage(metadata: FileMetadata, file: UploadFile) -> TempFile:
+            async with semaphore:
+                return await self._file_storage_service.stage_file(
+                    file=file, domain_obj=metadata
+                )
+
+        staged = await asyncio.gather(
+            *(stage(metadata, file) for metadata, file in files),
+            return_exceptions=True,
+        )
+
+        interrupted = [
+            result for result in staged if not isinstance(result, (TempFile, Exception))
+        ]
+        if interrupted:
+            for temp_file in staged:
+                if isinstance(temp_file, TempFile):
+                    await self._file_storage_service.discard_file(temp_file=temp_file)
+            raise interrupted[0]
+
+        return await self.__upsert_staged_files(
+            [(metadata, temp_file) for (metadata, _), temp_file in zip(files, staged)]
+        )
+
+    async def create_or_update_files_from_tar(
+        self, stream: AsyncIterator[bytes], tag: Optional[str] = None
+    ) -> List[FileUploadStatus]:
+        """Stages the members of a tar stream one by one as they arrive, then
+        publishes and commits them like create_or_update_files."""
+        staged: List[Tuple[Union[FileMetadata, str], Union[TempFile, Exception]]] = []
+        try:
+            async for member_name, size, content in iter_tar_members(stream):
+                try:
+                    metadata = tar_member_metadata(member_name, size, tag)
+                except ValueError as e:
+                    staged.append((member_name, e))
+                    continue
+
+                try:
+                    temp_file = await self._file_storage_service.stage_stream(
+                        stream=content, domain_obj=metadata
+                    )
+                except FileStorageError as e:
+                    temp_file = e
+                staged.append((metadata, temp_file))
+        except Exception:
+            for _, temp_file in staged:
+                if isinstance(temp_file, TempFile):
+                    await self._file_storage_service.discard_file(temp_file=temp_file)
+            raise
+
+        return await self.__upsert_staged_files(staged)
+
+    async def __upsert_staged_files(
+        self,
+        staged: List[Tuple[Union[FileMetadata, str], Union[TempFile, Exception]]],
+    ) -> List[FileUploadStatus]:
+        """Upserts the metadata and publishes the staged files in one database
+        transaction, each row in its own savepoint like __upsert_staged_file.
+        An item that fails is reported in its status, its file is put back
+        after the transaction ends, and it does not abort the others."""
+        statuses: List[Optional[FileUploadStatus]] = [None] * len(staged)
+        pending: Dict[int, Tuple[FileMetadata, TempFile]] = {}
+        file_ids = set()
+
+        for i, (metadata, temp_file) in enumerate(staged):
+            if isinstance(temp_file, Exception):
+                statuses[i] = self.__failed_status(metadata, temp_file)
+            elif metadata.id in file_ids:
+                await self._file_storage_service.discard_file(temp_file=temp_file)
+                statuses[i] = self.__failed_status(
+                    metadata, ValueError(f"Duplicate file id {metadata.id}")
+                )
+            else:
+                file_ids.add(metadata.id)
+                pending[i] = (
+                    metadata.model_copy(update=temp_file.checksums()),
+                    temp_file,
                 )
-            except Exception as e:
-                self._file_storage_service.remove_file(domain_obj=metadata)
-                raise e
-        else:
-            """Update scenario"""
-            await self._file_storage_service.update_file(
-                file=file, domain_obj_new=metadata, domain_obj_old=file_metadata
+
+        upserted: Dict[int, Tuple[FileMetadata, Optional[FileMetadata]]] = {}
+        published: Dict[int, FileMetadata] = {}
+        failed: Dict[int, Exception] = {}
+
+        try:
+            try:
+                async with self._database_service.begin_metadata_transaction() as tx:
+                    for i, (metadata, temp_file) in pending.items():
+                        try:
+                            async with tx.upsert_file_metadata(
+                                metadata=metadata
+                            ) as upserted[i]:
+                                published[i] = (
+                                    await self._file_storage_service.publish_file(
+                                        temp_file=temp_file,
+                                        domain_obj=metadata,
+                                        replaces=upserted[i][1],
+                                    )
+                                )
+                        except Exception as e:
+                            failed[i] = e
+            except BaseException as e:
+                await self.__on_metadata_write_failed(list(file_ids))
+                # The files are put back once the transaction has ended, as
+                # the locks it holds would block the removal of blobs
+                await self.__unpublish_files(pending, upserted, published)
+                if not isinstance(e, Exception):
+                    raise e
+
+                for i, (metadata, _) in pending.items():
+                    statuses[i] = self.__failed_status(metadata, e)
+                return statuses
+
+            await self.__unpublish_files(
+                pending,
+                upserted,
+                {i: published[i] for i in failed if i in published},
             )
+        finally:
+            for _, temp_file in pending.values():
+                await self._file_storage_service.discard_file(temp_file=temp_file)
+
+        committed = {
+            upserted[i][0].id: upserted[i][0] for i in pending if i not in failed
+        }
+        if committed:
+            await self.__on_metadata_committed(committed)
+        if failed:
+            await self.__on_metadata_write_failed([pending[i][0].id for i in failed])
+
+        for i, (metadata, _) in pending.items():
+            if i in failed:
+                statuses[i] = self.__failed_status(metadata, failed[i])
+                continue
+
+            result, previous = upserted[i]
+            await self._file_storage_service.remove_replaced_file(
+                domain_obj=result, replaces=previous
+            )
+            statuses[i] = FileUploadStatus(
+                id=result.id, name=result.name, status="created", file=result
+            )
+
+        return statuses
+
+    async def __unpublish_files(
+        self,
+        pending: Dict[int, Tuple[FileMetadata, TempFile]],
+        upserted: Dict[int, Tuple[FileMetadata, Optional[FileMetadata]]],
+        published: Dict[int, FileMetadata],
+    ) -> None:
+        for i, domain_obj in published.items():
             try:
-                result = await self._database_service.update_file_metadata(
-                    new_metadata=metadata
+                await self._file_storage_service.unpublish_file(
+                    temp_file=pending[i][1],
+                    domain_obj=domain_obj,
+                    replaces=upserted[i][1],
                 )
-            except Exception as e:
-                self._file_storage_service.remove_file(domain_obj=metadata)
-                raise e
+            except FileStorageError as e:
+                logger.error(f"File with id={domain_obj.id} was not put back: {e}")
 
-        return result
+    @staticmethod
+    def __failed_status(
+        metadata: Union[FileMetadata, str], error: Exception
+    ) -> FileUploadStatus:
+        if isinstance(metadata, FileMetadata):
+            return FileUploadStatus(
+                id=metadata.id,
+                name=metadata.name,
+                status="failed",
+                detail=_error_detail(error),
+            )
+        return FileUploadStatus(
+            name=metadata, status="failed", detail=_error_detail(error)
+        )
 
     async def get_files_metadata(
-        self, params: Dict[str, List], limit: int, offset: int
+        self,
+        params: Dict[str, List],
+        limit: int,
+        offset: int,
+        after_id: Optional[int] = None,
     ) -> List[FileMetadata]:
         result_lst = await self._database_service.get_file_metadata_by_params(
-            params=params, limit=limit, offset=offset
+            params=params, limit=limit, offset=offset, after_id=after_id
         )
 
         return result_lst
 
     async def remove_files(self, params: Dict[str, List]) -> int:
-        file_metadata_lst = await self._database_service.get_file_metadata_by_params(
+        """Deletes the rows, then the files of exactly the deleted rows, so a
+        row inserted in the meantime keeps its file."""
+        deleted_metadata_lst = await self._database_service.remove_file_metadata(
             params=params
         )
+        if deleted_metadata_lst:
+            await self.__on_metadata_committed(
+                {file_metadata.id: None for file_metadata in deleted_metadata_lst}
+            )
 
-        for file_metadata in file_metadata_lst:
-            self._file_storage_service.remove_file(domain_obj=file_metadata)
+        for file_metadata in deleted_metadata_lst:
+            await self._file_storage_service.remove_file(domain_obj=file_metadata)
 
-        num_deleted_files = await self._database_service.remove_file_metadata(
-            params=params
-        )
+        return len(deleted_metadata_lst)
 
-        return num_deleted_files
+    async def get_file_metadata(self, file_id: int) -> Optional[FileMetadata]:
+        if self._metadata_cache is not None:
+            is_cached, file_metadata = await self._metadata_cache.get(file_id)
+            if is_cached:
+                return file_metadata
 
-    async def download_file(self, file_id: int) -> Mapping:
         file_metadata = await self._database_service.get_file_metadata_by_id(
             file_id=file_id
         )
+        if self._metadata_cache is not None:
+            await self._metadata_cache.fill(file_id, file_metadata)
+
+        return file_metadata
+
+    async def get_file_payload(self, file_metadata: FileMetadata) -> Mapping:
+        return await self._file_storage_service.get_file(domain_obj=file_metadata)
+
+    async def download_file(self, file_id: int) -> Mapping:
+        file_metadata = await self.get_file_metadata(file_id=file_id)
 
         if file_metadata:
-            payload = self._file_storage_service.get_file(domain_obj=file_metadata)
+            payload = await self.get_file_payload(file_metadata=file_metadata)
             return payload
+
+    def download_archive(
+        self, params: Dict[str, List], archive_format: str
+    ) -> AsyncIterator[bytes]:
+        """Streams an archive of the files matching the params.
+
+        The metadata is read page by page and the files chunk by chunk, so
+        memory use does not depend on the number or the size of the files.
+        Each file is stored as '<file_id>/<file name>', the layout expected
+        by the tar upload.
+        """
+        entries = self.__iter_archive_entries(params=params)
+        if archive_format == ARCHIVE_FORMAT_TAR:
+            return stream_tar(entries)
+        return stream_zip(entries)
+
+    async def __iter_archive_entries(
+        self, params: Dict[str, List]
+    ) -> AsyncIterator[ArchiveEntry]:
+        after_id = None
+        while True:
+            metadata_lst = await self.get_files_metadata(
+                params=params, limit=ARCHIVE_PAGE_SIZE, offset=None, after_id=after_id
+            )
+
+            for metadata in metadata_lst:
+                try:
+                    await self.get_file_payload(file_metadata=metadata)
+                except FileNotFoundError:
+                    logger.warning(
+                        f"File '{metadata.name}' with id={metadata.id} "
+                        f"is left out of the archive, it is not in the storage"
+                    )
+                    continue
+
+                yield ArchiveEntry(
+                    name=f"{metadata.id}/{metadata.name}",
+                    size=metadata.size,
+                    mtime=(
+                        metadata.modificationTime.replace(
+                            tzinfo=timezone.utc
+                        ).timestamp()
+                        if metadata.modificationTime
+                        else 0
+                    ),
+                    content=self._file_storage_service.get_file_chunks(
+                        domain_obj=metadata
+                    ),
+                )
+
+            if len(metadata_lst) < ARCHIVE_PAGE_SIZE:
+                return
+            after_id = metadata_lst[-1].id
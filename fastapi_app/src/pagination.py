@@ -0,0 +1,55 @@
+import base64
+import binascii
+import json
+from functools import wraps
+from typing import Awaitable, Callable
+
+from fastapi.responses import Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursorError(Exception):
+    pass
+
+
+def encode_cursor(last_id: int) -> str:
+    payload = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        last_id = payload["id"]
+    except (binascii.Error, ValueError, TypeError, KeyError) as e:
+        raise InvalidCursorError(f"Invalid cursor '{cursor}': {e}")
+
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        raise InvalidCursorError(f"Invalid cursor '{cursor}'")
+
+    return last_id
+
+
+def next_cursor_header(func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    """Sets the cursor of the next page on a cached list handler.
+
+    It is placed above the cache decorator, so the header is also sent for
+    cached pages. A page shorter than the limit is the last one.
+    """
+
+    @wraps(func)
+    async def inner(*args, **kwargs):
+        result = await func(*args, **kwargs)
+        limit = kwargs.get("limit")
+        if isinstance(result, Response) or not limit or len(result) < limit:
+            return result
+
+        last_item = result[-1]
+        last_id = last_item["id"] if isinstance(last_item, dict) else last_item.id
+        kwargs["response"].headers[NEXT_CURSOR_HEADER] = encode_cursor(last_id)
+
+        return result
+
+    return inner
@@ -0,0 +1,235 @@
+import os
+import stat
+import uuid
+from typing import BinaryIO, List, Mapping, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+MAX_RANGES = 64
+
+ZERO_COPY_SEND = "http.response.zerocopysend"
+
+DOWNLOAD_MODE_APP = "app"
+DOWNLOAD_MODE_X_ACCEL = "x-accel"
+
+
+class RangeNotSatisfiableError(Exception):
+    pass
+
+
+def parse_range_header(
+    range_header: str, file_size: int
+) -> Optional[List[Tuple[int, int]]]:
+    """Parses a 'bytes=' Range header into inclusive (start, end) pairs.
+
+    Returns None for a header that is malformed or has too many ranges, in
+    which case the whole file is served, and raises RangeNotSatisfiableError
+    if none of the ranges overlaps the file.
+    """
+    unit, _, ranges_spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+
+    range_specs = ranges_spec.split(",")
+    if len(range_specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for range_spec in range_specs:
+        first, sep, last = range_spec.strip().partition("-")
+        if not sep or not (first or last):
+            return None
+        if (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+
+        if not first:
+            suffix_length = int(last)
+            if suffix_length == 0:
+                continue
+            start, end = max(file_size - suffix_length, 0), file_size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else None
+            if end is not None and end < start:
+                return None
+            if start >= file_size:
+                continue
+            end = file_size - 1 if end is None else min(end, file_size - 1)
+
+        ranges.append((start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiableError(f"No range of '{range_header}' is satisfiable")
+
+    return ranges
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse which answers Range requests with 206 Partial Content.
+
+    A single range is sent as it is, several ranges as multipart/byteranges.
+    When the server supports the ASGI zero-copy send extension the ranges are
+    passed to it as file offsets, so the kernel copies them to the socket.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stat_result is None:
+            try:
+                self.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+            except FileNotFoundError:
+                raise RuntimeError(f"File at path {self.path} does not exist.")
+            if not stat.S_ISREG(self.stat_result.st_mode):
+                raise RuntimeError(f"File at path {self.path} is not a file.")
+            self.set_stat_headers(self.stat_result)
+
+        self.headers["accept-ranges"] = "bytes"
+        file_size = self.stat_result.st_size
+        request_headers = Headers(scope=scope)
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+
+        ranges = None
+        if range_header is not None and (
+            if_range is None
+            or if_range in (self.headers["etag"], self.headers["last-modified"])
+        ):
+            try:
+                ranges = parse_range_header(range_header, file_size)
+            except RangeNotSatisfiableError:
+                await self.__send_range_not_satisfiable(send, file_size)
+                return
+
+        if ranges is None:
+            await super().__call__(scope, receive, send)
+            return
+
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.headers["content-range"] = f"bytes {start}-{end}/{file_size}"
+            self.headers["content-length"] = str(end - start + 1)
+            parts = [(b"", start, end)]
+            closing = b""
+        else:
+            boundary = uuid.uuid4().hex
+            parts = [
+                (
+                    (
+                        f"--{boundary}\r\n"
+                        f"Content-Type: {self.media_type}\r\n"
+                        f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+                    ).encode("latin-1"),
+                    start,
+                    end,
+                )
+                for start, end in ranges
+            ]
+            closing = f"--{boundary}--\r\n".encode("latin-1")
+            content_length = len(closing) + sum(
+                len(part_header) + end - start + 1 + 2
+                for part_header, start, end in parts
+            )
+            self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+            self.headers["content-length"] = str(content_length)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 206,
+                "headers": self.raw_headers,
+            }
+        )
+
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            zero_copy = ZERO_COPY_SEND in scope.get("extensions", {})
+            with open(self.path, "rb") as file:
+                for part_header, start, end in parts:
+                    if part_header:
+                        await self.__send_body(send, part_header)
+                    await self.__send_range(send, file, start, end, zero_copy)
+                    if closing:
+                        await self.__send_body(send, b"\r\n")
+            await send(
+                {"type": "http.response.body", "body": closing, "more_body": False}
+            )
+
+        if self.background is not None:
+            await self.background()
+
+    async def __send_range_not_satisfiable(self, send: Send, file_size: int) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 416,
+                "headers": [
+                    (b"content-range", f"bytes */{file_size}".encode("latin-1")),
+                    (b"content-length", b"0"),
+                    (b"accept-ranges", b"bytes"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    @staticmethod
+    async def __send_body(send: Send, body: bytes) -> None:
+        await send({"type": "http.response.body", "body": body, "more_body": True})
+
+    async def __send_range(
+        self, send: Send, file: BinaryIO, start: int, end: int, zero_copy: bool
+    ) -> None:
+        if zero_copy:
+            await send(
+                {
+                    "type": ZERO_COPY_SEND,
+                    "file": file,
+                    "offset": start,
+                    "count": end - start + 1,
+                    "more_body": True,
+                }
+            )
+            return
+
+        remaining = end - start + 1
+        await anyio.to_thread.run_sync(file.seek, start)
+        while remaining > 0:
+            chunk = await anyio.to_thread.run_sync(
+                file.read, min(self.chunk_size, remaining)
+            )
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            await self.__send_body(send, chunk)
+
+
+class AccelRedirectResponse(Response):
+    """Empty response which tells nginx to serve the file itself.
+
+    The X-Accel-Redirect header points at the file under an internal nginx
+    location that aliases the storage directory, so the bytes never pass
+    through the application.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        storage_dir: str,
+        accel_location: str,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+        filename: Optional[str] = None,
+    ) -> None:
+        super().__init__(headers=headers, media_type=media_type)
+        relative_path = os.path.relpath(path, storage_dir).replace(os.sep, "/")
+        self.headers["x-accel-redirect"] = accel_location.rstrip("/") + quote(
+            "/" + relative_path
+        )
+        if filename is not None:
+            self.headers.setdefault(
+                "content-disposition",
+                f"attachment; filename*=utf-8''{quote(filename)}",
+            )
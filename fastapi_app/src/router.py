@@ -1,18 +1,47 @@
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Literal, Optional, Tuple
 
 from dependency_injector.wiring import Provide, inject
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from fastapi.responses import FileResponse, JSONResponse
-from fastapi_cache.decorator import cache
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    UploadFile,
+    status,
+)
+from fastapi.responses import JSONResponse, StreamingResponse
 
+from fastapi_app.src.archive import (
+    ARCHIVE_FORMAT_ZIP,
+    ARCHIVE_MEDIA_TYPES,
+    ArchiveError,
+)
+from fastapi_app.src.cache import cached, files_cache, get_cache_metrics
+from fastapi_app.src.conditional import (
+    conditional_json,
+    file_validators,
+    is_not_modified,
+    not_modified_response,
+)
+from fastapi_app.src.database import Database
 from fastapi_app.src.db_service.exceptions import (
+    ConcurrentModificationError,
     DatabaseError,
     DatabaseServiceError,
     DataLossError,
     MappingError,
     SessionNotSetError,
 )
-from fastapi_app.src.dependencies import get_query_params, valid_file_metadata
+from fastapi_app.src.dependencies import (
+    get_cursor,
+    get_query_params,
+    valid_bulk_metadata,
+    valid_file_metadata,
+    valid_stream_metadata,
+)
 from fastapi_app.src.di_containers import AppContainer
 from fastapi_app.src.file_storage.exceptions import (
     FileAlreadyExistsError,
@@ -20,9 +49,25 @@ from fastapi_app.src.file_storage.exceptions import (
     FileReadError,
     FileStorageError,
     FileWriteError,
+    InvalidUploadPartError,
+    UploadSessionNotFoundError,
 )
+from fastapi_app.src.file_storage.executor import FilesystemExecutor
+from fastapi_app.src.file_storage.repositories import MAX_UPLOAD_PARTS
 from fastapi_app.src.manager import ServiceManager
-from fastapi_app.src.schemas import FileMetadata, Message
+from fastapi_app.src.pagination import next_cursor_header
+from fastapi_app.src.responses import (
+    DOWNLOAD_MODE_X_ACCEL,
+    AccelRedirectResponse,
+    RangeFileResponse,
+)
+from fastapi_app.src.schemas import (
+    CompleteUpload,
+    FileMetadata,
+    FileUploadStatus,
+    Message,
+    UploadSession,
+)
 
 router = APIRouter(prefix="/api/v1", tags=["file_storage"])
 
@@ -57,6 +102,11 @@ async def create_update_file_handler(
             status_code=500,
             detail="Error is on the file storage service layer or lower",
         )
+    except ConcurrentModificationError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="File was modified concurrently, retry the upload",
+        )
     except (SessionNotSetError, MappingError, DatabaseError, AttributeError):
         raise HTTPException(
             status_code=500, detail="Error is on the database repository layer"
@@ -70,20 +120,343 @@ async def create_update_file_handler(
         raise HTTPException(status_code=500, detail="Error is on the controller layer")
 
 
+@router.put("/files/{file_id}", status_code=status.HTTP_201_CREATED)
+@inject
+async def create_update_file_from_stream_handler(
+    request: Request,
+    file_metadata: FileMetadata = Depends(valid_stream_metadata),
+    service_manager: ServiceManager = Depends(
+        Provide[AppContainer.services.service_manager_provider]
+    ),
+):
+    try:
+        result = await service_manager.create_or_update_file_from_stream(
+            stream=request.stream(), metadata=file_metadata
+        )
+
+        return result
+    except (
+        ValueError,
+        FileAlreadyExistsError,
+        FileWriteError,
+        FileDeletionError,
+    ):
+        raise HTTPException(
+            status_code=500, detail="Error is on the disk repository layer"
+        )
+    except FileStorageError:
+        raise HTTPException(
+            status_code=500,
+            detail="Error is on the file storage service layer or lower",
+        )
+    except ConcurrentModificationError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="File was modified concurrently, retry the upload",
+        )
+    except (SessionNotSetError, MappingError, DatabaseError, AttributeError):
+        raise HTTPException(
+            status_code=500, detail="Error is on the database repository layer"
+        )
+    except DatabaseServiceError:
+        raise HTTPException(
+            status_code=500, detail="Error is on the database service layer or lower"
+        )
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error is on the controller layer")
+
+
+@router.post("/upload/bulk", status_code=status.HTTP_207_MULTI_STATUS)
+@inject
+async def create_update_files_handler(
+    files: List[Tuple[FileMetadata, UploadFile]] = Depends(valid_bulk_metadata),
+    service_manager: ServiceManager = Depends(
+        Provide[AppContainer.services.service_manager_provider]
+    ),
+) -> List[FileUploadStatus]:
+    try:
+        result_lst = await service_manager.create_or_update_files(files=files)
+
+        return result_lst
+    except FileStorageError:
+        raise HTTPException(
+            status_code=500,
+            detail="Error is on the file storage service layer or lower",
+        )
+    except (SessionNotSetError, MappingError, DatabaseError, AttributeError):
+        raise HTTPException(
+            status_code=500, detail="Error is on the database repository layer"
+        )
+    except DatabaseServiceError:
+        raise HTTPException(
+            status_code=500, detail="Error is on the database service layer or lower"
+        )
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error is on the controller layer")
+
+
+@router.post("/upload/tar", status_code=status.HTTP_207_MULTI_STATUS)
+@inject
+async def create_update_files_from_tar_handler(
+    request: Request,
+    tag: Optional[str] = None,
+    service_manager: ServiceManager = Depends(
+        Provide[AppContainer.services.service_manager_provider]
+    ),
+) -> List[FileUploadStatus]:
+    try:
+        result_lst = await service_manager.create_or_update_files_from_tar(
+            stream=request.stream(), tag=tag
+        )
+
+        return result_lst
+    except ArchiveError:
+        raise HTTPException(status_code=400, detail="The tar stream is malformed")
+    except FileStorageError:
+        raise HTTPException(
+            status_code=500,
+            detail="Error is on the file storage service layer or lower",
+        )
+    except (SessionNotSetError, MappingError, DatabaseError, AttributeError):
+        raise HTTPException(
+            status_code=500, detail="Error is on the database repository layer"
+        )
+    except DatabaseServiceError:
+        raise HTTPException(
+            status_code=500, detail="Error is on the database service layer or lower"
+        )
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error is on the controller layer")
+
+
+@router.post("/uploads", status_code=status.HTTP_201_CREATED)
+@inject
+async def initiate_upload_handler(
+    file_metadata: FileMetadata = Depends(valid_stream_metadata),
+    service_manager: ServiceManager = Depends(
+        Provide[AppContainer.services.service_manager_provider]
+    ),
+) -> UploadSession:
+    try:
+        result = await service_manager.initiate_upload(metadata=file_metadata)
+
+        return result
+    except (ValueError, FileWriteError, FileReadError, FileDeletionError):
+        raise HTTPException(
+            status_code=500, detail="Error is on the disk repository layer"
+        )
+    except FileStorageError:
+        raise HTTPException(
+            status_code=500,
+            detail="Error is on the file storage service layer or lower",
+        )
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error is on the controller layer")
+
+
+@router.put(
+    "/uploads/{upload_id}/parts/{part_number}",
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"model": Message},
+        status.HTTP_404_NOT_FOUND: {"model": Message},
+    },
+)
+@inject
+async def upload_part_handler(
+    upload_id: str,
+    request: Request,
+    part_number: int = Path(ge=1, le=MAX_UPLOAD_PARTS),
+    service_manager: ServiceManager = Depends(
+        Provide[AppContainer.services.service_manager_provider]
+    ),
+):
+    try:
+        result = await service_manager.upload_part(
+            upload_id=upload_id, part_number=part_number, stream=request.stream()
+        )
+
+        return result
+    except UploadSessionNotFoundError:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content=Message(message="The upload does not exist").dict(),
+        )
+    except InvalidUploadPartError as e:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content=Message(message=str(e)).dict(),
+        )
+    except (ValueError, FileWriteError, FileReadError, FileDeletionError):
+        raise HTTPException(
+            status_code=500, detail="Error is on the disk repository layer"
+        )
+    except FileStorageError:
+        raise HTTPException(
+            status_code=500,
+            detail="Error is on the file storage service layer or lower",
+        )
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error is on the controller layer")
+
+
+@router.get(
+    "/uploads/{upload_id}/parts",
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_404_NOT_FOUND: {"model": Message},
+    },
+)
+@inject
+async def list_upload_parts_handler(
+    upload_id: str,
+    service_manager: ServiceManager = Depends(
+        Provide[AppContainer.services.service_manager_provider]
+    ),
+):
+    try:
+        result_lst = await service_manager.list_upload_parts(upload_id=upload_id)
+
+        return result_lst
+    except UploadSessionNotFoundError:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content=Message(message="The upload does not exist").dict(),
+        )
+    except (ValueError, FileWriteError, FileReadError, FileDeletionError):
+        raise HTTPException(
+            status_code=500, detail="Error is on the disk repository layer"
+        )
+    except FileStorageError:
+        raise HTTPException(
+            status_code=500,
+            detail="Error is on the file storage service layer or lower",
+        )
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error is on the controller layer")
+
+
+@router.post(
+    "/uploads/{upload_id}/complete",
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"model": Message},
+        status.HTTP_404_NOT_FOUND: {"model": Message},
+    },
+)
+@inject
+async def complete_upload_handler(
+    upload_id: str,
+    complete_upload: Optional[CompleteUpload] = None,
+    service_manager: ServiceManager = Depends(
+        Provide[AppContainer.services.service_manager_provider]
+    ),
+):
+    try:
+        result = await service_manager.complete_upload(
+            upload_id=upload_id,
+            parts=complete_upload.parts if complete_upload else None,
+        )
+
+        return result
+    except UploadSessionNotFoundError:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content=Message(message="The upload does not exist").dict(),
+        )
+    except InvalidUploadPartError as e:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content=Message(message=str(e)).dict(),
+        )
+    except FileAlreadyExistsError:
+        raise HTTPException(
+            status_code=500, detail="Error is on the disk repository layer"
+        )
+    except (ValueError, FileWriteError, FileReadError, FileDeletionError):
+        raise HTTPException(
+            status_code=500, detail="Error is on the disk repository layer"
+        )
+    except FileStorageError:
+        raise HTTPException(
+            status_code=500,
+            detail="Error is on the file storage service layer or lower",
+        )
+    except ConcurrentModificationError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="File was modified concurrently, retry the upload",
+        )
+    except (SessionNotSetError, MappingError, DatabaseError, AttributeError):
+        raise HTTPException(
+            status_code=500, detail="Error is on the database repository layer"
+        )
+    except DatabaseServiceError:
+        raise HTTPException(
+            status_code=500, detail="Error is on the database service layer or lower"
+        )
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error is on the controller layer")
+
+
+@router.delete(
+    "/uploads/{upload_id}",
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_404_NOT_FOUND: {"model": Message},
+    },
+)
+@inject
+async def abort_upload_handler(
+    upload_id: str,
+    service_manager: ServiceManager = Depends(
+        Provide[AppContainer.services.service_manager_provider]
+    ),
+):
+    try:
+        await service_manager.abort_upload(upload_id=upload_id)
+
+        return Message(message="The upload is aborted")
+    except UploadSessionNotFoundError:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content=Message(message="The upload does not exist").dict(),
+        )
+    except (ValueError, FileWriteError, FileReadError, FileDeletionError):
+        raise HTTPException(
+            status_code=500, detail="Error is on the disk repository layer"
+        )
+    except FileStorageError:
+        raise HTTPException(
+            status_code=500,
+            detail="Error is on the file storage service layer or lower",
+        )
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error is on the controller layer")
+
+
 @router.get("/get", status_code=status.HTTP_200_OK)
-@cache(expire=60)
+@conditional_json
+@next_cursor_header
+@cached(
+    files_cache,
+    stale_while_revalidate=60,
+    lock_timeout=5,
+    ignored_params=("service_manager",),
+)
 @inject
 async def get_files_info_handler(
     params: Dict[str, List] = Depends(get_query_params),
     limit: Optional[int] = None,
     offset: Optional[int] = None,
+    after_id: Optional[int] = Depends(get_cursor),
     service_manager: ServiceManager = Depends(
         Provide[AppContainer.services.service_manager_provider]
     ),
 ):
     try:
         result_lst = await service_manager.get_files_metadata(
-            params=params, limit=limit, offset=offset
+            params=params, limit=limit, offset=offset, after_id=after_id
         )
 
         return result_lst
@@ -158,18 +531,36 @@ async def delete_files_handler(
 @inject
 async def download_file_handler(
     file_id: int,
+    request: Request,
     service_manager: ServiceManager = Depends(
         Provide[AppContainer.services.service_manager_provider]
     ),
+    storage_settings: Dict = Depends(Provide[AppContainer.config.storage]),
 ):
-    payload = await service_manager.download_file(file_id=file_id)
-    if not payload:
-        return JSONResponse(
-            status_code=status.HTTP_404_NOT_FOUND,
-            content=Message(message="The file does not exist").dict(),
-        )
     try:
-        return FileResponse(**payload, headers={"Custom-Message": "OK"})
+        file_metadata = await service_manager.get_file_metadata(file_id=file_id)
+        if not file_metadata:
+            return JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content=Message(message="The file does not exist").dict(),
+            )
+
+        validators = file_validators(file_metadata)
+        if is_not_modified(request.headers, validators):
+            return not_modified_response(validators)
+
+        payload = await service_manager.get_file_payload(file_metadata=file_metadata)
+        if storage_settings["storage_download_mode"] == DOWNLOAD_MODE_X_ACCEL:
+            return AccelRedirectResponse(
+                **payload,
+                storage_dir=storage_settings["storage_dir"],
+                accel_location=storage_settings["storage_accel_location"],
+                headers={"Custom-Message": "OK", **validators},
+            )
+
+        return RangeFileResponse(
+            **payload, headers={"Custom-Message": "OK", **validators}
+        )
     except (ValueError, FileNotFoundError, FileReadError):
         raise HTTPException(
             status_code=500, detail="Error is on the disk repository layer"
@@ -189,3 +580,69 @@ async def download_file_handler(
         )
     except Exception:
         raise HTTPException(status_code=500, detail="Error is on the controller layer")
+
+
+@router.get("/download/archive", status_code=status.HTTP_200_OK)
+@inject
+async def download_archive_handler(
+    params: Dict[str, List] = Depends(get_query_params),
+    archive_format: Literal["zip", "tar"] = Query(ARCHIVE_FORMAT_ZIP, alias="format"),
+    service_manager: ServiceManager = Depends(
+        Provide[AppContainer.services.service_manager_provider]
+    ),
+):
+    stream = service_manager.download_archive(
+        params=params, archive_format=archive_format
+    )
+
+    try:
+        # The first chunk runs the first metadata query, so its errors are
+        # still answered with a status code instead of a truncated archive
+        first_chunk = await anext(stream)
+    except (ValueError, FileNotFoundError, FileReadError, ArchiveError):
+        raise HTTPException(
+            status_code=500, detail="Error is on the disk repository layer"
+        )
+    except FileStorageError:
+        raise HTTPException(
+            status_code=500,
+            detail="Error is on the file storage service layer or lower",
+        )
+    except (SessionNotSetError, MappingError, DatabaseError, AttributeError):
+        raise HTTPException(
+            status_code=500, detail="Error is on the database repository layer"
+        )
+    except DatabaseServiceError:
+        raise HTTPException(
+            status_code=500, detail="Error is on the database service layer"
+        )
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error is on the controller layer")
+
+    async def content() -> AsyncIterator[bytes]:
+        yield first_chunk
+        async for chunk in stream:
+            yield chunk
+
+    return StreamingResponse(
+        content(),
+        media_type=ARCHIVE_MEDIA_TYPES[archive_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="files.{archive_format}"'
+        },
+    )
+
+
+@router.get("/metrics", status_code=status.HTTP_200_OK)
+@inject
+async def metrics_handler(
+    database: Database = Depends(Provide[AppContainer.database.database_provider]),
+    filesystem_executor: FilesystemExecutor = Depends(
+        Provide[AppContainer.repositories.filesystem_executor_provider]
+    ),
+):
+    return {
+        "database": database.get_pool_metrics(),
+        "filesystem": filesystem_executor.get_metrics(),
+        "cache": get_cache_metrics(),
+    }
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, ConfigDict, field_validator
 from pytz import UTC
@@ -27,6 +27,8 @@ class FileMetadata(CustomModel):
     size: int = None
     mimeType: str = None
     modificationTime: Optional[datetime] = None
+    sha256: Optional[str] = None
+    crc32: Optional[int] = None
 
     @field_validator("id")
     @classmethod
@@ -40,6 +42,35 @@ class Message(CustomModel):
     message: str
 
 
+class UploadPart(CustomModel):
+    partNumber: int
+    size: int
+    sha256: str
+    lastModified: datetime
+
+
+class UploadSession(CustomModel):
+    uploadId: str
+    file: FileMetadata
+
+
+class CompletedPart(CustomModel):
+    partNumber: int
+    sha256: str
+
+
+class CompleteUpload(CustomModel):
+    parts: List[CompletedPart]
+
+
+class FileUploadStatus(CustomModel):
+    id: Optional[int] = None
+    name: Optional[str] = None
+    status: Literal["created", "failed"]
+    detail: Optional[str] = None
+    file: Optional[FileMetadata] = None
+
+
 if __name__ == "__main__":
     payload = {"id": -1, "name": "ddd"}
 
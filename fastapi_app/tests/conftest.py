@@ -7,6 +7,7 @@ import pytest
 from dependency_injector import containers, providers
 from httpx import AsyncClient
 
+from fastapi_app.src.cache import files_cache
 from fastapi_app.src.config import DatabaseSettings
 from fastapi_app.src.file_storage.repositories import DiskRepository
 from fastapi_app.src.main import app
@@ -36,7 +37,9 @@ def container(test_storage_dir):
     container = app.container
 
     test_disk_repository_provider = providers.Factory(
-        DiskRepository, storage_dir=test_storage_dir
+        DiskRepository,
+        storage_dir=test_storage_dir,
+        executor=container.repositories.filesystem_executor_provider,
     )
 
     container.repositories.disk_repository_provider.override(
@@ -60,6 +63,7 @@ async def setup_db(database_test):
     assert DatabaseSettings().mode == "TEST"
 
     await database_test.delete_and_create_database()
+    await database_test.dispose()
 
 
 @pytest.fixture(scope="session")
@@ -112,7 +116,7 @@ def example_domains_entities(container: containers.DeclarativeContainer) -> Dict
 
 
 @pytest.fixture(scope="function", autouse=False)
-async def database_with_data(database_test, example_domains_entities):
+async def database_with_data(container, database_test, example_domains_entities):
     example_entities = example_domains_entities["entities"]
 
     await database_test.delete_and_create_database()
@@ -121,7 +125,12 @@ async def database_with_data(database_test, example_domains_entities):
         session.add_all(example_entities)
         await session.commit()
 
+    await files_cache.invalidate()
+    await container.caches.metadata_cache_provider().clear()
+
 
 @pytest.fixture(scope="function", autouse=False)
-async def empty_database(database_test):
+async def empty_database(container, database_test):
     await database_test.delete_and_create_database()
+    await files_cache.invalidate()
+    await container.caches.metadata_cache_provider().clear()
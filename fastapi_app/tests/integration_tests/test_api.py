@@ -1,7 +1,19 @@
+import asyncio
+import hashlib
+import io
 import os
+import tarfile
+import zipfile
+import zlib
 
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastapi_app.src.cache import files_cache
+from fastapi_app.src.db_service.entities import FileOrm
+from fastapi_app.src.file_storage.services import FileStorageService
 
 
 @pytest.mark.usefixtures("test_storage_dir")
@@ -46,10 +58,13 @@ class TestCreateUpdateEndpoint:
         assert response.status_code == 201
 
         data = response.json()
-        assert len(data) == 6
+        assert len(data) == 8
         assert data["id"] == file_id
         assert data["name"] == name + ext
         assert data["tag"] == tag
+        assert data["size"] == len(file[1])
+        assert data["sha256"] == hashlib.sha256(file[1]).hexdigest()
+        assert data["crc32"] == zlib.crc32(file[1])
 
         _, ext = os.path.splitext(file[0])
         file_path_expected = os.path.join(test_storage_dir, name + ext)
@@ -94,10 +109,13 @@ class TestCreateUpdateEndpoint:
         assert response.status_code == 201
 
         data = response.json()
-        assert len(data) == 6
+        assert len(data) == 8
         assert data["id"] == file_id
         assert data["name"] == name + ext
         assert data["tag"] == tag
+        assert data["size"] == len(file[1])
+        assert data["sha256"] == hashlib.sha256(file[1]).hexdigest()
+        assert data["crc32"] == zlib.crc32(file[1])
 
         _, ext = os.path.splitext(file[0])
         file_path_expected = os.path.join(test_storage_dir, name + ext)
@@ -127,6 +145,467 @@ class TestCreateUpdateEndpoint:
         assert response.status_code == 422
 
 
+@pytest.mark.usefixtures("test_storage_dir")
+@pytest.mark.usefixtures("database_with_data")
+class TestFailedCommit:
+    async def test_overwritten_file_kept(
+        self, async_client: AsyncClient, test_storage_dir, monkeypatch
+    ):
+        file_path = os.path.join(test_storage_dir, "failed_commit.txt")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        params = {"file_id": 9, "name": "failed_commit"}
+        response = await async_client.post(
+            url="api/v1/upload",
+            files={"file": ("file.txt", b"Hello, World!")},
+            params=params,
+        )
+        assert response.status_code == 201
+
+        async def commit(self):
+            raise ConnectionError("Connection lost")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(AsyncSession, "commit", commit)
+            response = await async_client.post(
+                url="api/v1/upload",
+                files={"file": ("file.txt", b"New Hello, World!")},
+                params=params,
+            )
+        assert response.status_code == 500
+
+        assert [
+            name for name in os.listdir(test_storage_dir) if "failed_commit" in name
+        ] == ["failed_commit.txt"]
+        assert not [
+            name for name in os.listdir(test_storage_dir) if name.startswith(".")
+        ]
+        response = await async_client.get(url="api/v1/download", params={"file_id": 9})
+        assert response.status_code == 200
+        assert response.content == b"Hello, World!"
+
+    async def test_overwritten_files_kept_on_bulk_upload(
+        self, async_client: AsyncClient, test_storage_dir, monkeypatch
+    ):
+        files = [
+            ("files", ("bulk_commit_a.txt", b"Bulk A", "text/plain")),
+            ("files", ("bulk_commit_b.txt", b"Bulk B", "text/plain")),
+        ]
+        for name in ("21.txt", "22.txt", "23.txt"):
+            file_path = os.path.join(test_storage_dir, name)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        response = await async_client.post(
+            url="api/v1/upload/bulk", files=files, data={"file_id": [21, 22]}
+        )
+        assert [item["status"] for item in response.json()] == ["created"] * 2
+
+        async def commit(self):
+            raise ConnectionError("Connection lost")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(AsyncSession, "commit", commit)
+            response = await async_client.post(
+                url="api/v1/upload/bulk",
+                files=[
+                    ("files", ("bulk_commit_a.txt", b"New Bulk A", "text/plain")),
+                    ("files", ("bulk_commit_c.txt", b"New Bulk C", "text/plain")),
+                ],
+                data={"file_id": [21, 23]},
+            )
+        assert response.status_code == 207
+        assert [item["status"] for item in response.json()] == ["failed"] * 2
+
+        assert sorted(
+            name
+            for name in os.listdir(test_storage_dir)
+            if name in ("21.txt", "22.txt", "23.txt")
+        ) == ["21.txt", "22.txt"]
+        assert not [
+            name for name in os.listdir(test_storage_dir) if name.startswith(".")
+        ]
+        response = await async_client.get(url="api/v1/download", params={"file_id": 21})
+        assert response.content == b"Bulk A"
+
+
+@pytest.mark.usefixtures("test_storage_dir")
+@pytest.mark.usefixtures("database_with_data")
+class TestConcurrentUpload:
+    async def test_last_writer_wins(
+        self, async_client: AsyncClient, test_storage_dir, monkeypatch, caplog
+    ):
+        contents = {"race_a.txt": b"Race A", "race_b.txt": b"Race B"}
+        for name in contents:
+            if os.path.exists(os.path.join(test_storage_dir, name)):
+                os.remove(os.path.join(test_storage_dir, name))
+        publish_file = FileStorageService.publish_file
+        publishes = []
+
+        async def slow_publish_file(self, **kwargs):
+            publishes.append(kwargs["domain_obj"].name)
+            # The first upload holds its row until the other one has read the
+            # row and waits for its lock
+            if len(publishes) == 1:
+                await asyncio.sleep(0.5)
+            return await publish_file(self, **kwargs)
+
+        async def put(name):
+            return await async_client.put(
+                url="api/v1/files/24",
+                content=contents[name],
+                params={"name": os.path.splitext(name)[0]},
+                headers={"X-File-Name": "race.txt"},
+            )
+
+        monkeypatch.setattr(FileStorageService, "publish_file", slow_publish_file)
+        responses = await asyncio.gather(*(put(name) for name in contents))
+
+        assert [response.status_code for response in responses] == [201, 201]
+        assert "Retrying the upsert of id=24" in caplog.text
+        # The upload which lost the race is published after the winner
+        loser, winner = publishes
+        response = await async_client.get(url="api/v1/get", params={"file_id": [24]})
+        assert [item["name"] for item in response.json()] == [winner]
+        assert not os.path.exists(os.path.join(test_storage_dir, loser))
+        response = await async_client.get(url="api/v1/download", params={"file_id": 24})
+        assert response.content == contents[winner]
+
+
+@pytest.mark.usefixtures("test_storage_dir")
+@pytest.mark.usefixtures("database_with_data")
+class TestCreateUpdateFromStreamEndpoint:
+    _url = "api/v1/files/{file_id}"
+
+    @pytest.mark.parametrize(
+        argnames="file_id, name, tag, filename, content",
+        argvalues=[
+            (7, "stream_name", "test_tag", "stream.txt", b"Hello, Stream!"),
+            (2, "new_stream_name", None, "stream.bin", b"New Hello, Stream!"),
+        ],
+    )
+    async def test_successful_file_put(
+        self,
+        async_client: AsyncClient,
+        file_id,
+        name,
+        tag,
+        filename,
+        content,
+        test_storage_dir,
+    ):
+        _, ext = os.path.splitext(filename)
+        params = {"name": name, "tag": tag} if tag else {"name": name}
+
+        response = await async_client.put(
+            url=self._url.format(file_id=file_id),
+            content=content,
+            params=params,
+            headers={"X-File-Name": filename, "Content-Type": "text/plain"},
+        )
+
+        assert response.status_code == 201
+
+        data = response.json()
+        assert data["id"] == file_id
+        assert data["name"] == name + ext
+        assert data["tag"] == tag
+        assert data["size"] == len(content)
+        assert data["mimeType"] == "text/plain"
+
+        file_path_expected = os.path.join(test_storage_dir, name + ext)
+        with open(file_path_expected, "rb") as f:
+            assert f.read() == content
+
+    async def test_chunked_file_put(self, async_client: AsyncClient, test_storage_dir):
+        file_path = os.path.join(test_storage_dir, "chunked_stream.txt")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        chunks = [b"Hello, ", b"Chunked ", b"Stream!"]
+
+        async def body():
+            for chunk in chunks:
+                yield chunk
+
+        response = await async_client.put(
+            url=self._url.format(file_id=8),
+            content=body(),
+            params={"name": "chunked_stream"},
+            headers={"X-File-Name": "stream.txt", "Content-Type": "text/plain"},
+        )
+
+        assert response.status_code == 201
+        assert response.request.headers.get("Transfer-Encoding") == "chunked"
+        assert response.json()["size"] == len(b"".join(chunks))
+
+        response = await async_client.get(url="api/v1/get", params={"file_id": [8]})
+        assert response.json()[0]["size"] == len(b"".join(chunks))
+
+    @pytest.mark.parametrize(
+        argnames="name, filename",
+        argvalues=[
+            ("../x", "stream.txt"),
+            ("..", None),
+            ("sub/x", "stream.txt"),
+            (".uploads", None),
+            (".upload-0123abcd", "stream.part"),
+        ],
+    )
+    async def test_invalid_name_put(
+        self, async_client: AsyncClient, test_storage_dir, name, filename
+    ):
+        headers = {"X-File-Name": filename} if filename else {}
+
+        response = await async_client.put(
+            url=self._url.format(file_id=8),
+            content=b"Hello, Stream!",
+            params={"name": name},
+            headers=headers,
+        )
+
+        assert response.status_code == 422
+        assert not os.path.exists(
+            os.path.join(test_storage_dir, os.path.pardir, "x.txt")
+        )
+
+    async def test_failed_file_put(self, async_client: AsyncClient):
+        response = await async_client.put(
+            url=self._url.format(file_id="invalid_file_id"), content=b"Hello"
+        )
+
+        assert response.status_code == 422
+
+
+@pytest.mark.usefixtures("test_storage_dir")
+@pytest.mark.usefixtures("database_with_data")
+class TestBulkUploadEndpoint:
+    _url = "api/v1/upload/bulk"
+
+    @staticmethod
+    def remove_files(test_storage_dir, *names):
+        # The storage directory outlives the database of the previous test
+        for name in names:
+            file_path = os.path.join(test_storage_dir, name)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    async def test_bulk_upload(self, async_client: AsyncClient, test_storage_dir):
+        self.remove_files(test_storage_dir, "11.txt", "12.txt", "13.pdf")
+        # A row with the name and mime type the item with id=13 gets
+        response = await async_client.post(
+            url="api/v1/upload",
+            files={"file": ("file.pdf", b"Single D", "image/jpeg")},
+            params={"file_id": 30, "name": "13"},
+        )
+        assert response.status_code == 201
+        files = [
+            ("files", ("bulk_a.txt", b"Bulk A", "text/plain")),
+            ("files", ("bulk_b.txt", b"Bulk B", "text/plain")),
+            ("files", ("bulk_c.txt", b"Bulk C", "text/plain")),
+            ("files", ("bulk_d.pdf", b"Bulk D", "image/jpeg")),
+        ]
+
+        response = await async_client.post(
+            url=self._url,
+            files=files,
+            data={"file_id": [11, 12, 11, 13]},
+            params={"tag": "bulk"},
+        )
+
+        assert response.status_code == 207
+
+        data = response.json()
+        assert [item["status"] for item in data] == [
+            "created",
+            "created",
+            "failed",
+            "failed",
+        ]
+        assert data[0]["file"]["name"] == "11.txt"
+        assert data[0]["file"]["tag"] == "bulk"
+        assert data[1]["file"]["sha256"] == hashlib.sha256(b"Bulk B").hexdigest()
+        assert data[2]["detail"] == "Duplicate file id 11"
+        assert data[3]["detail"] == "Error is on the database layer"
+
+        response = await async_client.get(
+            url="api/v1/get", params={"file_id": [11, 12, 13]}
+        )
+        assert [item["id"] for item in response.json()] == [11, 12]
+        with open(os.path.join(test_storage_dir, "12.txt"), "rb") as f:
+            assert f.read() == b"Bulk B"
+        with open(os.path.join(test_storage_dir, "13.pdf"), "rb") as f:
+            assert f.read() == b"Single D"
+
+    async def test_bulk_upload_with_same_filenames(
+        self, async_client: AsyncClient, test_storage_dir
+    ):
+        self.remove_files(test_storage_dir, "41.jpg", "42.jpg")
+        files = [
+            ("files", ("photo.jpg", b"Photo A", "image/jpeg")),
+            ("files", ("photo.jpg", b"Photo B", "image/jpeg")),
+        ]
+
+        response = await async_client.post(
+            url=self._url, files=files, data={"file_id": [41, 42]}
+        )
+
+        assert response.status_code == 207
+        data = response.json()
+        assert [item["status"] for item in data] == ["created", "created"]
+        assert [item["file"]["name"] for item in data] == ["41.jpg", "42.jpg"]
+        with open(os.path.join(test_storage_dir, "42.jpg"), "rb") as f:
+            assert f.read() == b"Photo B"
+
+    async def test_bulk_upload_ids_mismatch(self, async_client: AsyncClient):
+        response = await async_client.post(
+            url=self._url,
+            files=[("files", ("bulk_e.txt", b"Bulk E", "text/plain"))],
+            data={"file_id": [14, 15]},
+        )
+
+        assert response.status_code == 422
+
+
+@pytest.mark.usefixtures("test_storage_dir")
+@pytest.mark.usefixtures("database_with_data")
+class TestTarUploadEndpoint:
+    _url = "api/v1/upload/tar"
+
+    @staticmethod
+    def make_tar(members):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            for name, content in members:
+                tar_info = tarfile.TarInfo(name)
+                tar_info.size = len(content)
+                tar.addfile(tar_info, io.BytesIO(content))
+        return buffer.getvalue()
+
+    async def test_tar_upload(self, async_client: AsyncClient, test_storage_dir):
+        members = [
+            ("16/tar_a.txt", b"Tar A"),
+            ("no_id.txt", b"Tar B"),
+            ("17/tar_c.json", b"{}"),
+        ]
+
+        response = await async_client.post(
+            url=self._url,
+            content=self.make_tar(members),
+            params={"tag": "tar"},
+            headers={"Content-Type": "application/x-tar"},
+        )
+
+        assert response.status_code == 207
+
+        data = response.json()
+        assert [item["status"] for item in data] == ["created", "failed", "created"]
+        assert data[1]["name"] == "no_id.txt"
+        assert data[2]["file"]["mimeType"] == "application/json"
+        assert data[2]["file"]["tag"] == "tar"
+        with open(os.path.join(test_storage_dir, "tar_a.txt"), "rb") as f:
+            assert f.read() == b"Tar A"
+
+    async def test_malformed_tar_upload(self, async_client: AsyncClient):
+        response = await async_client.post(url=self._url, content=b"not a tar" * 100)
+
+        assert response.status_code == 400
+
+
+@pytest.mark.usefixtures("test_storage_dir")
+@pytest.mark.usefixtures("database_with_data")
+class TestUploadSessionEndpoints:
+    _url = "api/v1/uploads"
+
+    async def initiate(self, async_client: AsyncClient, file_id, name):
+        response = await async_client.post(
+            url=self._url,
+            params={"file_id": file_id, "name": name, "tag": "multipart"},
+            headers={"X-File-Name": "video.mp4", "Content-Type": "video/mp4"},
+        )
+        assert response.status_code == 201
+        return response.json()["uploadId"]
+
+    async def test_multipart_upload(self, async_client: AsyncClient, test_storage_dir):
+        upload_id = await self.initiate(async_client, 41, "multipart_a")
+        contents = {1: b"A" * 5000, 2: b"B" * 3000, 3: b"C" * 10}
+
+        responses = await asyncio.gather(
+            *(
+                async_client.put(
+                    url=f"{self._url}/{upload_id}/parts/{part_number}", content=content
+                )
+                for part_number, content in reversed(contents.items())
+            )
+        )
+        assert [response.status_code for response in responses] == [200, 200, 200]
+
+        response = await async_client.get(url=f"{self._url}/{upload_id}/parts")
+        assert response.status_code == 200
+        parts = response.json()
+        assert [(part["partNumber"], part["size"]) for part in parts] == [
+            (1, 5000),
+            (2, 3000),
+            (3, 10),
+        ]
+
+        response = await async_client.post(
+            url=f"{self._url}/{upload_id}/complete",
+            json={
+                "parts": [
+                    {"partNumber": part["partNumber"], "sha256": part["sha256"]}
+                    for part in parts
+                ]
+            },
+        )
+
+        content = b"".join(contents.values())
+        assert response.status_code == 201
+        data = response.json()
+        assert data["id"] == 41
+        assert data["name"] == "multipart_a.mp4"
+        assert data["mimeType"] == "video/mp4"
+        assert data["tag"] == "multipart"
+        assert data["size"] == len(content)
+        assert data["sha256"] == hashlib.sha256(content).hexdigest()
+        with open(os.path.join(test_storage_dir, "multipart_a.mp4"), "rb") as f:
+            assert f.read() == content
+
+        response = await async_client.get(url=f"{self._url}/{upload_id}/parts")
+        assert response.status_code == 404
+
+    async def test_complete_with_missing_part(self, async_client: AsyncClient):
+        upload_id = await self.initiate(async_client, 42, "multipart_b")
+        await async_client.put(url=f"{self._url}/{upload_id}/parts/1", content=b"A")
+
+        response = await async_client.post(
+            url=f"{self._url}/{upload_id}/complete",
+            json={"parts": [{"partNumber": 2, "sha256": "0" * 64}]},
+        )
+
+        assert response.status_code == 400
+
+    async def test_abort_upload(self, async_client: AsyncClient):
+        upload_id = await self.initiate(async_client, 43, "multipart_c")
+        await async_client.put(url=f"{self._url}/{upload_id}/parts/1", content=b"A")
+
+        response = await async_client.delete(url=f"{self._url}/{upload_id}")
+        assert response.status_code == 200
+
+        response = await async_client.post(url=f"{self._url}/{upload_id}/complete")
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize(
+        argnames="part_number, status_code", argvalues=[(1, 404), (0, 422)]
+    )
+    async def test_upload_part_errors(
+        self, async_client: AsyncClient, part_number, status_code
+    ):
+        response = await async_client.put(
+            url=f"{self._url}/{'0' * 32}/parts/{part_number}", content=b"A"
+        )
+
+        assert response.status_code == status_code
+
+
 @pytest.mark.usefixtures("test_storage_dir")
 @pytest.mark.usefixtures("database_with_data")
 class TestGetFilesInfoEndpoint:
@@ -208,6 +687,29 @@ class TestGetFilesInfoEndpoint:
         for data in data_lst:
             assert data["id"] in result_ids
 
+    @pytest.mark.parametrize(argnames="limit", argvalues=[1, 2, 3])
+    async def test_get_files_info_by_cursor(self, async_client: AsyncClient, limit):
+        params = {"file_id": [1, 2, 3, 4], "limit": limit}
+        result_ids = []
+        for _ in range(5):
+            response = await async_client.get(url=self._url, params=params)
+            assert response.status_code == 200
+            result_ids += [data["id"] for data in response.json()]
+
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+            params["cursor"] = cursor
+
+        assert result_ids == [1, 2, 3, 4]
+
+    async def test_get_files_info_invalid_cursor(self, async_client: AsyncClient):
+        response = await async_client.get(
+            url=self._url, params={"cursor": "not-a-cursor"}
+        )
+
+        assert response.status_code == 400
+
 
 @pytest.mark.usefixtures("test_storage_dir")
 @pytest.mark.usefixtures("database_with_data")
@@ -240,6 +742,196 @@ class TestDeleteFilesEndpoint:
         assert response.json() == {"message": "There are no parameters for deletion"}
 
 
+@pytest.mark.usefixtures("test_storage_dir")
+@pytest.mark.usefixtures("database_with_data")
+class TestFilesCacheInvalidation:
+    async def get_files_info(self, async_client: AsyncClient, tag: str):
+        response = await async_client.get(url="api/v1/get", params={"tag": [tag]})
+        assert response.status_code == 200
+        return response.json()
+
+    async def test_upload_invalidates_listing(
+        self, async_client: AsyncClient, test_storage_dir
+    ):
+        tag = "cache_invalidation_tag"
+        file_path = os.path.join(test_storage_dir, "cache_invalidation.txt")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        generation = await files_cache.get_generation()
+        assert await self.get_files_info(async_client, tag) == []
+
+        response = await async_client.post(
+            url="api/v1/upload",
+            files={"file": ("file.txt", b"Hello, World!")},
+            params={"file_id": 7, "name": "cache_invalidation", "tag": tag},
+        )
+
+        assert response.status_code == 201
+        assert await files_cache.get_generation() == generation + 1
+        assert [
+            data["id"] for data in await self.get_files_info(async_client, tag)
+        ] == [7]
+
+    async def test_cached_listing_served_until_write(
+        self, async_client: AsyncClient, database_test, test_storage_dir
+    ):
+        file_path = os.path.join(test_storage_dir, "cache_served.txt")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        assert [
+            data["id"] for data in await self.get_files_info(async_client, "slides")
+        ] == []
+
+        # The row is changed behind the back of the app, which does not
+        # invalidate the cached listing
+        async with database_test.get_session_factory() as session:
+            await session.execute(
+                update(FileOrm).where(FileOrm.id == 4).values(tag="slides")
+            )
+            await session.commit()
+
+        assert await self.get_files_info(async_client, "slides") == []
+
+        response = await async_client.post(
+            url="api/v1/upload",
+            files={"file": ("file.txt", b"Hello, World!")},
+            params={"file_id": 7, "name": "cache_served", "tag": "slides"},
+        )
+
+        assert response.status_code == 201
+        assert [
+            data["id"] for data in await self.get_files_info(async_client, "slides")
+        ] == [4, 7]
+
+    async def test_delete_invalidates_listing(self, async_client: AsyncClient):
+        generation = await files_cache.get_generation()
+        assert len(await self.get_files_info(async_client, "important")) == 2
+
+        response = await async_client.delete(
+            url="api/v1/delete", params={"tag": ["important"]}
+        )
+
+        assert response.status_code == 200
+        assert await files_cache.get_generation() == generation + 1
+        assert await self.get_files_info(async_client, "important") == []
+
+    async def test_delete_of_nothing_keeps_listing(self, async_client: AsyncClient):
+        generation = await files_cache.get_generation()
+
+        response = await async_client.delete(
+            url="api/v1/delete", params={"tag": ["no_such_tag"]}
+        )
+
+        assert response.status_code == 200
+        assert await files_cache.get_generation() == generation
+
+
+@pytest.mark.usefixtures("database_with_data")
+class TestFilesCacheKeys:
+    async def get_checkouts(self, async_client: AsyncClient) -> int:
+        response = await async_client.get(url="api/v1/metrics")
+        return response.json()["database"]["checkouts"]
+
+    @pytest.mark.parametrize(
+        argnames="params_1, params_2",
+        argvalues=[
+            ({"tag": ["important", "ordinary"]}, {"tag": ["ordinary", "important"]}),
+            ({"file_id": [1, 2]}, {"file_id": [2, 1, 2]}),
+            (
+                {"tag": ["important"], "name": ["file1", "file2"]},
+                {"name": ["file2", "file1", "file1"], "tag": ["important"]},
+            ),
+        ],
+    )
+    async def test_equivalent_query_served_from_cache(
+        self, async_client: AsyncClient, params_1, params_2
+    ):
+        response_1 = await async_client.get(url="api/v1/get", params=params_1)
+        checkouts = await self.get_checkouts(async_client)
+        response_2 = await async_client.get(url="api/v1/get", params=params_2)
+
+        assert response_1.status_code == response_2.status_code == 200
+        assert response_2.json() == response_1.json()
+        assert await self.get_checkouts(async_client) == checkouts
+
+    async def test_different_ids_not_served_from_cache(self, async_client: AsyncClient):
+        response_1 = await async_client.get(
+            url="api/v1/get", params={"file_id": [1, 2]}
+        )
+        response_2 = await async_client.get(url="api/v1/get", params={"file_id": [3]})
+
+        assert [item["id"] for item in response_1.json()] == [1, 2]
+        assert [item["id"] for item in response_2.json()] == [3]
+
+    async def test_different_page_not_served_from_cache(
+        self, async_client: AsyncClient
+    ):
+        response_1 = await async_client.get(url="api/v1/get", params={"limit": 1})
+        response_2 = await async_client.get(
+            url="api/v1/get", params={"limit": 1, "offset": 1}
+        )
+
+        assert response_1.status_code == response_2.status_code == 200
+        assert response_1.json() != response_2.json()
+
+
+@pytest.mark.usefixtures("test_storage_dir")
+@pytest.mark.usefixtures("database_with_data")
+class TestMetadataCache:
+    async def get_checkouts(self, async_client: AsyncClient) -> int:
+        response = await async_client.get(url="api/v1/metrics")
+        return response.json()["database"]["checkouts"]
+
+    @pytest.mark.parametrize(argnames="file_id", argvalues=[1, 100])
+    async def test_download_metadata_read_once(
+        self, async_client: AsyncClient, file_id
+    ):
+        first_response = await async_client.get(
+            url="api/v1/download", params={"file_id": file_id}
+        )
+        checkouts = await self.get_checkouts(async_client)
+        response = await async_client.get(
+            url="api/v1/download", params={"file_id": file_id}
+        )
+
+        assert response.status_code == first_response.status_code
+        assert await self.get_checkouts(async_client) == checkouts
+
+    async def test_upload_updates_cached_metadata(
+        self, async_client: AsyncClient, test_storage_dir
+    ):
+        file_path = os.path.join(test_storage_dir, "metadata_cache.txt")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        response = await async_client.get(url="api/v1/download", params={"file_id": 8})
+        assert response.status_code == 404
+
+        response = await async_client.post(
+            url="api/v1/upload",
+            files={"file": ("file.txt", b"Hello, World!")},
+            params={"file_id": 8, "name": "metadata_cache", "tag": "cache"},
+        )
+        assert response.status_code == 201
+
+        response = await async_client.get(url="api/v1/download", params={"file_id": 8})
+        assert response.status_code == 200
+        assert response.content == b"Hello, World!"
+
+    async def test_delete_updates_cached_metadata(self, async_client: AsyncClient):
+        response = await async_client.get(url="api/v1/download", params={"file_id": 1})
+        assert response.status_code != 404
+
+        response = await async_client.delete(
+            url="api/v1/delete", params={"file_id": [1]}
+        )
+        assert response.status_code == 200
+
+        checkouts = await self.get_checkouts(async_client)
+        response = await async_client.get(url="api/v1/download", params={"file_id": 1})
+        assert response.status_code == 404
+        assert await self.get_checkouts(async_client) == checkouts
+
+
 @pytest.mark.usefixtures("test_storage_dir")
 @pytest.mark.usefixtures("database_with_data")
 class TestDownloadFileEndpoint:
@@ -271,3 +963,341 @@ class TestDownloadFileEndpoint:
 
         assert response.status_code == 404
         assert response.json() == {"message": "The file does not exist"}
+
+
+@pytest.mark.usefixtures("test_storage_dir")
+class TestDownloadFileRangeEndpoint:
+    _url = "api/v1/download"
+    _file_id = 100
+    _content = os.urandom(5 * 1024 * 1024 + 123)
+
+    async def upload_large_file(self, async_client: AsyncClient):
+        response = await async_client.post(
+            url="api/v1/upload",
+            files={"file": ("large.bin", self._content)},
+            params={"file_id": self._file_id, "name": "large_file"},
+        )
+        assert response.status_code == 201
+
+    async def test_full_download_accepts_ranges(self, async_client: AsyncClient):
+        await self.upload_large_file(async_client)
+
+        response = await async_client.get(
+            url=self._url, params={"file_id": self._file_id}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["Accept-Ranges"] == "bytes"
+        assert response.content == self._content
+
+    @pytest.mark.parametrize(
+        argnames="range_header, start, end",
+        argvalues=[
+            ("bytes=0-99", 0, 99),
+            ("bytes=3000000-", 3000000, 5 * 1024 * 1024 + 122),
+            ("bytes=-1000", 5 * 1024 * 1024 + 123 - 1000, 5 * 1024 * 1024 + 122),
+            ("bytes=65530-200000", 65530, 200000),
+        ],
+    )
+    async def test_single_range(
+        self, async_client: AsyncClient, range_header, start, end
+    ):
+        await self.upload_large_file(async_client)
+
+        response = await async_client.get(
+            url=self._url,
+            params={"file_id": self._file_id},
+            headers={"Range": range_header},
+        )
+
+        assert response.status_code == 206
+        assert response.headers["Content-Range"] == (
+            f"bytes {start}-{end}/{len(self._content)}"
+        )
+        assert response.headers["Content-Length"] == str(end - start + 1)
+        assert response.content == self._content[start : end + 1]
+
+    async def test_multiple_ranges(self, async_client: AsyncClient):
+        await self.upload_large_file(async_client)
+        ranges = [(0, 9), (1000000, 1100000), (len(self._content) - 10, None)]
+
+        response = await async_client.get(
+            url=self._url,
+            params={"file_id": self._file_id},
+            headers={"Range": "bytes=0-9,1000000-1100000,-10"},
+        )
+
+        assert response.status_code == 206
+        content_type = response.headers["Content-Type"]
+        assert content_type.startswith("multipart/byteranges; boundary=")
+        boundary = content_type.split("boundary=")[1].encode()
+        assert response.headers["Content-Length"] == str(len(response.content))
+
+        parts = response.content.split(b"--" + boundary)
+        assert parts[0] == b""
+        assert parts[-1] == b"--\r\n"
+        for part, (start, end) in zip(parts[1:-1], ranges):
+            part_headers, body = part.split(b"\r\n\r\n", 1)
+            assert body[:-2] == self._content[start : None if end is None else end + 1]
+            assert f"Content-Range: bytes {start}-".encode() in part_headers
+
+    async def test_range_not_satisfiable(self, async_client: AsyncClient):
+        await self.upload_large_file(async_client)
+
+        response = await async_client.get(
+            url=self._url,
+            params={"file_id": self._file_id},
+            headers={"Range": f"bytes={len(self._content)}-"},
+        )
+
+        assert response.status_code == 416
+        assert response.headers["Content-Range"] == f"bytes */{len(self._content)}"
+
+    async def test_stale_if_range_returns_full_file(self, async_client: AsyncClient):
+        await self.upload_large_file(async_client)
+
+        response = await async_client.get(
+            url=self._url,
+            params={"file_id": self._file_id},
+            headers={"Range": "bytes=0-99", "If-Range": '"stale"'},
+        )
+
+        assert response.status_code == 200
+        assert response.content == self._content
+
+
+@pytest.mark.usefixtures("test_storage_dir")
+class TestConditionalRequests:
+    _content = b"Conditional Hello, World!"
+
+    async def test_download_not_modified(self, async_client: AsyncClient):
+        response_post = await async_client.post(
+            url="api/v1/upload",
+            files={"file": ("conditional.txt", self._content)},
+            params={"file_id": 200, "name": "conditional"},
+        )
+        data_post = response_post.json()
+
+        response = await async_client.get(
+            url="api/v1/download", params={"file_id": data_post["id"]}
+        )
+        assert response.status_code == 200
+        assert response.headers["ETag"] == f'"{data_post["sha256"]}"'
+        assert "Last-Modified" in response.headers
+
+        for headers in (
+            {"If-None-Match": response.headers["ETag"]},
+            {"If-Modified-Since": response.headers["Last-Modified"]},
+        ):
+            response_304 = await async_client.get(
+                url="api/v1/download",
+                params={"file_id": data_post["id"]},
+                headers=headers,
+            )
+            assert response_304.status_code == 304
+            assert response_304.content == b""
+            assert response_304.headers["ETag"] == response.headers["ETag"]
+
+        response_changed = await async_client.get(
+            url="api/v1/download",
+            params={"file_id": data_post["id"]},
+            headers={"If-None-Match": '"other"'},
+        )
+        assert response_changed.status_code == 200
+        assert response_changed.content == self._content
+
+    async def test_files_info_not_modified(self, async_client: AsyncClient):
+        await async_client.post(
+            url="api/v1/upload",
+            files={"file": ("conditional.txt", self._content)},
+            params={"file_id": 201, "name": "conditional_info"},
+        )
+        params = {"file_id": [201]}
+
+        response = await async_client.get(url="api/v1/get", params=params)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert not etag.startswith("W/")
+
+        response_304 = await async_client.get(
+            url="api/v1/get", params=params, headers={"If-None-Match": etag}
+        )
+        assert response_304.status_code == 304
+        assert response_304.headers["ETag"] == etag
+
+        await async_client.post(
+            url="api/v1/upload",
+            files={"file": ("conditional.txt", b"Changed")},
+            params={"file_id": 201, "name": "conditional_info_changed"},
+        )
+        response_changed = await async_client.get(
+            url="api/v1/get",
+            params=params,
+            headers={"If-None-Match": etag, "Cache-Control": "no-cache"},
+        )
+        assert response_changed.status_code == 200
+        assert response_changed.headers["ETag"] != etag
+
+
+@pytest.mark.usefixtures("test_storage_dir")
+class TestDownloadFileAccelRedirect:
+    @pytest.fixture(scope="function")
+    def x_accel_mode(self, container, test_storage_dir):
+        storage_settings = container.config.storage()
+        container.config.storage.from_dict(
+            {
+                "storage_download_mode": "x-accel",
+                "storage_dir": test_storage_dir,
+                "storage_accel_location": "/protected-storage/",
+            }
+        )
+        yield
+        container.config.storage.from_dict(storage_settings)
+
+    async def test_download_redirected_to_nginx(
+        self, async_client: AsyncClient, x_accel_mode
+    ):
+        response_post = await async_client.post(
+            url="api/v1/upload",
+            files={"file": ("x accel.txt", b"Hello, nginx!")},
+            params={"file_id": 300, "name": "x accel"},
+        )
+        data_post = response_post.json()
+
+        response = await async_client.get(
+            url="api/v1/download", params={"file_id": data_post["id"]}
+        )
+
+        assert response.status_code == 200
+        assert response.content == b""
+        assert response.headers["X-Accel-Redirect"] == (
+            "/protected-storage/x%20accel.txt"
+        )
+        assert response.headers["Content-Type"].startswith("text/plain")
+        assert response.headers["ETag"] == f'"{data_post["sha256"]}"'
+
+
+@pytest.mark.usefixtures("test_storage_dir")
+@pytest.mark.usefixtures("database_with_data")
+class TestDownloadArchiveEndpoint:
+    _url = "api/v1/download/archive"
+
+    files = [
+        ("files", ("archive_a.txt", b"Archive A", "text/plain")),
+        ("files", ("archive_b.txt", b"Archive B" * 1000, "text/plain")),
+        ("files", ("archive_c.txt", b"Archive C", "text/plain")),
+    ]
+
+    async def upload_files(self, async_client: AsyncClient, test_storage_dir):
+        # The storage directory outlives the database of the previous test
+        for name in ("31.txt", "32.txt", "33.txt"):
+            file_path = os.path.join(test_storage_dir, name)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+        response = await async_client.post(
+            url="api/v1/upload/bulk",
+            files=self.files,
+            data={"file_id": [31, 32, 33]},
+            params={"tag": "archive"},
+        )
+        assert response.status_code == 207
+
+    @pytest.mark.parametrize(
+        argnames="params, result_names",
+        argvalues=[
+            (
+                {"tag": ["archive"]},
+                ["31/31.txt", "32/32.txt", "33/33.txt"],
+            ),
+            ({"file_id": [1, 2, 33]}, ["33/33.txt"]),
+            ({"tag": ["unknown"]}, []),
+        ],
+    )
+    @pytest.mark.parametrize(argnames="archive_format", argvalues=["zip", "tar"])
+    async def test_download_archive(
+        self,
+        async_client: AsyncClient,
+        params,
+        result_names,
+        archive_format,
+        test_storage_dir,
+    ):
+        await self.upload_files(async_client, test_storage_dir)
+        contents = {
+            f"{file_id}/{file_id}.txt": content
+            for file_id, (_, (_, content, _)) in zip([31, 32, 33], self.files)
+        }
+
+        response = await async_client.get(
+            url=self._url, params={**params, "format": archive_format}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-disposition"] == (
+            f'attachment; filename="files.{archive_format}"'
+        )
+
+        if archive_format == "zip":
+            assert response.headers["content-type"] == "application/zip"
+            with zipfile.ZipFile(io.BytesIO(response.content)) as zip_file:
+                result = {name: zip_file.read(name) for name in zip_file.namelist()}
+        else:
+            assert response.headers["content-type"] == "application/x-tar"
+            with tarfile.open(fileobj=io.BytesIO(response.content)) as tar:
+                result = {
+                    member.name: tar.extractfile(member).read()
+                    for member in tar.getmembers()
+                }
+
+        assert list(result) == result_names
+        assert all(result[name] == contents[name] for name in result_names)
+
+    async def test_download_archive_invalid_format(self, async_client: AsyncClient):
+        response = await async_client.get(url=self._url, params={"format": "rar"})
+
+        assert response.status_code == 422
+
+
+class TestMetricsEndpoint:
+    async def test_database_pool_metrics(self, async_client: AsyncClient):
+        response_before = await async_client.get(url="api/v1/metrics")
+        await async_client.get(
+            url="api/v1/get",
+            params={"file_id": [1]},
+            headers={"Cache-Control": "no-cache"},
+        )
+        response_after = await async_client.get(url="api/v1/metrics")
+
+        assert response_before.status_code == 200
+        database_before = response_before.json()["database"]
+        database_after = response_after.json()["database"]
+        assert database_after["checkouts"] > database_before["checkouts"]
+        assert database_after["checked_out"] == 0
+        assert database_after["checkout_time_max"] >= 0
+
+    @pytest.mark.usefixtures("database_with_data")
+    async def test_filesystem_executor_metrics(self, async_client: AsyncClient):
+        response_before = await async_client.get(url="api/v1/metrics")
+        await async_client.get(url="api/v1/download", params={"file_id": 1})
+        response_after = await async_client.get(url="api/v1/metrics")
+
+        assert response_before.status_code == 200
+        filesystem_before = response_before.json()["filesystem"]
+        filesystem_after = response_after.json()["filesystem"]
+        assert filesystem_after["completed"] > filesystem_before["completed"]
+        assert filesystem_after["queued"] == 0
+        assert filesystem_after["running"] == 0
+        assert filesystem_after["wait_time_max"] >= 0
+
+    async def test_cache_tier_metrics(self, async_client: AsyncClient):
+        params = {"tag": [f"metrics-{os.getpid()}"]}
+        await async_client.get(url="api/v1/get", params=params)
+        await async_client.get(url="api/v1/get", params=params)
+        response = await async_client.get(url="api/v1/metrics")
+
+        cache = response.json()["cache"]
+        assert cache["local"]["hits"] > 0
+        assert cache["local"]["entries"] <= cache["local"]["max_entries"]
+        assert {"hits", "misses", "hit_rate"} <= set(cache["redis"])
+        assert cache["coalescing"]["computations"] > 0
@@ -0,0 +1,150 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from fastapi_app.src.archive import (
+    ArchiveEntry,
+    ArchiveError,
+    iter_tar_members,
+    stream_tar,
+    stream_zip,
+)
+
+
+def make_tar(members, tar_format=tarfile.GNU_FORMAT):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w", format=tar_format) as tar:
+        directory = tarfile.TarInfo("directory")
+        directory.type = tarfile.DIRTYPE
+        tar.addfile(directory)
+        for name, content in members:
+            tar_info = tarfile.TarInfo(name)
+            tar_info.size = len(content)
+            tar.addfile(tar_info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+async def iter_chunks(data, chunk_size):
+    for i in range(0, len(data), chunk_size):
+        yield data[i : i + chunk_size]
+
+
+class TestIterTarMembers:
+    members = [
+        ("1/empty.txt", b""),
+        ("2/hello.txt", b"Hello, World!"),
+        ("3/" + "long_name" * 20 + ".bin", bytes(range(256)) * 10),
+        ("4/block.bin", b"x" * 512),
+    ]
+
+    @pytest.mark.parametrize(
+        argnames="tar_format", argvalues=[tarfile.GNU_FORMAT, tarfile.PAX_FORMAT]
+    )
+    @pytest.mark.parametrize(argnames="chunk_size", argvalues=[1, 100, 512, 1 << 20])
+    async def test_members(self, tar_format, chunk_size):
+        data = make_tar(self.members, tar_format=tar_format)
+
+        result = []
+        async for name, size, content in iter_tar_members(
+            iter_chunks(data, chunk_size)
+        ):
+            body = b"".join([chunk async for chunk in content])
+            assert size == len(body)
+            result.append((name, body))
+
+        assert result == self.members
+
+    async def test_unconsumed_content_is_skipped(self):
+        data = make_tar(self.members)
+
+        names = [name async for name, _, _ in iter_tar_members(iter_chunks(data, 100))]
+
+        assert names == [name for name, _ in self.members]
+
+    async def test_truncated_stream(self):
+        data = make_tar(self.members)[:2000]
+
+        with pytest.raises(ArchiveError):
+            async for _, _, content in iter_tar_members(iter_chunks(data, 100)):
+                async for _ in content:
+                    pass
+
+    async def test_malformed_header(self):
+        with pytest.raises(ArchiveError):
+            async for _ in iter_tar_members(iter_chunks(b"not a tar" * 100, 100)):
+                pass
+
+
+async def iter_entries(members, mtime=1700000000):
+    for name, content in members:
+        yield ArchiveEntry(
+            name=name,
+            size=len(content),
+            mtime=mtime,
+            content=iter_chunks(content, 100),
+        )
+
+
+class TestStreamArchive:
+    members = [
+        ("1/empty.txt", b""),
+        ("2/hello.txt", b"Hello, World!"),
+        ("3/" + "long_name" * 20 + ".bin", bytes(range(256)) * 10),
+        ("4/block.bin", b"x" * 512),
+    ]
+
+    async def test_stream_tar(self):
+        data = b"".join(
+            [chunk async for chunk in stream_tar(iter_entries(self.members))]
+        )
+
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            result = [
+                (member.name, tar.extractfile(member).read(), member.mtime)
+                for member in tar.getmembers()
+            ]
+
+        assert result == [(name, content, 1700000000) for name, content in self.members]
+
+    async def test_stream_tar_is_read_back(self):
+        stream = stream_tar(iter_entries(self.members))
+
+        result = []
+        async for name, _, content in iter_tar_members(stream):
+            result.append((name, b"".join([chunk async for chunk in content])))
+
+        assert result == self.members
+
+    @pytest.mark.parametrize(argnames="mtime", argvalues=[0, 1700000000])
+    async def test_stream_zip(self, mtime):
+        data = b"".join(
+            [chunk async for chunk in stream_zip(iter_entries(self.members, mtime))]
+        )
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
+            assert zip_file.testzip() is None
+            result = [
+                (zip_info.filename, zip_file.read(zip_info))
+                for zip_info in zip_file.infolist()
+            ]
+
+        assert result == self.members
+
+    @pytest.mark.parametrize(
+        argnames="stream_archive", argvalues=[stream_tar, stream_zip]
+    )
+    @pytest.mark.parametrize(argnames="size", argvalues=[5, 20])
+    async def test_size_mismatch(self, stream_archive, size):
+        async def iter_wrong_entries():
+            yield ArchiveEntry(
+                name="1/file.txt",
+                size=size,
+                mtime=0,
+                content=iter_chunks(b"Hello, World!", 4),
+            )
+
+        with pytest.raises(ArchiveError):
+            async for _ in stream_archive(iter_wrong_entries()):
+                pass
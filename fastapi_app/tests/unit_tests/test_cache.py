@@ -0,0 +1,499 @@
+import asyncio
+import time
+import uuid
+
+import aioredis
+import pytest
+from fastapi_cache import FastAPICache
+from starlette.requests import Request
+from starlette.responses import Response
+
+from fastapi_app.src import cache
+from fastapi_app.src.cache import (
+    CacheNamespace,
+    FileMetadataCache,
+    LocalCache,
+    SingleFlight,
+    TieredBackend,
+    cached,
+)
+from fastapi_app.src.config import RedisSettings
+from fastapi_app.src.schemas import FileMetadata
+
+
+def handler():
+    pass
+
+
+@pytest.fixture
+def cache_namespace():
+    return CacheNamespace(f"test-{uuid.uuid4().hex}")
+
+
+@pytest.fixture
+async def redis():
+    redis = aioredis.from_url(url=RedisSettings().url)
+    yield redis
+    await redis.close()
+
+
+class TestLocalCache:
+    @pytest.mark.parametrize(
+        argnames="max_entries, num_entries, num_evicted",
+        argvalues=[(1, 1, 0), (2, 5, 3), (10, 5, 0)],
+    )
+    def test_least_recently_used_evicted(self, max_entries, num_entries, num_evicted):
+        local_cache = LocalCache(max_entries=max_entries, ttl=60)
+        for i in range(num_entries):
+            local_cache.set(f"key{i}", f"value{i}")
+            # Reading the first key keeps it among the most recently used
+            local_cache.get("key0")
+
+        assert len(local_cache) == num_entries - num_evicted
+        assert local_cache.evictions == num_evicted
+        assert local_cache.get("key0").value == "value0"
+        assert local_cache.get(f"key{num_entries - 1}") is not None
+
+    @pytest.mark.parametrize(
+        argnames="remote_ttl, expected",
+        argvalues=[(None, "value"), (60, "value"), (0, None)],
+    )
+    def test_entry_expires(self, monkeypatch, remote_ttl, expected):
+        local_cache = LocalCache(max_entries=10, ttl=5)
+        local_cache.set("key", "value", remote_ttl=remote_ttl)
+
+        assert getattr(local_cache.get("key"), "value", None) == expected
+
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + 5)
+        assert local_cache.get("key") is None
+        assert len(local_cache) == 0
+
+    def test_delete_prefix(self):
+        local_cache = LocalCache(max_entries=10, ttl=60)
+        for key in ("a:1", "a:2", "b:1"):
+            local_cache.set(key, "value")
+
+        assert local_cache.delete_prefix("a:") == 2
+        assert local_cache.get("b:1") is not None
+
+    @pytest.mark.parametrize(
+        argnames="max_entries, ttl",
+        argvalues=[(0, 5), (10, 0)],
+    )
+    def test_invalid_settings(self, max_entries, ttl):
+        with pytest.raises(ValueError):
+            LocalCache(max_entries=max_entries, ttl=ttl)
+
+
+class TestTieredBackend:
+    async def test_hits_counted_per_tier(self, redis):
+        key = f"test-{uuid.uuid4().hex}"
+        backend = TieredBackend(redis, max_entries=10, ttl=60)
+        await backend.set(key, "value", expire=60)
+
+        assert await backend.get_with_ttl(key) == (60, "value")
+
+        other_backend = TieredBackend(redis, max_entries=10, ttl=60)
+        assert await other_backend.get(key) == b"value"
+        assert await other_backend.get(key) == b"value"
+        assert await other_backend.get(f"missing-{key}") is None
+
+        assert backend.get_metrics()["local"]["hits"] == 1
+        metrics = other_backend.get_metrics()
+        assert metrics["local"]["hits"] == 1
+        assert metrics["local"]["misses"] == 2
+        assert metrics["redis"]["hits"] == 1
+        assert metrics["redis"]["misses"] == 1
+        assert metrics["redis"]["hit_rate"] == 0.5
+
+    async def test_invalidation_reaches_other_workers(self, redis):
+        prefix = f"test-{uuid.uuid4().hex}:"
+        channel = f"test-channel-{uuid.uuid4().hex}"
+        workers = [
+            TieredBackend(redis, max_entries=10, ttl=60, channel=channel)
+            for _ in range(2)
+        ]
+        for worker in workers:
+            worker.start()
+        await asyncio.sleep(0.1)
+
+        for worker in workers:
+            await worker.set(f"{prefix}key", "value", expire=60)
+        await redis.set(f"{prefix}key", "new value")
+        await workers[0].invalidate(prefix)
+
+        for _ in range(50):
+            if workers[1].get_metrics()["local"]["entries"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        for worker in workers:
+            assert await worker.get(f"{prefix}key") == b"new value"
+            await worker.stop()
+
+
+class TestCacheNamespace:
+    async def test_new_namespace_generation(self, cache_namespace):
+        assert await cache_namespace.get_generation() == 0
+
+    @pytest.mark.parametrize(argnames="num_invalidations", argvalues=[1, 3])
+    async def test_invalidate_bumps_generation(
+        self, cache_namespace, num_invalidations
+    ):
+        for _ in range(num_invalidations):
+            await cache_namespace.invalidate()
+
+        assert await cache_namespace.get_generation() == num_invalidations
+
+    async def test_key_changes_only_on_invalidation(self, cache_namespace):
+        kwargs = {"params": {"tag": ["a"]}, "limit": None}
+        key = await cache_namespace.key_builder(
+            handler, cache_namespace.name, kwargs=kwargs
+        )
+
+        assert key == await cache_namespace.key_builder(
+            handler, cache_namespace.name, kwargs=kwargs
+        )
+        assert f":{cache_namespace.name}:0:" in key
+
+        await cache_namespace.invalidate()
+
+        new_key = await cache_namespace.key_builder(
+            handler, cache_namespace.name, kwargs=kwargs
+        )
+        assert new_key != key
+        assert f":{cache_namespace.name}:1:" in new_key
+
+    @pytest.mark.parametrize(
+        argnames="kwargs_1, kwargs_2",
+        argvalues=[
+            (
+                {"params": {"tag": ["a", "b"]}},
+                {"params": {"tag": ["b", "a", "a"]}},
+            ),
+            (
+                {"params": {"id": [2, 1], "name": None}, "limit": None},
+                {"params": {"id": [1, 2]}},
+            ),
+            (
+                {"params": {"tag": ["a"], "name": ["x"]}, "offset": 0},
+                {"offset": 0, "params": {"name": ["x"], "tag": ["a"]}},
+            ),
+        ],
+    )
+    async def test_equivalent_params_share_key(
+        self, cache_namespace, kwargs_1, kwargs_2
+    ):
+        key = await cache_namespace.key_builder(
+            handler, cache_namespace.name, kwargs=kwargs_1
+        )
+
+        assert key == await cache_namespace.key_builder(
+            handler, cache_namespace.name, kwargs=kwargs_2
+        )
+
+    @pytest.mark.parametrize(
+        argnames="kwargs_1, kwargs_2",
+        argvalues=[
+            ({"params": {"tag": ["a"]}}, {"params": {"tag": ["a", "b"]}}),
+            ({"params": {"id": [1]}}, {"params": {"id": ["1"]}}),
+            ({"params": {"tag": ["a"]}}, {"params": {"name": ["a"]}}),
+            ({"limit": 10}, {"limit": 20}),
+            ({"limit": 10}, {"limit": 10, "offset": 10}),
+        ],
+    )
+    async def test_different_params_have_different_keys(
+        self, cache_namespace, kwargs_1, kwargs_2
+    ):
+        key = await cache_namespace.key_builder(
+            handler, cache_namespace.name, kwargs=kwargs_1
+        )
+
+        assert key != await cache_namespace.key_builder(
+            handler, cache_namespace.name, kwargs=kwargs_2
+        )
+
+    async def test_key_not_reused_without_generation(
+        self, cache_namespace, monkeypatch
+    ):
+        async def get_generation():
+            raise ConnectionError("Redis is down")
+
+        monkeypatch.setattr(cache_namespace, "get_generation", get_generation)
+
+        key = await cache_namespace.key_builder(handler, cache_namespace.name)
+
+        assert key != await cache_namespace.key_builder(handler, cache_namespace.name)
+
+    async def test_invalidate_without_redis(self, cache_namespace, monkeypatch):
+        monkeypatch.setattr(
+            CacheNamespace, "generation_key", property(lambda self: 1 / 0)
+        )
+
+        await cache_namespace.invalidate()
+
+
+@pytest.fixture
+def metadata_cache():
+    return FileMetadataCache(namespace=f"test-{uuid.uuid4().hex}")
+
+
+class TestFileMetadataCache:
+    file_metadata = FileMetadata(id=1, name="file1.txt", mimeType="text/plain")
+    new_file_metadata = FileMetadata(id=1, name="new_file1.txt", mimeType="text/plain")
+
+    async def test_miss(self, metadata_cache):
+        assert await metadata_cache.get(1) == (False, None)
+
+    @pytest.mark.parametrize(
+        argnames="metadata",
+        argvalues=[file_metadata, None],
+    )
+    async def test_fill(self, metadata_cache, metadata):
+        await metadata_cache.fill(1, metadata)
+
+        assert await metadata_cache.get(1) == (True, metadata)
+        assert await metadata_cache.get(12) == (False, None)
+
+    async def test_fill_does_not_overwrite_write(self, metadata_cache):
+        await metadata_cache.put({1: self.new_file_metadata})
+        await metadata_cache.fill(1, self.file_metadata)
+
+        assert await metadata_cache.get(1) == (True, self.new_file_metadata)
+
+    @pytest.mark.parametrize(
+        argnames="metadata",
+        argvalues=[new_file_metadata, None],
+    )
+    async def test_put_overwrites_read(self, metadata_cache, metadata):
+        await metadata_cache.fill(1, self.file_metadata)
+        await metadata_cache.put({1: metadata})
+
+        assert await metadata_cache.get(1) == (True, metadata)
+
+    async def test_evict(self, metadata_cache):
+        await metadata_cache.put({1: self.file_metadata, 2: None})
+        await metadata_cache.evict([1, 2])
+
+        assert await metadata_cache.get(1) == (False, None)
+        assert await metadata_cache.get(2) == (False, None)
+
+    async def test_clear(self, metadata_cache):
+        await metadata_cache.put({1: self.file_metadata, 2: None})
+        await metadata_cache.clear()
+
+        assert await metadata_cache.get(1) == (False, None)
+        assert await metadata_cache.get(2) == (False, None)
+
+
+class TestSingleFlight:
+    @pytest.mark.parametrize(argnames="num_callers", argvalues=[1, 10])
+    async def test_concurrent_callers_share_computation(self, num_callers):
+        single_flight = SingleFlight()
+        num_computations = 0
+
+        async def compute():
+            nonlocal num_computations
+            num_computations += 1
+            await asyncio.sleep(0.01)
+            return "value"
+
+        results = await asyncio.gather(
+            *(single_flight.run("key", compute) for _ in range(num_callers))
+        )
+
+        assert results == ["value"] * num_callers
+        assert num_computations == 1
+        assert single_flight.coalesced == num_callers - 1
+        assert await single_flight.run("key", compute) == "value"
+        assert num_computations == 2
+
+    async def test_error_raised_to_all_callers(self):
+        single_flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise ValueError("Mocked error")
+
+        results = await asyncio.gather(
+            *(single_flight.run("key", compute) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+        assert all(isinstance(result, ValueError) for result in results)
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        single_flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "value"
+
+        first_caller = asyncio.create_task(single_flight.run("key", compute))
+        await asyncio.sleep(0)
+        second_caller = asyncio.create_task(single_flight.run("key", compute))
+        await asyncio.sleep(0)
+        first_caller.cancel()
+
+        assert await second_caller == "value"
+
+
+def get_request(headers=None) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "query_string": b"",
+            "headers": [
+                (name.lower().encode(), value.encode())
+                for name, value in (headers or {}).items()
+            ],
+        }
+    )
+
+
+class TestCached:
+    @pytest.fixture
+    def handler(self):
+        calls = []
+
+        async def handler(tag: str):
+            calls.append(tag)
+            await asyncio.sleep(0.01)
+            return {"tag": tag, "call": len(calls)}
+
+        handler.calls = calls
+        return handler
+
+    @pytest.fixture
+    def namespace(self):
+        return CacheNamespace(f"test-{uuid.uuid4().hex}")
+
+    async def test_concurrent_misses_computed_once(self, handler, namespace):
+        cached_handler = cached(namespace, expire=60)(handler)
+
+        results = await asyncio.gather(
+            *(
+                cached_handler(tag="a", request=get_request(), response=Response())
+                for _ in range(10)
+            )
+        )
+
+        assert results == [{"tag": "a", "call": 1}] * 10
+        assert handler.calls == ["a"]
+
+    async def test_ignored_params_not_in_key(self, handler, namespace):
+        cached_handler = cached(namespace, expire=60, ignored_params=("service",))(
+            lambda tag, service: handler(tag=tag)
+        )
+
+        for service in (object(), object()):
+            await cached_handler(
+                tag="a", service=service, request=get_request(), response=Response()
+            )
+
+        assert handler.calls == ["a"]
+
+    async def test_no_cache_request_computed(self, handler, namespace):
+        cached_handler = cached(namespace, expire=60)(handler)
+
+        for _ in range(2):
+            await cached_handler(
+                tag="a",
+                request=get_request({"Cache-Control": "no-cache"}),
+                response=Response(),
+            )
+
+        assert handler.calls == ["a", "a"]
+
+    async def test_stale_value_served_while_revalidated(
+        self, handler, namespace, monkeypatch
+    ):
+        cached_handler = cached(namespace, expire=1, stale_while_revalidate=60)(handler)
+        await cached_handler(tag="a", request=get_request(), response=Response())
+
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 2)
+        response = Response()
+        result = await cached_handler(tag="a", request=get_request(), response=response)
+
+        assert result == {"tag": "a", "call": 1}
+        assert response.headers["Cache-Control"] == "max-age=0"
+
+        await asyncio.sleep(0.1)
+        response = Response()
+        result = await cached_handler(tag="a", request=get_request(), response=response)
+
+        assert result == {"tag": "a", "call": 2}
+        assert response.headers["Cache-Control"] == "max-age=1"
+        assert handler.calls == ["a", "a"]
+
+    async def test_value_of_lock_holder_awaited(self, handler, namespace):
+        cached_handler = cached(namespace, expire=60, lock_timeout=5)(handler)
+        key = await namespace.key_builder(
+            handler, namespace.name, args=(), kwargs={"tag": "a"}
+        )
+        redis = FastAPICache.get_backend().redis
+        await redis.set(f"{key}:lock", "other worker", ex=5)
+
+        async def other_worker():
+            await asyncio.sleep(0.1)
+            await redis.set(
+                key, cache._encode_cached_value({"tag": "a"}, time.time() + 60)
+            )
+
+        result, _ = await asyncio.gather(
+            cached_handler(tag="a", request=get_request(), response=Response()),
+            other_worker(),
+        )
+
+        assert result == {"tag": "a"}
+        assert handler.calls == []
+        await redis.delete(f"{key}:lock")
+
+    async def test_lock_holder_shares_key_despite_ignored_params(
+        self, handler, namespace
+    ):
+        cached_handler = cached(
+            namespace, expire=60, lock_timeout=5, ignored_params=("service",)
+        )(lambda tag, service: handler(tag=tag))
+        # The key of another worker, whose service is another object
+        key = await namespace.key_builder(
+            cached_handler.__wrapped__, namespace.name, args=(), kwargs={"tag": "a"}
+        )
+        redis = FastAPICache.get_backend().redis
+        await redis.set(f"{key}:lock", "other worker", ex=5)
+
+        async def other_worker():
+            await asyncio.sleep(0.1)
+            await redis.set(
+                key, cache._encode_cached_value({"tag": "a"}, time.time() + 60)
+            )
+
+        result, _ = await asyncio.gather(
+            cached_handler(
+                tag="a", service=object(), request=get_request(), response=Response()
+            ),
+            other_worker(),
+        )
+
+        assert result == {"tag": "a"}
+        assert handler.calls == []
+        await redis.delete(f"{key}:lock")
+
+    async def test_computed_when_lock_holder_too_slow(self, handler, namespace):
+        cached_handler = cached(namespace, expire=60, lock_timeout=0.2)(handler)
+        key = await namespace.key_builder(
+            handler, namespace.name, args=(), kwargs={"tag": "a"}
+        )
+        redis = FastAPICache.get_backend().redis
+        await redis.set(f"{key}:lock", "other worker", ex=5)
+
+        result = await cached_handler(
+            tag="a", request=get_request(), response=Response()
+        )
+
+        assert result == {"tag": "a", "call": 1}
+        assert await redis.get(f"{key}:lock") == b"other worker"
+        await redis.delete(f"{key}:lock")
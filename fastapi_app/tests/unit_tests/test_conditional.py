@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+from starlette.datastructures import Headers
+
+from fastapi_app.src.conditional import file_validators, is_not_modified
+from fastapi_app.src.schemas import FileMetadata
+
+modification_time = datetime(2024, 2, 1, 12, 30, 15, 123456)
+
+
+class TestFileValidators:
+    @pytest.mark.parametrize(
+        argnames="metadata, validators_expected",
+        argvalues=[
+            (
+                FileMetadata(
+                    id=1,
+                    name="a.txt",
+                    sha256="ab" * 32,
+                    modificationTime=modification_time,
+                ),
+                {
+                    "etag": f'"{"ab" * 32}"',
+                    "last-modified": "Thu, 01 Feb 2024 12:30:15 GMT",
+                },
+            ),
+            (
+                FileMetadata(id=1, name="a.txt", modificationTime=modification_time),
+                {
+                    "etag": '"1-1706790615.123456"',
+                    "last-modified": "Thu, 01 Feb 2024 12:30:15 GMT",
+                },
+            ),
+            (FileMetadata(id=1, name="a.txt"), {}),
+        ],
+    )
+    def test_file_validators(self, metadata, validators_expected):
+        assert file_validators(metadata) == validators_expected
+
+
+class TestIsNotModified:
+    validators = {"etag": '"abc"', "last-modified": "Thu, 01 Feb 2024 12:30:15 GMT"}
+
+    @pytest.mark.parametrize(
+        argnames="request_headers, not_modified_expected",
+        argvalues=[
+            ({}, False),
+            ({"if-none-match": '"abc"'}, True),
+            ({"if-none-match": 'W/"abc"'}, True),
+            ({"if-none-match": '"xyz", "abc"'}, True),
+            ({"if-none-match": "*"}, True),
+            ({"if-none-match": '"xyz"'}, False),
+            (
+                {
+                    "if-none-match": '"xyz"',
+                    "if-modified-since": "Thu, 01 Feb 2024 12:30:15 GMT",
+                },
+                False,
+            ),
+            ({"if-modified-since": "Thu, 01 Feb 2024 12:30:15 GMT"}, True),
+            ({"if-modified-since": "Fri, 02 Feb 2024 00:00:00 GMT"}, True),
+            ({"if-modified-since": "Thu, 01 Feb 2024 12:30:14 GMT"}, False),
+            ({"if-modified-since": "not a date"}, False),
+        ],
+    )
+    def test_is_not_modified(self, request_headers, not_modified_expected):
+        assert (
+            is_not_modified(Headers(request_headers), self.validators)
+            == not_modified_expected
+        )
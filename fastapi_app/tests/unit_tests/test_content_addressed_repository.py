@@ -0,0 +1,267 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from unittest.mock import Mock
+
+import pytest
+
+from fastapi_app.src.db_service.repositories import BlobReferenceRepository
+from fastapi_app.src.db_service.services import BlobReferenceService, DatabaseService
+from fastapi_app.src.file_storage.exceptions import FileWriteError
+from fastapi_app.src.file_storage.repositories import ContentAddressedRepository
+from fastapi_app.src.schemas import FileMetadata
+
+HELLO_SHA256 = "dffd6021bb2bd5b0af676290809ec3a53191dd81c7f70a4b28688a362182986f"
+
+
+async def stream_of(*chunks):
+    for chunk in chunks:
+        if isinstance(chunk, Exception):
+            raise chunk
+        yield chunk
+
+
+def blob_files(storage_dir):
+    return [
+        file_name
+        for _, _, file_names in os.walk(storage_dir)
+        for file_name in file_names
+    ]
+
+
+@pytest.fixture(scope="function")
+def blob_reference_service():
+    """Reference counts are written by the metadata transactions, which the
+    tests without a database set directly in ref_counts."""
+    ref_counts = {}
+
+    @asynccontextmanager
+    async def lock_blob(sha256):
+        yield ref_counts.get(sha256, 0)
+
+    service = Mock()
+    service.lock_blob.side_effect = lock_blob
+    service.ref_counts = ref_counts
+    return service
+
+
+class TestContentAddressedRepository:
+    async def test_identical_files_share_one_blob(
+        self, tmp_path, blob_reference_service
+    ):
+        repository = ContentAddressedRepository(
+            storage_dir=str(tmp_path), blob_reference_service=blob_reference_service
+        )
+        file_metadata_1 = FileMetadata(id=1, name="file1.txt", mimeType="text/plain")
+        file_metadata_2 = FileMetadata(id=2, name="file2.txt", mimeType="text/plain")
+
+        result_1 = await repository.write_stream(
+            stream=stream_of(b"Hello, ", b"World!"), domain_obj=file_metadata_1
+        )
+        result_2 = await repository.write_stream(
+            stream=stream_of(b"Hello, World!"), domain_obj=file_metadata_2
+        )
+
+        assert result_1.sha256 == result_2.sha256 == HELLO_SHA256
+        assert result_1.size == result_2.size == len(b"Hello, World!")
+        assert blob_files(tmp_path) == [HELLO_SHA256]
+
+        payload = await repository.read_file(domain_obj=result_2)
+        assert payload["filename"] == "file2.txt"
+        with open(payload["path"], "rb") as f:
+            assert f.read() == b"Hello, World!"
+
+    async def test_blob_removed_with_last_reference(
+        self, tmp_path, blob_reference_service
+    ):
+        repository = ContentAddressedRepository(
+            storage_dir=str(tmp_path), blob_reference_service=blob_reference_service
+        )
+        results = [
+            await repository.write_stream(
+                stream=stream_of(b"Hello, World!"),
+                domain_obj=FileMetadata(id=i, name=f"file{i}.txt"),
+            )
+            for i in range(1, 3)
+        ]
+
+        blob_reference_service.ref_counts[HELLO_SHA256] = 1
+        await repository.delete_file(domain_obj=results[0])
+        assert blob_files(tmp_path) == [HELLO_SHA256]
+
+        blob_reference_service.ref_counts[HELLO_SHA256] = 0
+        await repository.delete_file(domain_obj=results[1])
+        assert blob_files(tmp_path) == []
+
+        with pytest.raises(FileNotFoundError):
+            await repository.read_file(domain_obj=results[1])
+
+    async def test_replacing_file_releases_old_blob(
+        self, tmp_path, blob_reference_service
+    ):
+        repository = ContentAddressedRepository(
+            storage_dir=str(tmp_path), blob_reference_service=blob_reference_service
+        )
+        old_result = await repository.write_stream(
+            stream=stream_of(b"Hello, World!"),
+            domain_obj=FileMetadata(id=1, name="file1.txt"),
+        )
+
+        new_result = await repository.write_stream(
+            stream=stream_of(b"New Hello, World!"),
+            domain_obj=FileMetadata(id=1, name="file1.txt"),
+            replaces=old_result,
+        )
+
+        assert blob_files(tmp_path) == [new_result.sha256]
+
+    async def test_failed_stream_leaves_nothing_behind(
+        self, tmp_path, blob_reference_service
+    ):
+        repository = ContentAddressedRepository(
+            storage_dir=str(tmp_path), blob_reference_service=blob_reference_service
+        )
+
+        with pytest.raises(FileWriteError):
+            await repository.write_stream(
+                stream=stream_of(b"Hello, ", ConnectionError("disconnect")),
+                domain_obj=FileMetadata(id=1, name="file1.txt"),
+            )
+
+        assert blob_files(tmp_path) == []
+        blob_reference_service.lock_blob.assert_not_called()
+
+
+@pytest.fixture(scope="function")
+def database_service(container, database_test):
+    return DatabaseService(
+        repository=container.repositories.file_metadata_repository_provider(),
+        async_session_factory=database_test.get_session_factory,
+        blob_repository=BlobReferenceRepository(),
+    )
+
+
+@pytest.fixture(scope="function")
+def repository(tmp_path, database_test):
+    return ContentAddressedRepository(
+        storage_dir=str(tmp_path),
+        blob_reference_service=BlobReferenceService(
+            repository=BlobReferenceRepository(),
+            async_session_factory=database_test.get_session_factory,
+        ),
+    )
+
+
+@pytest.mark.usefixtures("empty_database")
+class TestBlobReferencesInMetadataTransaction:
+    @staticmethod
+    async def upload(database_service, repository, file_id, content, **kwargs):
+        metadata = FileMetadata(
+            id=file_id, name=f"file{file_id}.txt", mimeType="text/plain"
+        )
+        temp_file = await repository.stage_stream(
+            stream=stream_of(content), domain_obj=metadata
+        )
+        try:
+            metadata = metadata.model_copy(update=temp_file.checksums())
+            async with database_service.upsert_file_metadata(metadata=metadata) as (
+                result,
+                previous,
+            ):
+                await repository.publish_file(
+                    temp_file=temp_file, domain_obj=metadata, replaces=previous
+                )
+                if "inside" in kwargs:
+                    await kwargs["inside"]()
+        finally:
+            await repository.discard_file(temp_file=temp_file)
+
+        await repository.delete_replaced_file(domain_obj=result, replaces=previous)
+        return result
+
+    @staticmethod
+    async def get_ref_count(database_test, sha256):
+        blob_repository = BlobReferenceRepository()
+        async with database_test.get_session_factory() as session:
+            blob_repository.set_session(session)
+            return await blob_repository.select_ref_count(sha256=sha256)
+
+    async def test_references_follow_metadata(
+        self, tmp_path, database_test, database_service, repository
+    ):
+        result_1 = await self.upload(database_service, repository, 1, b"Hello, World!")
+        await self.upload(database_service, repository, 2, b"Hello, World!")
+        assert await self.get_ref_count(database_test, HELLO_SHA256) == 2
+
+        result_3 = await self.upload(
+            database_service, repository, 1, b"New Hello, World!"
+        )
+        assert await self.get_ref_count(database_test, HELLO_SHA256) == 1
+        assert await self.get_ref_count(database_test, result_3.sha256) == 1
+
+        removed = await database_service.remove_file_metadata(params={"id": [2]})
+        for metadata in removed:
+            await repository.delete_file(domain_obj=metadata)
+
+        assert await self.get_ref_count(database_test, HELLO_SHA256) == 0
+        assert blob_files(tmp_path) == [result_3.sha256]
+        with pytest.raises(FileNotFoundError):
+            await repository.read_file(domain_obj=result_1)
+
+    async def test_rolled_back_upload_not_counted(
+        self, tmp_path, database_test, database_service, repository
+    ):
+        async def fail():
+            raise RuntimeError("commit failed")
+
+        with pytest.raises(RuntimeError):
+            await self.upload(
+                database_service, repository, 1, b"Hello, World!", inside=fail
+            )
+
+        assert await self.get_ref_count(database_test, HELLO_SHA256) == 0
+        await repository.delete_file(
+            domain_obj=FileMetadata(id=1, name="file1.txt", sha256=HELLO_SHA256)
+        )
+        assert blob_files(tmp_path) == []
+
+    async def test_blob_kept_for_reference_written_during_removal(
+        self, tmp_path, database_test, database_service, repository
+    ):
+        result_1 = await self.upload(database_service, repository, 1, b"Hello, World!")
+        await database_service.remove_file_metadata(params={"id": [1]})
+        removal = None
+
+        async def remove_blob_of_first_file():
+            # The removal waits for the lock of the blob taken by the upload
+            nonlocal removal
+            removal = asyncio.create_task(repository.delete_file(domain_obj=result_1))
+            await asyncio.sleep(0.2)
+            assert not removal.done()
+
+        result_2 = await self.upload(
+            database_service,
+            repository,
+            2,
+            b"Hello, World!",
+            inside=remove_blob_of_first_file,
+        )
+        await removal
+
+        assert await self.get_ref_count(database_test, HELLO_SHA256) == 1
+        payload = await repository.read_file(domain_obj=result_2)
+        with open(payload["path"], "rb") as f:
+            assert f.read() == b"Hello, World!"
+
+    async def test_removed_blob_linked_again(
+        self, tmp_path, database_test, database_service, repository
+    ):
+        result_1 = await self.upload(database_service, repository, 1, b"Hello, World!")
+        await database_service.remove_file_metadata(params={"id": [1]})
+        await repository.delete_file(domain_obj=result_1)
+        assert blob_files(tmp_path) == []
+
+        result_2 = await self.upload(database_service, repository, 2, b"Hello, World!")
+
+        assert blob_files(tmp_path) == [HELLO_SHA256]
+        await repository.read_file(domain_obj=result_2)
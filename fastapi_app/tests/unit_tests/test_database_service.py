@@ -87,3 +87,53 @@ class TestDatabaseServiceAdd:
 
             with pytest.raises(error_type):
                 await service.add_file_metadata(metadata=data)
+
+
+class TestDatabaseServiceBatch:
+    data_lst = [
+        FileMetadata(id=i, name=f"example{i}.txt", size=1024, mimeType="text/plain")
+        for i in (1, 2)
+    ]
+
+    @pytest.mark.parametrize(
+        argnames="method_name, repository_method_name, kwargs",
+        argvalues=[
+            ("add_files_metadata", "insert_many", {"metadata_lst": data_lst}),
+            ("upsert_files_metadata", "upsert_many", {"metadata_lst": data_lst}),
+            ("get_files_metadata_by_ids", "select_by_ids", {"file_ids": [1, 2]}),
+        ],
+    )
+    async def test_batch_success(
+        self, container, method_name, repository_method_name, kwargs
+    ):
+        repository_mock = mock.Mock(spec=FileMetadataRepository)
+        getattr(repository_mock, repository_method_name).return_value = self.data_lst
+
+        with container.repositories.file_metadata_repository_provider.override(
+            repository_mock
+        ):
+            service = container.services.database_service_provider()
+            result = await getattr(service, method_name)(**kwargs)
+
+        assert result == self.data_lst
+
+    @pytest.mark.parametrize(
+        argnames="error_type",
+        argvalues=[
+            SessionNotSetError,
+            MappingError,
+            DatabaseError,
+            AttributeError,
+        ],
+    )
+    async def test_add_files_raising_errors(self, container, error_type):
+        repository_mock = mock.Mock(spec=FileMetadataRepository)
+        repository_mock.insert_many.side_effect = error_type("Mocked error")
+
+        with container.repositories.file_metadata_repository_provider.override(
+            repository_mock
+        ):
+            service = container.services.database_service_provider()
+
+            with pytest.raises(error_type):
+                await service.add_files_metadata(metadata_lst=self.data_lst)
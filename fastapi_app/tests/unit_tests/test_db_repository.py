@@ -1,15 +1,22 @@
+import asyncio
 from contextlib import nullcontext as does_not_raise
 from datetime import datetime
 
 import pytest
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
 
 from fastapi_app.src.db_service.exceptions import (
+    ConcurrentModificationError,
     DatabaseError,
     MappingError,
     NoConditionsError,
     SessionNotSetError,
 )
-from fastapi_app.src.db_service.repositories import OrmAlchemyRepository
+from fastapi_app.src.db_service.repositories import (
+    BlobReferenceRepository,
+    OrmAlchemyRepository,
+)
 from fastapi_app.src.schemas import FileMetadata
 
 
@@ -63,6 +70,11 @@ class TestRepositoryInsertOne:
         modificationTime=None,
     )
 
+    # Повторяющаяся пара name, mimeType
+    file_metadata_6_same_name = FileMetadata(
+        id=8, name="file6.pdf", size=1024, mimeType="image/jpeg", modificationTime=None
+    )
+
     file_metadata_7 = {
         "id": 7,
         "name": "doc_7.docx",
@@ -119,6 +131,7 @@ class TestRepositoryInsertOne:
         argnames="domain_input, expectation",
         argvalues=[
             (file_metadata_6_double, pytest.raises(DatabaseError)),
+            (file_metadata_6_same_name, pytest.raises(DatabaseError)),
         ],
     )
     async def test_insert_one_db_errors(
@@ -165,6 +178,80 @@ class TestRepositoryInsertOne:
                 await session.commit()
 
 
+def make_file_metadata_lst(ids, tag=None):
+    return [
+        FileMetadata(
+            id=i, name=f"file{i}.txt", tag=tag, size=1024, mimeType="text/plain"
+        )
+        for i in ids
+    ]
+
+
+@pytest.mark.usefixtures("empty_database")
+class TestRepositoryInsertMany:
+    @pytest.mark.parametrize(argnames="count", argvalues=[0, 1, 100, 10000])
+    async def test_insert_many_batch_sizes(self, container, database_test, count):
+        domain_input_lst = make_file_metadata_lst(range(count, 0, -1))
+
+        repository: OrmAlchemyRepository = (
+            container.repositories.file_metadata_repository_provider()
+        )
+
+        async with database_test.get_session_factory() as session:
+            repository.set_session(session)
+            domain_output_lst = await repository.insert_many(data=domain_input_lst)
+            await session.commit()
+            repository.clear_session()
+
+        assert [domain.id for domain in domain_output_lst] == [
+            domain.id for domain in domain_input_lst
+        ]
+        assert all(domain.modificationTime for domain in domain_output_lst)
+
+    async def test_insert_many_db_errors(self, container, database_test):
+        repository: OrmAlchemyRepository = (
+            container.repositories.file_metadata_repository_provider()
+        )
+
+        with pytest.raises(DatabaseError):
+            async with database_test.get_session_factory() as session:
+                repository.set_session(session)
+                await repository.insert_many(data=make_file_metadata_lst([1, 2, 1]))
+                await session.commit()
+
+        repository.clear_session()
+
+    async def test_upsert_many(self, container, database_test):
+        repository: OrmAlchemyRepository = (
+            container.repositories.file_metadata_repository_provider()
+        )
+
+        async with database_test.get_session_factory() as session:
+            repository.set_session(session)
+            inserted = await repository.insert_many(
+                data=make_file_metadata_lst([1, 2, 3])
+            )
+            await session.commit()
+
+            upserted = await repository.upsert_many(
+                data=make_file_metadata_lst([2, 3, 4], tag="important")
+            )
+            await session.commit()
+
+            selected = await repository.select_by_ids(ids=[1, 2, 3, 4])
+            repository.clear_session()
+
+        assert [domain.id for domain in upserted] == [2, 3, 4]
+        assert all(domain.tag == "important" for domain in upserted)
+        assert upserted[0].modificationTime > inserted[1].modificationTime
+        assert [domain.tag for domain in selected] == [
+            None,
+            "important",
+            "important",
+            "important",
+        ]
+
+
 @pytest.mark.usefixtures("database_with_data")
 class TestRepositoryUpdateOne:
     new_file_metadata_1 = FileMetadata(
@@ -242,6 +329,98 @@ class TestRepositoryUpdateOne:
                 await session.commit()
 
 
+@pytest.mark.usefixtures("database_with_data")
+class TestRepositoryUpsertOne:
+    @pytest.mark.parametrize(
+        argnames="new_file_metadata, previous_name",
+        argvalues=[
+            (
+                FileMetadata(
+                    id=1,
+                    name="New_name.txt",
+                    tag="Add some tags",
+                    size=2048,
+                    mimeType="text/plain",
+                ),
+                "file1.txt",
+            ),
+            (
+                FileMetadata(
+                    id=5,
+                    name="New_name_5.txt",
+                    tag=None,
+                    size=1024,
+                    mimeType="text/plain",
+                ),
+                None,
+            ),
+        ],
+    )
+    async def test_upsert_one_returns_previous_row(
+        self, container, database_test, new_file_metadata, previous_name
+    ):
+        repository: OrmAlchemyRepository = (
+            container.repositories.file_metadata_repository_provider()
+        )
+        timestamp = datetime.utcnow()
+
+        async with database_test.get_session_factory() as session:
+            repository.set_session(session)
+            domain_output, previous = await repository.upsert_one(
+                data=new_file_metadata
+            )
+            await session.commit()
+            repository.clear_session()
+
+        assert domain_output.model_dump(exclude={"modificationTime"}) == (
+            new_file_metadata.model_dump(exclude={"modificationTime"})
+        )
+        assert domain_output.modificationTime > timestamp
+        if previous_name is None:
+            assert previous is None
+        else:
+            assert previous.id == new_file_metadata.id
+            assert previous.name == previous_name
+            assert previous.modificationTime < domain_output.modificationTime
+
+    # A row to update, and an id inserted by both transactions
+    @pytest.mark.parametrize(argnames="file_id", argvalues=[1, 100])
+    async def test_upsert_one_concurrent_modification(
+        self, container, database_test, file_id
+    ):
+        repository: OrmAlchemyRepository = (
+            container.repositories.file_metadata_repository_provider()
+        )
+        concurrent_repository: OrmAlchemyRepository = (
+            container.repositories.file_metadata_repository_provider()
+        )
+
+        async with database_test.get_session_factory() as session:
+            async with database_test.get_session_factory() as concurrent_session:
+                repository.set_session(session)
+                await repository.upsert_one(
+                    data=FileMetadata(
+                        id=file_id, name="first.txt", size=1, mimeType="text/plain"
+                    )
+                )
+
+                # The concurrent upsert reads the row, then waits for its lock
+                # until the first transaction commits a newer version of it.
+                concurrent_repository.set_session(concurrent_session)
+                concurrent_upsert = asyncio.ensure_future(
+                    concurrent_repository.upsert_one(
+                        data=FileMetadata(
+                            id=file_id, name="second.txt", size=2, mimeType="text/plain"
+                        )
+                    )
+                )
+                await asyncio.sleep(0.2)
+                await session.commit()
+
+                with pytest.raises(ConcurrentModificationError):
+                    await concurrent_upsert
+
+
 @pytest.mark.usefixtures("database_with_data")
 class TestRepositorySelectOne:
     @pytest.mark.parametrize(
@@ -457,6 +636,84 @@ class TestRepositorySelectSome:
                 else:
                     raise
 
+    @pytest.mark.parametrize(
+        argnames="after_id, limit, res_ids",
+        argvalues=[
+            (None, 2, [1, 2]),
+            (2, 2, [3, 4]),
+            (3, None, [4]),
+            (4, 2, []),
+        ],
+    )
+    async def test_select_some_after_id(
+        self, container, database_test, after_id, limit, res_ids
+    ):
+        params = {"id": [1, 2, 3, 4], "tag": None, "name": None}
+
+        repository: OrmAlchemyRepository = (
+            container.repositories.file_metadata_repository_provider()
+        )
+
+        async with database_test.get_session_factory() as session:
+            repository.set_session(session)
+            domain_output_lst = await repository.select_some_by_params(
+                params=params, limit=limit, offset=None, after_id=after_id
+            )
+            await session.commit()
+            repository.clear_session()
+
+        assert [domain.id for domain in domain_output_lst] == res_ids
+
+    @pytest.mark.parametrize(
+        argnames="params, index_name",
+        argvalues=[
+            ({"tag": ["important"]}, "ix_file_table_tag"),
+            ({"name": ["file4"]}, "ix_file_table_name_pattern"),
+            ({"mime_type": ["image/jpeg"]}, "ix_file_table_mime_type"),
+            ({"sha256": ["0" * 64]}, "ix_file_table_sha256"),
+        ],
+    )
+    async def test_select_some_uses_index(
+        self, container, database_test, params, index_name
+    ):
+        repository: OrmAlchemyRepository = (
+            container.repositories.file_metadata_repository_provider()
+        )
+        query = select(repository.model).filter(
+            repository.get_filter_expression(params=params)
+        )
+        compiled = query.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+
+        async with database_test.get_session_factory() as session:
+            # The test table is tiny, so a sequential scan is always cheaper
+            await session.execute(text("SET LOCAL enable_seqscan = off"))
+            result = await session.execute(text(f"EXPLAIN {compiled}"))
+            plan = "\n".join(result.scalars().all())
+
+        assert index_name in plan
+
+    @pytest.mark.parametrize(
+        argnames="ids, res_ids",
+        argvalues=[
+            ([4, 1], [1, 4]),
+            ([2, 100, -20], [2]),
+            ([], []),
+        ],
+    )
+    async def test_select_by_ids(self, container, database_test, ids, res_ids):
+        repository: OrmAlchemyRepository = (
+            container.repositories.file_metadata_repository_provider()
+        )
+
+        async with database_test.get_session_factory() as session:
+            repository.set_session(session)
+            domain_output_lst = await repository.select_by_ids(ids=ids)
+            repository.clear_session()
+
+        assert [domain.id for domain in domain_output_lst] == res_ids
+
     async def test_select_some_session_set_error(self, container, database_test):
         params = {
             "id": [1, 2, 3, 4],
@@ -605,13 +862,14 @@ class TestRepositoryDeleteSome:
         with expectation:
             async with database_test.get_session_factory() as session:
                 repository.set_session(session)
-                id_lst = await repository.delete_some_by_params(
+                domain_lst = await repository.delete_some_by_params(
                     params=params, limit=limit, offset=offset
                 )
                 await session.commit()
                 repository.clear_session()
 
-            assert res_ids == id_lst
+            assert res_ids == [domain.id for domain in domain_lst]
+            assert all(isinstance(domain, FileMetadata) for domain in domain_lst)
 
     async def test_delete_some_session_set_error(
         self,
@@ -635,3 +893,65 @@ class TestRepositoryDeleteSome:
                     params=params, limit=limit, offset=offset
                 )
                 await session.commit()
+
+
+@pytest.mark.usefixtures("empty_database")
+class TestBlobReferenceRepository:
+    sha256 = "a" * 64
+
+    async def test_increment_and_decrement(self, container, database_test):
+        repository: BlobReferenceRepository = (
+            container.repositories.blob_reference_repository_provider()
+        )
+        ref_counts = []
+
+        async with database_test.get_session_factory() as session:
+            repository.set_session(session)
+            for _ in range(2):
+                ref_counts.append(
+                    await repository.increment(sha256=self.sha256, size=1024)
+                )
+            ref_counts.append(
+                await repository.increment(sha256=self.sha256, size=1024, count=2)
+            )
+            ref_counts.append(await repository.select_ref_count(sha256=self.sha256))
+            ref_counts.append(await repository.decrement(sha256=self.sha256, count=3))
+            for _ in range(2):
+                ref_counts.append(await repository.decrement(sha256=self.sha256))
+            ref_counts.append(await repository.select_ref_count(sha256=self.sha256))
+            await session.commit()
+            repository.clear_session()
+
+        assert ref_counts == [1, 2, 4, 4, 1, 0, 0, 0]
+
+    async def test_lock_held_until_end_of_transaction(self, container, database_test):
+        repositories = [
+            container.repositories.blob_reference_repository_provider()
+            for _ in range(2)
+        ]
+
+        async def lock(repository, session):
+            repository.set_session(session)
+            await repository.lock(sha256=self.sha256)
+
+        async with database_test.get_session_factory() as session_1:
+            await lock(repositories[0], session_1)
+            async with database_test.get_session_factory() as session_2:
+                other_lock = asyncio.create_task(lock(repositories[1], session_2))
+                await asyncio.sleep(0.2)
+                assert not other_lock.done()
+
+                await session_1.commit()
+                await asyncio.wait_for(other_lock, timeout=5)
+                await session_2.commit()
+
+    async def test_session_set_error(self, container, database_test):
+        repository: BlobReferenceRepository = (
+            container.repositories.blob_reference_repository_provider()
+        )
+        repository.clear_session()
+
+        with pytest.raises(SessionNotSetError):
+            async with database_test.get_session_factory() as session:
+                await repository.increment(sha256=self.sha256, size=1024)
+                await session.commit()
@@ -1,11 +1,31 @@
+import errno
+import hashlib
 import io
 import os
+import time
+import zlib
 from contextlib import nullcontext as does_not_raise
 
 import pytest
 from fastapi import UploadFile
 
-from fastapi_app.src.file_storage.exceptions import FileAlreadyExistsError
+from fastapi_app.src.file_storage import repositories
+from fastapi_app.src.file_storage.exceptions import (
+    FileAlreadyExistsError,
+    FileWriteError,
+    InvalidUploadPartError,
+    UploadSessionNotFoundError,
+)
+from fastapi_app.src.file_storage.layout_migration import migrate_to_sharded_layout
+from fastapi_app.src.file_storage.repositories import (
+    FSYNC_FILE,
+    FSYNC_FILE_AND_DIR,
+    FSYNC_NONE,
+    LAYOUT_SHARDED,
+    UPLOADS_DIR,
+    DiskRepository,
+    get_sharded_file_path,
+)
 from fastapi_app.src.schemas import FileMetadata
 
 temp_dir = os.path.join(os.path.dirname(__file__), os.path.pardir, "storage_test")
@@ -29,7 +49,7 @@ class TestGetFilePath:
             (2, "test_file_2.txt", b"Hello, World 2!", "text/plain", does_not_raise()),
         ],
     )
-    def test_file_path_generated_successfully(
+    async def test_file_path_generated_successfully(
         self,
         disk_repository_test,
         test_storage_dir,
@@ -46,7 +66,7 @@ class TestGetFilePath:
         file_metadata = FileMetadata(id=file_id, name=file_name_ext, mimeType=mime_type)
 
         with expectation:
-            file_path = disk_repository_test._DiskRepository__get_file_path(
+            file_path = await disk_repository_test._DiskRepository__get_file_path(
                 domain_obj=file_metadata
             )
             assert file_path is not None
@@ -55,14 +75,28 @@ class TestGetFilePath:
         if file_path_expected:
             os.remove(file_path_expected)
 
+    @pytest.mark.parametrize(
+        argnames="file_name_ext",
+        argvalues=["missing_file.txt", "../test_file_1.txt"],
+    )
+    async def test_file_path_not_found(
+        self, disk_repository_test, test_storage_dir, file_name_ext
+    ):
+        file_metadata = FileMetadata(id=1, name=file_name_ext, mimeType="text/plain")
+
+        file_path = await disk_repository_test._DiskRepository__get_file_path(
+            domain_obj=file_metadata
+        )
+        assert file_path is None
+
 
 @pytest.mark.usefixtures("test_storage_dir")
 class TestValidateFileDoesNotExist:
-    def test_file_does_not_exist(self, disk_repository_test):
+    async def test_file_does_not_exist(self, disk_repository_test):
         file_metadata = FileMetadata(
             id=1, name="test_file_1.txt", mimeType="text/plain"
         )
-        disk_repository_test._DiskRepository__validate_file_does_not_exist(
+        await disk_repository_test._DiskRepository__validate_file_does_not_exist(
             file_metadata
         )
 
@@ -72,7 +106,7 @@ class TestValidateFileDoesNotExist:
             (1, "test_file_1.txt", b"Hello, World!", "text/plain"),
         ],
     )
-    def test_file_exists(
+    async def test_file_exists(
         self,
         disk_repository_test,
         test_storage_dir,
@@ -88,7 +122,7 @@ class TestValidateFileDoesNotExist:
         file_metadata = FileMetadata(id=file_id, name=file_name_ext, mimeType=mime_type)
 
         with pytest.raises(FileAlreadyExistsError):
-            disk_repository_test._DiskRepository__validate_file_does_not_exist(
+            await disk_repository_test._DiskRepository__validate_file_does_not_exist(
                 file_metadata
             )
 
@@ -125,6 +159,233 @@ class TestWriteFile:
         if file_path_expected:
             os.remove(file_path_expected)
 
+    async def test_write_file_in_chunks(self, tmp_path):
+        class ReadSizeRecorder(io.BytesIO):
+            max_read_size = 0
+
+            def read(self, size=-1):
+                self.max_read_size = max(self.max_read_size, size)
+                return super().read(size)
+
+        chunk_size = 1024
+        file_content = os.urandom(chunk_size * 8 + 17)
+        source = ReadSizeRecorder(file_content)
+        repository = DiskRepository(storage_dir=str(tmp_path), chunk_size=chunk_size)
+        file_metadata = FileMetadata(
+            id=1, name="test_file_1.bin", mimeType="text/plain"
+        )
+
+        await repository.write_file(
+            file=UploadFile(filename="example.bin", file=source),
+            domain_obj=file_metadata,
+        )
+
+        assert 0 < source.max_read_size <= chunk_size
+        with open(os.path.join(tmp_path, "test_file_1.bin"), "rb") as f:
+            assert f.read() == file_content
+
+
+class TestAtomicWrite:
+    @staticmethod
+    async def stream_of(*chunks):
+        for chunk in chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    @pytest.mark.parametrize(
+        argnames="fsync_policy",
+        argvalues=[FSYNC_NONE, FSYNC_FILE, FSYNC_FILE_AND_DIR],
+    )
+    async def test_write_stream_with_fsync_policy(self, tmp_path, fsync_policy):
+        repository = DiskRepository(
+            storage_dir=str(tmp_path), fsync_policy=fsync_policy
+        )
+        file_metadata = FileMetadata(
+            id=1, name="test_file_1.txt", mimeType="text/plain"
+        )
+
+        result = await repository.write_stream(
+            stream=self.stream_of(b"Hello, ", b"World!"), domain_obj=file_metadata
+        )
+
+        assert result.size == len(b"Hello, World!")
+        assert result.sha256 == hashlib.sha256(b"Hello, World!").hexdigest()
+        assert result.crc32 == zlib.crc32(b"Hello, World!")
+        assert os.listdir(tmp_path) == ["test_file_1.txt"]
+        with open(os.path.join(tmp_path, "test_file_1.txt"), "rb") as f:
+            assert f.read() == b"Hello, World!"
+
+    async def test_failed_stream_leaves_nothing_behind(self, tmp_path):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        file_metadata = FileMetadata(
+            id=1, name="test_file_1.txt", mimeType="text/plain"
+        )
+
+        with pytest.raises(FileWriteError):
+            await repository.write_stream(
+                stream=self.stream_of(b"Hello, ", ConnectionError("disconnect")),
+                domain_obj=file_metadata,
+            )
+
+        assert os.listdir(tmp_path) == []
+
+    @pytest.mark.parametrize(
+        argnames="name",
+        argvalues=["../evil", "sub/evil", "..", ".uploads", ".upload-0123abcd.part"],
+    )
+    async def test_invalid_name_not_written(self, tmp_path, name):
+        storage_dir = tmp_path / "storage"
+        repository = DiskRepository(storage_dir=str(storage_dir))
+        file_metadata = FileMetadata(id=1, name=name, mimeType="text/plain")
+
+        with pytest.raises(FileWriteError):
+            await repository.write_stream(
+                stream=self.stream_of(b"Hello, World!"), domain_obj=file_metadata
+            )
+
+        assert os.listdir(tmp_path) == ["storage"]
+        assert os.listdir(storage_dir) == []
+
+    async def test_invalid_name_not_published(self, tmp_path):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        temp_file = await repository.stage_stream(
+            stream=self.stream_of(b"Hello, World!"),
+            domain_obj=FileMetadata(id=1, name="valid.txt", mimeType="text/plain"),
+        )
+
+        with pytest.raises(FileWriteError):
+            await repository.publish_file(
+                temp_file=temp_file,
+                domain_obj=FileMetadata(id=1, name="../evil", mimeType="text/plain"),
+            )
+        await repository.discard_file(temp_file=temp_file)
+
+        assert os.listdir(tmp_path) == []
+
+    async def test_write_replacing_same_name_overwrites_file(self, tmp_path):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        file_metadata = FileMetadata(
+            id=1, name="test_file_1.txt", mimeType="text/plain"
+        )
+        await repository.write_stream(
+            stream=self.stream_of(b"Hello, World!"), domain_obj=file_metadata
+        )
+
+        with pytest.raises(FileAlreadyExistsError):
+            await repository.write_stream(
+                stream=self.stream_of(b"New Hello, World!"), domain_obj=file_metadata
+            )
+
+        await repository.write_stream(
+            stream=self.stream_of(b"New Hello, World!"),
+            domain_obj=file_metadata,
+            replaces=file_metadata,
+        )
+
+        assert os.listdir(tmp_path) == ["test_file_1.txt"]
+        with open(os.path.join(tmp_path, "test_file_1.txt"), "rb") as f:
+            assert f.read() == b"New Hello, World!"
+
+    async def test_write_replacing_other_name_deletes_old_file(self, tmp_path):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        old_file_metadata = FileMetadata(
+            id=1, name="test_file_1.txt", mimeType="text/plain"
+        )
+        new_file_metadata = FileMetadata(
+            id=1, name="test_file_2.txt", mimeType="text/plain"
+        )
+        await repository.write_stream(
+            stream=self.stream_of(b"Hello, World!"), domain_obj=old_file_metadata
+        )
+
+        await repository.write_stream(
+            stream=self.stream_of(b"New Hello, World!"),
+            domain_obj=new_file_metadata,
+            replaces=old_file_metadata,
+        )
+
+        assert os.listdir(tmp_path) == ["test_file_2.txt"]
+
+
+class TestUnpublishFile:
+    @staticmethod
+    async def stream_of(content: bytes):
+        yield content
+
+    async def publish(self, repository, content, file_metadata, replaces=None):
+        temp_file = await repository.stage_stream(
+            stream=self.stream_of(content), domain_obj=file_metadata
+        )
+        await repository.publish_file(
+            temp_file=temp_file, domain_obj=file_metadata, replaces=replaces
+        )
+        return temp_file
+
+    async def test_overwritten_file_put_back(self, tmp_path):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        file_metadata = FileMetadata(
+            id=1, name="test_file_1.txt", mimeType="text/plain"
+        )
+        temp_file = await self.publish(repository, b"Hello, World!", file_metadata)
+        await repository.discard_file(temp_file=temp_file)
+
+        temp_file = await self.publish(
+            repository, b"New Hello, World!", file_metadata, replaces=file_metadata
+        )
+        await repository.unpublish_file(
+            temp_file=temp_file, domain_obj=file_metadata, replaces=file_metadata
+        )
+        await repository.discard_file(temp_file=temp_file)
+
+        assert os.listdir(tmp_path) == ["test_file_1.txt"]
+        with open(os.path.join(tmp_path, "test_file_1.txt"), "rb") as f:
+            assert f.read() == b"Hello, World!"
+
+    async def test_copy_of_overwritten_file_discarded(self, tmp_path):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        file_metadata = FileMetadata(
+            id=1, name="test_file_1.txt", mimeType="text/plain"
+        )
+        temp_file = await self.publish(repository, b"Hello, World!", file_metadata)
+        await repository.discard_file(temp_file=temp_file)
+
+        temp_file = await self.publish(
+            repository, b"New Hello, World!", file_metadata, replaces=file_metadata
+        )
+        assert len(os.listdir(tmp_path)) == 2
+        await repository.discard_file(temp_file=temp_file)
+
+        assert os.listdir(tmp_path) == ["test_file_1.txt"]
+        with open(os.path.join(tmp_path, "test_file_1.txt"), "rb") as f:
+            assert f.read() == b"New Hello, World!"
+
+    async def test_new_file_removed(self, tmp_path):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        old_file_metadata = FileMetadata(
+            id=1, name="test_file_1.txt", mimeType="text/plain"
+        )
+        new_file_metadata = FileMetadata(
+            id=1, name="test_file_2.txt", mimeType="text/plain"
+        )
+        temp_file = await self.publish(repository, b"Hello, World!", old_file_metadata)
+        await repository.discard_file(temp_file=temp_file)
+
+        temp_file = await self.publish(
+            repository,
+            b"New Hello, World!",
+            new_file_metadata,
+            replaces=old_file_metadata,
+        )
+        await repository.unpublish_file(
+            temp_file=temp_file,
+            domain_obj=new_file_metadata,
+            replaces=old_file_metadata,
+        )
+        await repository.discard_file(temp_file=temp_file)
+
+        assert os.listdir(tmp_path) == ["test_file_1.txt"]
+
 
 @pytest.mark.usefixtures("test_storage_dir")
 class TestReadFile:
@@ -151,7 +412,7 @@ class TestReadFile:
         file_metadata = FileMetadata(id=file_id, name=file_name_ext, mimeType=mime_type)
 
         with expectation:
-            payload = disk_repository_test.read_file(domain_obj=file_metadata)
+            payload = await disk_repository_test.read_file(domain_obj=file_metadata)
 
             assert payload["path"] == file_path_expected
             assert payload["media_type"] == mime_type
@@ -187,12 +448,359 @@ class TestDeleteFile:
         file_metadata = FileMetadata(id=file_id, name=file_name, mimeType=mime_type)
 
         with expectation:
-            disk_repository_test.delete_file(domain_obj=file_metadata)
+            await disk_repository_test.delete_file(domain_obj=file_metadata)
 
-            file = disk_repository_test._DiskRepository__get_file_path(
+            file = await disk_repository_test._DiskRepository__get_file_path(
                 domain_obj=file_metadata
             )
             assert file is None
 
         if file:
             os.remove(file_path_expected)
+
+
+class TestShardedLayout:
+    async def test_write_file_to_sharded_path(self, tmp_path):
+        storage_dir = str(tmp_path)
+        repository = DiskRepository(storage_dir=storage_dir, layout=LAYOUT_SHARDED)
+        file_metadata = FileMetadata(
+            id=1, name="test_file_1.txt", mimeType="text/plain"
+        )
+        file = UploadFile(filename="example.txt", file=io.BytesIO(b"Hello, World!"))
+
+        await repository.write_file(file=file, domain_obj=file_metadata)
+
+        file_path_expected = get_sharded_file_path(storage_dir, "test_file_1.txt")
+        assert os.path.isfile(file_path_expected)
+        assert not os.path.exists(os.path.join(storage_dir, "test_file_1.txt"))
+
+        payload = await repository.read_file(domain_obj=file_metadata)
+        assert payload["path"] == file_path_expected
+
+    async def test_read_not_migrated_flat_file(self, tmp_path):
+        storage_dir = str(tmp_path)
+        file_path_expected = os.path.join(storage_dir, "test_file_1.txt")
+        with open(file_path_expected, "wb") as f:
+            f.write(b"Hello, World!")
+
+        repository = DiskRepository(storage_dir=storage_dir, layout=LAYOUT_SHARDED)
+        file_metadata = FileMetadata(
+            id=1, name="test_file_1.txt", mimeType="text/plain"
+        )
+
+        payload = await repository.read_file(domain_obj=file_metadata)
+        assert payload["path"] == file_path_expected
+
+    @staticmethod
+    async def stream_of(content: bytes):
+        yield content
+
+    async def test_overwrite_removes_flat_copy(self, tmp_path):
+        storage_dir = str(tmp_path)
+        flat_file_path = os.path.join(storage_dir, "test_file_1.txt")
+        with open(flat_file_path, "wb") as f:
+            f.write(b"Hello, World!")
+
+        repository = DiskRepository(storage_dir=storage_dir, layout=LAYOUT_SHARDED)
+        file_metadata = FileMetadata(
+            id=1, name="test_file_1.txt", mimeType="text/plain"
+        )
+
+        await repository.write_stream(
+            stream=self.stream_of(b"New Hello, World!"),
+            domain_obj=file_metadata,
+            replaces=file_metadata,
+        )
+
+        assert not os.path.exists(flat_file_path)
+        payload = await repository.read_file(domain_obj=file_metadata)
+        with open(payload["path"], "rb") as f:
+            assert f.read() == b"New Hello, World!"
+
+        await repository.delete_file(domain_obj=file_metadata)
+
+        with pytest.raises(FileNotFoundError):
+            await repository.read_file(domain_obj=file_metadata)
+
+    async def test_delete_removes_flat_copy(self, tmp_path):
+        storage_dir = str(tmp_path)
+        file_metadata = FileMetadata(
+            id=1, name="test_file_1.txt", mimeType="text/plain"
+        )
+        flat_file_path = os.path.join(storage_dir, "test_file_1.txt")
+        sharded_file_path = get_sharded_file_path(storage_dir, "test_file_1.txt")
+        os.makedirs(os.path.dirname(sharded_file_path))
+        for file_path, content in (
+            (flat_file_path, b"Stale Hello, World!"),
+            (sharded_file_path, b"Hello, World!"),
+        ):
+            with open(file_path, "wb") as f:
+                f.write(content)
+
+        repository = DiskRepository(storage_dir=storage_dir, layout=LAYOUT_SHARDED)
+        await repository.delete_file(domain_obj=file_metadata)
+
+        assert not os.path.exists(flat_file_path)
+        assert not os.path.exists(sharded_file_path)
+
+    async def test_new_file_does_not_shadow_flat_copy(self, tmp_path):
+        storage_dir = str(tmp_path)
+        flat_file_path = os.path.join(storage_dir, "test_file_1.txt")
+        with open(flat_file_path, "wb") as f:
+            f.write(b"Hello, World!")
+
+        repository = DiskRepository(storage_dir=storage_dir, layout=LAYOUT_SHARDED)
+        file_metadata = FileMetadata(
+            id=2, name="test_file_1.txt", mimeType="text/plain"
+        )
+        temp_file = await repository.stage_stream(
+            stream=self.stream_of(b"New Hello, World!"), domain_obj=file_metadata
+        )
+
+        with pytest.raises(FileAlreadyExistsError):
+            await repository.publish_file(temp_file=temp_file, domain_obj=file_metadata)
+        await repository.discard_file(temp_file=temp_file)
+
+        assert not os.path.exists(get_sharded_file_path(storage_dir, "test_file_1.txt"))
+        with open(flat_file_path, "rb") as f:
+            assert f.read() == b"Hello, World!"
+
+    def test_unknown_layout(self, tmp_path):
+        with pytest.raises(ValueError):
+            DiskRepository(storage_dir=str(tmp_path), layout="unknown")
+
+
+class TestMigrateToShardedLayout:
+    def test_flat_files_moved(self, tmp_path):
+        storage_dir = str(tmp_path)
+        filenames = ["test_file_1.txt", "test_file_2.txt", "3.jpg"]
+        for filename in filenames:
+            with open(os.path.join(storage_dir, filename), "wb") as f:
+                f.write(filename.encode())
+
+        assert migrate_to_sharded_layout(storage_dir=storage_dir) == len(filenames)
+
+        for filename in filenames:
+            assert not os.path.exists(os.path.join(storage_dir, filename))
+            with open(get_sharded_file_path(storage_dir, filename), "rb") as f:
+                assert f.read() == filename.encode()
+
+    @pytest.mark.parametrize(
+        argnames="filename", argvalues=[".gitkeep", ".upload-0123abcd.part"]
+    )
+    def test_hidden_files_not_moved(self, tmp_path, filename):
+        storage_dir = str(tmp_path)
+        file_path = os.path.join(storage_dir, filename)
+        with open(file_path, "wb") as f:
+            f.write(b"")
+
+        assert migrate_to_sharded_layout(storage_dir=storage_dir) == 0
+
+        assert os.path.isfile(file_path)
+        assert os.listdir(storage_dir) == [filename]
+
+    def test_interrupted_migration_resumed(self, tmp_path):
+        storage_dir = str(tmp_path)
+        flat_file_path = os.path.join(storage_dir, "test_file_1.txt")
+        with open(flat_file_path, "wb") as f:
+            f.write(b"Hello, World!")
+
+        # Simulates a migration stopped between linking and unlinking the file.
+        sharded_file_path = get_sharded_file_path(storage_dir, "test_file_1.txt")
+        os.makedirs(os.path.dirname(sharded_file_path))
+        os.link(flat_file_path, sharded_file_path)
+
+        assert migrate_to_sharded_layout(storage_dir=storage_dir) == 1
+        assert migrate_to_sharded_layout(storage_dir=storage_dir) == 0
+
+        assert not os.path.exists(flat_file_path)
+        assert os.path.isfile(sharded_file_path)
+
+
+class TestUploadSession:
+    file_metadata = FileMetadata(id=1, name="big_file.bin", mimeType="text/plain")
+
+    @staticmethod
+    async def stream_of(*chunks):
+        for chunk in chunks:
+            yield chunk
+
+    async def upload_parts(self, repository, upload_id, contents):
+        return [
+            await repository.write_upload_part(
+                upload_id=upload_id,
+                part_number=part_number,
+                stream=self.stream_of(content),
+            )
+            for part_number, content in contents.items()
+        ]
+
+    async def test_upload_assembled_in_part_order(self, tmp_path):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        upload_id = await repository.create_upload_session(
+            domain_obj=self.file_metadata
+        )
+        contents = {3: b"C" * 10, 1: b"A" * 1000, 2: b"B" * 100}
+
+        parts = await self.upload_parts(repository, upload_id, contents)
+        temp_file = await repository.assemble_upload(
+            upload_id=upload_id, domain_obj=self.file_metadata
+        )
+
+        content = contents[1] + contents[2] + contents[3]
+        assert [part.sha256 for part in parts] == [
+            hashlib.sha256(part_content).hexdigest()
+            for part_content in contents.values()
+        ]
+        assert (
+            await repository.get_upload_session(upload_id=upload_id)
+            == self.file_metadata
+        )
+        assert temp_file.checksums() == {
+            "size": len(content),
+            "sha256": hashlib.sha256(content).hexdigest(),
+            "crc32": zlib.crc32(content),
+        }
+        assert os.path.dirname(temp_file.path) == str(tmp_path)
+        with open(temp_file.path, "rb") as f:
+            assert f.read() == content
+
+    async def test_upload_part_replaced(self, tmp_path):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        upload_id = await repository.create_upload_session(
+            domain_obj=self.file_metadata
+        )
+
+        await self.upload_parts(repository, upload_id, {1: b"first", 2: b"second"})
+        await self.upload_parts(repository, upload_id, {1: b"retried"})
+
+        parts = await repository.list_upload_parts(upload_id=upload_id)
+        assert [(part.partNumber, part.size) for part in parts] == [(1, 7), (2, 6)]
+        temp_file = await repository.assemble_upload(
+            upload_id=upload_id, domain_obj=self.file_metadata
+        )
+        with open(temp_file.path, "rb") as f:
+            assert f.read() == b"retriedsecond"
+
+    @pytest.mark.parametrize(
+        argnames="selected_parts, expectation",
+        argvalues=[
+            ([1, 3], does_not_raise()),
+            ([3, 1], pytest.raises(InvalidUploadPartError)),
+            ([1, 1], pytest.raises(InvalidUploadPartError)),
+            ([1, 4], pytest.raises(InvalidUploadPartError)),
+            ([], pytest.raises(InvalidUploadPartError)),
+        ],
+    )
+    async def test_assemble_listed_parts(self, tmp_path, selected_parts, expectation):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        upload_id = await repository.create_upload_session(
+            domain_obj=self.file_metadata
+        )
+        contents = {1: b"A", 2: b"B", 3: b"C"}
+        await self.upload_parts(repository, upload_id, contents)
+
+        with expectation:
+            temp_file = await repository.assemble_upload(
+                upload_id=upload_id,
+                domain_obj=self.file_metadata,
+                parts=[
+                    (number, hashlib.sha256(contents.get(number, b"")).hexdigest())
+                    for number in selected_parts
+                ],
+            )
+            with open(temp_file.path, "rb") as f:
+                assert f.read() == b"AC"
+
+    async def test_assemble_with_wrong_checksum(self, tmp_path):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        upload_id = await repository.create_upload_session(
+            domain_obj=self.file_metadata
+        )
+        await self.upload_parts(repository, upload_id, {1: b"A"})
+
+        with pytest.raises(InvalidUploadPartError):
+            await repository.assemble_upload(
+                upload_id=upload_id,
+                domain_obj=self.file_metadata,
+                parts=[(1, hashlib.sha256(b"B").hexdigest())],
+            )
+
+    async def test_assemble_without_copy_file_range(self, tmp_path, monkeypatch):
+        def copy_file_range(*args):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+        monkeypatch.setattr(repositories.os, "copy_file_range", copy_file_range)
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        upload_id = await repository.create_upload_session(
+            domain_obj=self.file_metadata
+        )
+        await self.upload_parts(repository, upload_id, {1: b"A" * 100, 2: b"B"})
+
+        temp_file = await repository.assemble_upload(
+            upload_id=upload_id, domain_obj=self.file_metadata
+        )
+
+        with open(temp_file.path, "rb") as f:
+            assert f.read() == b"A" * 100 + b"B"
+
+    @pytest.mark.parametrize(
+        argnames="upload_id",
+        argvalues=["0" * 32, "../../etc", "not-an-upload-id"],
+    )
+    async def test_unknown_upload(self, tmp_path, upload_id):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+
+        with pytest.raises(UploadSessionNotFoundError):
+            await repository.write_upload_part(
+                upload_id=upload_id, part_number=1, stream=self.stream_of(b"A")
+            )
+        with pytest.raises(UploadSessionNotFoundError):
+            await repository.list_upload_parts(upload_id=upload_id)
+        with pytest.raises(UploadSessionNotFoundError):
+            await repository.delete_upload_session(upload_id=upload_id)
+
+    @pytest.mark.parametrize(argnames="part_number", argvalues=[0, 10001])
+    async def test_invalid_part_number(self, tmp_path, part_number):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        upload_id = await repository.create_upload_session(
+            domain_obj=self.file_metadata
+        )
+
+        with pytest.raises(InvalidUploadPartError):
+            await repository.write_upload_part(
+                upload_id=upload_id,
+                part_number=part_number,
+                stream=self.stream_of(b"A"),
+            )
+
+    async def test_abort_upload(self, tmp_path):
+        repository = DiskRepository(storage_dir=str(tmp_path))
+        upload_id = await repository.create_upload_session(
+            domain_obj=self.file_metadata
+        )
+        await self.upload_parts(repository, upload_id, {1: b"A"})
+
+        await repository.delete_upload_session(upload_id=upload_id)
+
+        assert os.listdir(os.path.join(tmp_path, UPLOADS_DIR)) == []
+        with pytest.raises(UploadSessionNotFoundError):
+            await repository.get_upload_session(upload_id=upload_id)
+
+    async def test_abandoned_upload_expired(self, tmp_path):
+        repository = DiskRepository(storage_dir=str(tmp_path), upload_session_ttl=60)
+        abandoned_upload_id = await repository.create_upload_session(
+            domain_obj=self.file_metadata
+        )
+        session_dir = os.path.join(tmp_path, UPLOADS_DIR, abandoned_upload_id)
+        an_hour_ago = time.time() - 3600
+        os.utime(session_dir, (an_hour_ago, an_hour_ago))
+
+        with pytest.raises(UploadSessionNotFoundError):
+            await repository.list_upload_parts(upload_id=abandoned_upload_id)
+
+        upload_id = await repository.create_upload_session(
+            domain_obj=self.file_metadata
+        )
+
+        assert os.listdir(os.path.join(tmp_path, UPLOADS_DIR)) == [upload_id]
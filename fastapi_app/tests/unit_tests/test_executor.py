@@ -0,0 +1,120 @@
+import asyncio
+import threading
+
+import pytest
+
+from fastapi_app.src.file_storage.executor import FilesystemExecutor
+
+
+class TestFilesystemExecutor:
+    async def test_run_returns_result_off_the_event_loop(self):
+        executor = FilesystemExecutor(max_workers=2, max_queue=2)
+
+        thread_name = await executor.run(lambda: threading.current_thread().name)
+
+        assert thread_name.startswith("filesystem")
+        assert executor.get_metrics()["completed"] == 1
+        executor.shutdown()
+
+    async def test_run_raises_error_of_call(self):
+        executor = FilesystemExecutor(max_workers=1, max_queue=0)
+
+        with pytest.raises(FileNotFoundError):
+            await executor.run(open, "/nonexistent/file")
+
+        metrics = executor.get_metrics()
+        assert metrics["completed"] == 1
+        assert metrics["running"] == 0
+        executor.shutdown()
+
+    @pytest.mark.parametrize(
+        argnames="max_workers, max_queue, num_calls",
+        argvalues=[(1, 0, 5), (2, 3, 20), (4, 16, 8)],
+    )
+    async def test_run_is_bounded(self, max_workers, max_queue, num_calls):
+        executor = FilesystemExecutor(max_workers=max_workers, max_queue=max_queue)
+        release = threading.Event()
+        lock = threading.Lock()
+        running = 0
+        running_max = 0
+
+        def blocking_call():
+            nonlocal running, running_max
+            with lock:
+                running += 1
+                running_max = max(running_max, running)
+            release.wait()
+            with lock:
+                running -= 1
+
+        tasks = [
+            asyncio.create_task(executor.run(blocking_call)) for _ in range(num_calls)
+        ]
+        await asyncio.sleep(0.05)
+        metrics = executor.get_metrics()
+        release.set()
+        await asyncio.gather(*tasks)
+
+        assert running_max == min(max_workers, num_calls)
+        assert metrics["running"] == min(max_workers, num_calls)
+        assert metrics["queued"] == num_calls - min(max_workers, num_calls)
+        assert executor.get_metrics()["queued"] == 0
+        assert executor.get_metrics()["queued_max"] == metrics["queued"]
+        assert executor.get_metrics()["completed"] == num_calls
+        assert executor.get_metrics()["wait_time_max"] >= 0
+        executor.shutdown()
+
+    async def test_cancelled_call_leaves_queue(self):
+        executor = FilesystemExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+
+        running_task = asyncio.create_task(executor.run(release.wait))
+        queued_tasks = [
+            asyncio.create_task(executor.run(release.wait)) for _ in range(3)
+        ]
+        await asyncio.sleep(0.05)
+        for task in queued_tasks:
+            task.cancel()
+        await asyncio.gather(*queued_tasks, return_exceptions=True)
+        assert executor.get_metrics()["queued"] == 0
+        release.set()
+        await running_task
+
+        metrics = executor.get_metrics()
+        assert metrics["queued"] == 0
+        assert metrics["completed"] == 1
+        executor.shutdown()
+
+    async def test_cancelled_running_call_keeps_slot(self):
+        executor = FilesystemExecutor(max_workers=1, max_queue=0)
+        release = threading.Event()
+
+        running_task = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        running_task.cancel()
+        await asyncio.gather(running_task, return_exceptions=True)
+        await asyncio.sleep(0.05)
+
+        try:
+            assert executor._slots.locked()
+            next_task = asyncio.create_task(executor.run(lambda: None))
+            await asyncio.sleep(0.05)
+            assert not next_task.done()
+            assert executor.get_metrics()["running"] == 1
+        finally:
+            release.set()
+        await next_task
+
+        metrics = executor.get_metrics()
+        assert metrics["queued"] == 0
+        assert metrics["running"] == 0
+        assert metrics["completed"] == 2
+        executor.shutdown()
+
+    @pytest.mark.parametrize(
+        argnames="max_workers, max_queue",
+        argvalues=[(0, 1), (1, -1)],
+    )
+    def test_invalid_settings(self, max_workers, max_queue):
+        with pytest.raises(ValueError):
+            FilesystemExecutor(max_workers=max_workers, max_queue=max_queue)
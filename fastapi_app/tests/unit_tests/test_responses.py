@@ -0,0 +1,71 @@
+from contextlib import nullcontext as does_not_raise
+
+import pytest
+
+from fastapi_app.src.responses import (
+    MAX_RANGES,
+    ZERO_COPY_SEND,
+    RangeFileResponse,
+    RangeNotSatisfiableError,
+    parse_range_header,
+)
+
+
+class TestParseRangeHeader:
+    @pytest.mark.parametrize(
+        argnames="range_header, file_size, ranges_expected, expectation",
+        argvalues=[
+            ("bytes=0-99", 1000, [(0, 99)], does_not_raise()),
+            ("bytes=500-", 1000, [(500, 999)], does_not_raise()),
+            ("bytes=-100", 1000, [(900, 999)], does_not_raise()),
+            ("bytes=-5000", 1000, [(0, 999)], does_not_raise()),
+            ("bytes=900-5000", 1000, [(900, 999)], does_not_raise()),
+            ("bytes=0-0, -1", 1000, [(0, 0), (999, 999)], does_not_raise()),
+            ("bytes=0-9,2000-3000", 1000, [(0, 9)], does_not_raise()),
+            ("items=0-99", 1000, None, does_not_raise()),
+            ("bytes=abc-99", 1000, None, does_not_raise()),
+            ("bytes=99-0", 1000, None, does_not_raise()),
+            ("bytes=-", 1000, None, does_not_raise()),
+            (
+                "bytes=" + ",".join(["0-1"] * (MAX_RANGES + 1)),
+                1000,
+                None,
+                does_not_raise(),
+            ),
+            ("bytes=1000-", 1000, None, pytest.raises(RangeNotSatisfiableError)),
+            ("bytes=-0", 1000, None, pytest.raises(RangeNotSatisfiableError)),
+        ],
+    )
+    def test_parse_range_header(
+        self, range_header, file_size, ranges_expected, expectation
+    ):
+        with expectation:
+            assert parse_range_header(range_header, file_size) == ranges_expected
+
+
+class TestRangeFileResponse:
+    async def test_zero_copy_send_used_when_supported(self, tmp_path):
+        file_path = tmp_path / "file.bin"
+        file_path.write_bytes(b"0123456789")
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "headers": [(b"range", b"bytes=2-5")],
+            "extensions": {ZERO_COPY_SEND: {}},
+        }
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await RangeFileResponse(path=str(file_path))(scope, None, send)
+
+        assert messages[0]["status"] == 206
+        assert (b"content-range", b"bytes 2-5/10") in messages[0]["headers"]
+        assert messages[1]["type"] == ZERO_COPY_SEND
+        assert (messages[1]["offset"], messages[1]["count"]) == (2, 4)
+        assert messages[-1] == {
+            "type": "http.response.body",
+            "body": b"",
+            "more_body": False,
+        }